@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
@@ -6,9 +7,10 @@ from typing import Any
 
 from schemas import UserCreate, UserLogin, UserResponse, Token
 from database import get_db
-from models import User
-from security import hash_password, verify_password
+from models import User, UserRole
+from security import hash_password_async, verify_and_update
 from jwt_token import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from permissions import PERMISSIONS_IN_TOKEN, permission_table
 from password_reset import create_password_reset_otp, verify_otp, reset_password_with_token
 from otp_cleanup import otp_cleanup_scheduler
 
@@ -22,6 +24,47 @@ router = APIRouter(
 # OAuth2 scheme for token based authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+def _issue_token(db: Session, user: User) -> str:
+    """
+    Access token for user.
+    
+    With PERMISSIONS_IN_TOKEN the user's role and menu bitsets are added as
+    hex claims for clients; the API itself always checks the current
+    compiled permissions, not the claims.
+    """
+    claims = None
+    if PERMISSIONS_IN_TOKEN:
+        role_ids = [role_id for (role_id,) in db.query(UserRole.role_id).filter(UserRole.user_id == user.id)]
+        grants = permission_table(db).for_roles(role_ids)
+        claims = {"role_bits": format(grants.role_bits, "x"), "menu_bits": format(grants.menu_bits, "x")}
+    
+    return create_access_token(
+        subject=user.email,
+        user_id=user.id,
+        role_status=user.role_status,
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+        token_version=user.token_version or 0,
+        claims=claims
+    )
+
+async def _check_password(db: Session, user: User, password: str) -> bool:
+    """
+    Check a login password off the event loop.
+    
+    A hash made with a cost other than BCRYPT_ROUNDS is replaced while the
+    plain password is at hand. The session's connection goes back to the
+    pool while bcrypt runs; holding it would let a burst of logins take
+    every connection and block the event loop waiting for one.
+    """
+    hashed_password = user.password
+    db.expunge(user)
+    db.rollback()
+    valid, new_hash = await verify_and_update(password, hashed_password)
+    if new_hash:
+        db.query(User).filter(User.id == user.id).update({"password": new_hash}, synchronize_session=False)
+        db.commit()
+    return valid
+
 @router.post("/register", response_model=UserResponse)
 async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
     """
@@ -37,6 +80,9 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
     Raises:
         HTTPException: If email already exists
     """
+    # Hashed first so no connection is held while bcrypt runs
+    hashed_password = await hash_password_async(user_data.password)
+    
     # Check if user already exists
     existing_user = db.query(User).filter(User.email == user_data.email).first()
     if existing_user:
@@ -46,7 +92,6 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
         )
     
     # Create new user
-    hashed_password = hash_password(user_data.password)
     
     db_user = User(
         firstname=user_data.firstname,
@@ -88,23 +133,14 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     user = db.query(User).filter(User.email == form_data.username).first()
     
     # Check if user exists and password is correct
-    if not user or not verify_password(form_data.password, user.password):
+    if not user or not await _check_password(db, user, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    # Generate access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        subject=user.email,
-        user_id=user.id,
-        role_status=user.role_status,
-        expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": _issue_token(db, user), "token_type": "bearer"}
 
 @router.post("/token-login", response_model=Token)
 async def login_with_email_password(user_data: UserLogin, db: Session = Depends(get_db)) -> Any:
@@ -125,23 +161,14 @@ async def login_with_email_password(user_data: UserLogin, db: Session = Depends(
     user = db.query(User).filter(User.email == user_data.email).first()
     
     # Check if user exists and password is correct
-    if not user or not verify_password(user_data.password, user.password):
+    if not user or not await _check_password(db, user, user_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    # Generate access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        subject=user.email,
-        user_id=user.id,
-        role_status=user.role_status,
-        expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": _issue_token(db, user), "token_type": "bearer"}
 @router.post("/forgot-password")
 async def forgot_password(request_data: dict, db: Session = Depends(get_db)) -> Any:
     """
@@ -248,7 +275,8 @@ async def reset_password(request_data: dict, db: Session = Depends(get_db)) -> A
         )
     
     try:
-        reset_password_with_token(db, email, token, new_password)
+        # bcrypt runs in a worker thread rather than on the event loop
+        await run_in_threadpool(reset_password_with_token, db, email, token, new_password)
         return {"message": "Password reset successfully"}
     except ValueError as e:
         raise HTTPException(
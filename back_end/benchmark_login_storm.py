@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark
+
+Seeds a throwaway SQLite database with users, then fires a burst of
+concurrent /api/auth/token-login requests at the app in-process while
+calling /api/health every few milliseconds. Latency of the health check
+while logins are running is printed next to its latency when idle; with
+bcrypt on the password threads the two stay close.
+
+Run from the back_end folder:
+    python benchmark_login_storm.py [--logins 200] [--inline]
+
+--inline checks passwords on the event loop, as the login endpoints used
+to, for comparison.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+# Must be set before the app (and its engine) is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "login_storm.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import httpx
+from sqlalchemy import insert
+
+import auth
+from database import Base, SessionLocal, engine
+from main import app
+import models
+from security import BCRYPT_ROUNDS, hash_password, verify_password
+
+PASSWORD = "storm-password"
+PROBE_INTERVAL_SECONDS = 0.005
+
+def seed(users):
+    """Create users sharing one password hash"""
+    Base.metadata.create_all(bind=engine)
+    hashed = hash_password(PASSWORD)
+    db = SessionLocal()
+    db.execute(insert(models.User), [
+        {"firstname": "Storm", "lastname": str(i), "email": f"storm{i}@example.com",
+         "password": hashed, "role_status": "active"}
+        for i in range(users)
+    ])
+    db.commit()
+    db.close()
+
+def summary(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"p50 {statistics.median(ordered) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, max {ordered[-1] * 1000:.1f} ms"
+
+async def probe(client, stop, latencies):
+    """
+    Call /api/health every PROBE_INTERVAL_SECONDS until stop is set.
+
+    The time counted runs from when the call was due, so time spent waiting
+    for a blocked event loop is included.
+    """
+    while not stop.is_set():
+        due = time.perf_counter() + PROBE_INTERVAL_SECONDS
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+        response = await client.get("/api/health")
+        latencies.append(time.perf_counter() - due)
+        assert response.status_code == 200
+
+async def login(client, i):
+    response = await client.post("/api/auth/token-login", json={
+        "email": f"storm{i}@example.com", "password": PASSWORD
+    })
+    assert response.status_code == 200, response.text
+
+async def run(logins, users):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        idle = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(0.5)
+        stop.set()
+        await prober
+
+        storm = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, storm))
+        started = time.perf_counter()
+        await asyncio.gather(*(login(client, i % users) for i in range(logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    print(f"{logins} logins in {elapsed:.2f} s ({logins / elapsed:.1f}/s, bcrypt cost {BCRYPT_ROUNDS})")
+    print(f"/api/health idle:         {summary(idle)}")
+    print(f"/api/health during storm: {summary(storm)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--logins", type=int, default=200, help="concurrent login requests")
+    parser.add_argument("--users", type=int, default=50, help="distinct users logging in")
+    parser.add_argument("--inline", action="store_true", help="check passwords on the event loop")
+    args = parser.parse_args()
+
+    if args.inline:
+        async def check_inline(db, user, password):
+            hashed_password = user.password
+            db.expunge(user)
+            db.rollback()
+            return verify_password(password, hashed_password)
+        auth._check_password = check_inline
+
+    seed(args.users)
+    asyncio.run(run(args.logins, args.users))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,10 @@
 
-from docx import Document
 from lxml import etree
 from docx.oxml.ns import qn
 import os
 import logging
 import re
-from docx_recovery_tool import validate_and_repair_docx
+from docx_recovery_tool import open_docx, cleanup_temp_files
 
 # Setup logger
 logger = logging.getLogger("doc_xml_colspan")
@@ -95,15 +94,16 @@ def is_in_part_one_context(text):
 def docx_to_custom_xml(docx_path, xml_output_path):
     logger.info(f"Processing DOCX: {docx_path}")
     
-    # Validate and repair DOCX file if needed
+    # Open the DOCX once, repairing the package if it cannot be opened as is
     try:
-        is_valid, working_docx_path = validate_and_repair_docx(docx_path, repair_if_needed=True)
-        if not is_valid:
+        doc, working_docx_path = open_docx(docx_path, repair_if_needed=True)
+        if doc is None:
             logger.error(f"DOCX file validation failed and could not be repaired: {docx_path}")
             return
         
-        # working_docx_path will be the same as docx_path since we repair in-place
-        doc = Document(working_docx_path)
+        # A repaired copy lives in a temp folder; the Document is already in memory
+        if working_docx_path != docx_path:
+            cleanup_temp_files(working_docx_path)
         
     except Exception as e:
         logger.error(f"Failed to open DOCX file {docx_path}: \"{e}\"")
@@ -201,9 +201,14 @@ def docx_to_custom_xml(docx_path, xml_output_path):
     # Track if we're in Part I context
     in_part_one = False
 
+    # Map body elements to their python-docx wrappers once instead of
+    # rescanning doc.paragraphs / doc.tables for every block
+    paragraphs_by_element = {p._element: p for p in doc.paragraphs}
+    tables_by_element = {t._element: t for t in doc.tables}
+
     for block in doc.element.body:
         if block.tag.endswith('p'):
-            para = next((p for p in doc.paragraphs if p._element == block), None)
+            para = paragraphs_by_element.get(block)
             if para is None: continue
 
             style = para.style.name.lower()
@@ -245,7 +250,7 @@ def docx_to_custom_xml(docx_path, xml_output_path):
                 logger.info(f"Added paragraph: {para.text[:30]}...")
 
         elif block.tag.endswith('tbl'):
-            table = next((t for t in doc.tables if t._element == block), None)
+            table = tables_by_element.get(block)
             if table is None:
                 logger.warning("Table block not found in doc.tables.")
                 continue
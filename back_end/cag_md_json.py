@@ -3065,15 +3065,8 @@ def extract_audit_year_and_state_from_heading(heading):
     
     return audit_years, state
 
-def process_markdown_file(doc_path):
-    file_id = os.path.splitext(os.path.basename(doc_path))[0]
-    with open(doc_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    metadata = extract_metadata_from_lines(lines)
-    if not metadata["document_name"]:
-        metadata["document_name"] = file_id
-
+def extract_heading_period_and_dates(lines, metadata):
+    """Fill document_heading, Period_of_audit and Date_of_audit in metadata from the heading and the lines around it"""
     # Find document heading and extract audit year/state if present
     heading_line_idx = None
     detected_state = None
@@ -3123,6 +3116,17 @@ def process_markdown_file(doc_path):
     elif date_from:  # Single date found
         metadata["Date_of_audit"]["Period_From"] = date_from
         metadata["Date_of_audit"]["Period_To"] = date_from
+
+def process_markdown_file(doc_path):
+    file_id = os.path.splitext(os.path.basename(doc_path))[0]
+    with open(doc_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+
+    metadata = extract_metadata_from_lines(lines)
+    if not metadata["document_name"]:
+        metadata["document_name"] = file_id
+
+    extract_heading_period_and_dates(lines, metadata)
     
     # Extract Audit Officer Details from Part I tables
     officer_details = extract_officer_details_from_part_i(lines)
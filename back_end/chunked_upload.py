@@ -0,0 +1,293 @@
+"""
+Resumable chunked uploads.
+
+Large batches of inspection reports are uploaded over unreliable links, so a
+single dropped connection must not lose the whole transfer. A client creates
+an upload session, sends the file as a sequence of chunks at explicit byte
+offsets and finalizes the session once every byte has arrived. If the
+connection drops, the client asks the server for the current offset and
+resumes from there.
+
+Sessions are kept on local disk (a ``.part`` file plus a small JSON metadata
+file per session) so they survive server restarts. Finalizing a session moves
+the assembled file into the uploads folder and hands it to the same
+ingestion path used by ``/api/bulk-process-documents``.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+
+from database import get_db
+from ingestion import (
+    UPLOAD_FOLDER, allowed_file, compute_sha256, duplicate_result, find_duplicate, ingest_document, unique_upload_path,
+)
+
+# Where in-progress uploads are kept
+CHUNKED_UPLOAD_FOLDER = os.getenv("CHUNKED_UPLOAD_FOLDER", os.path.join(UPLOAD_FOLDER, ".partial"))
+# Largest file a single session may upload (bytes)
+CHUNKED_UPLOAD_MAX_BYTES = int(os.getenv("CHUNKED_UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+# Suggested chunk size returned to clients (bytes)
+CHUNKED_UPLOAD_CHUNK_BYTES = int(os.getenv("CHUNKED_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Sessions untouched for this long are discarded
+CHUNKED_UPLOAD_EXPIRE_HOURS = int(os.getenv("CHUNKED_UPLOAD_EXPIRE_HOURS", "48"))
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+class ChunkedUploadStore:
+    """Local-disk storage for upload sessions"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        # One lock per session so concurrent PUTs cannot interleave their writes
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.json")
+
+    def data_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.part")
+
+    def lock(self, upload_id: str) -> asyncio.Lock:
+        if not _UPLOAD_ID_RE.match(upload_id or ""):
+            # Unknown IDs 404 anyway - don't keep a lock around for them
+            return asyncio.Lock()
+        if upload_id not in self._locks:
+            self._locks[upload_id] = asyncio.Lock()
+        return self._locks[upload_id]
+
+    def create(self, filename: str, total_size: int) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        session = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "total_size": total_size,
+            "created_at": datetime.now().isoformat(),
+        }
+        # Create the empty data file before the metadata so a session never
+        # exists without its data file
+        open(self.data_path(upload_id), "wb").close()
+        with open(self._meta_path(upload_id), "w", encoding="utf-8") as f:
+            json.dump(session, f)
+        return session
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        if not _UPLOAD_ID_RE.match(upload_id or ""):
+            return None
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # The data file itself is the source of truth for how much arrived,
+        # including bytes written by a chunk whose connection dropped midway
+        data_path = self.data_path(upload_id)
+        session["offset"] = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        return session
+
+    def delete(self, upload_id: str) -> None:
+        for path in (self._meta_path(upload_id), self.data_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        self._locks.pop(upload_id, None)
+
+    def expire_stale(self, max_age_hours: int) -> int:
+        """Delete sessions that have not been written to for max_age_hours"""
+        cutoff = time.time() - max_age_hours * 3600
+        removed = 0
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            data_path = self.data_path(upload_id)
+            last_write = os.path.getmtime(data_path) if os.path.exists(data_path) else 0
+            if last_write < cutoff:
+                self.delete(upload_id)
+                removed += 1
+        return removed
+
+upload_store = ChunkedUploadStore(CHUNKED_UPLOAD_FOLDER)
+
+# Create API router for chunked upload endpoints
+router = APIRouter(
+    prefix="/api/chunked-uploads",
+    tags=["chunked uploads"],
+    responses={404: {"description": "Not found"}}
+)
+
+class ChunkedUploadCreate(BaseModel):
+    filename: str
+    total_size: int
+
+def _session_response(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "total_size": session["total_size"],
+        "offset": session["offset"],
+        "complete": session["offset"] == session["total_size"],
+        "chunk_size": CHUNKED_UPLOAD_CHUNK_BYTES,
+    }
+
+def _get_session_or_404(upload_id: str) -> Dict[str, Any]:
+    session = upload_store.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+@router.post("")
+async def create_upload_session(payload: ChunkedUploadCreate) -> Any:
+    """
+    Start a resumable upload
+
+    Args:
+        payload: Filename and total size of the file to upload
+
+    Returns:
+        dict: Session info including the upload_id and current offset (0)
+
+    Raises:
+        HTTPException: If the file type is not allowed or the size is invalid
+    """
+    if not allowed_file(payload.filename):
+        raise HTTPException(status_code=400, detail="File type not allowed")
+    if payload.total_size <= 0 or payload.total_size > CHUNKED_UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"total_size must be between 1 and {CHUNKED_UPLOAD_MAX_BYTES} bytes"
+        )
+
+    # Opportunistically clear out abandoned sessions
+    upload_store.expire_stale(CHUNKED_UPLOAD_EXPIRE_HOURS)
+
+    session = upload_store.create(payload.filename, payload.total_size)
+    session["offset"] = 0
+    return _session_response(session)
+
+@router.get("/{upload_id}")
+async def get_upload_session(upload_id: str) -> Any:
+    """
+    Get the state of an upload - clients call this to find where to resume
+
+    Args:
+        upload_id: ID returned when the session was created
+
+    Returns:
+        dict: Session info including the number of bytes received so far
+    """
+    return _session_response(_get_session_or_404(upload_id))
+
+@router.put("/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)) -> Any:
+    """
+    Append a chunk to an upload
+
+    The request body is the raw chunk. ``offset`` must equal the number of
+    bytes the server already holds; anything else is rejected with 409 and
+    the expected offset so the client can resynchronise.
+
+    Args:
+        upload_id: ID returned when the session was created
+        request: Request whose body is the chunk
+        offset: Byte offset of the first byte of the chunk
+
+    Returns:
+        dict: Session info with the new offset
+
+    Raises:
+        HTTPException: If the session is unknown, the offset is wrong or the
+            chunk would exceed the declared size
+    """
+    async with upload_store.lock(upload_id):
+        session = _get_session_or_404(upload_id)
+        if offset != session["offset"]:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Offset mismatch", "expected_offset": session["offset"]}
+            )
+
+        received = offset
+        with open(upload_store.data_path(upload_id), "ab") as f:
+            async for chunk in request.stream():
+                if received + len(chunk) > session["total_size"]:
+                    # Keep what fits the declared size so the offset stays consistent
+                    f.write(chunk[:session["total_size"] - received])
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Chunk exceeds the declared total_size"
+                    )
+                f.write(chunk)
+                received += len(chunk)
+
+        session["offset"] = received
+        return _session_response(session)
+
+@router.post("/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, db: Session = Depends(get_db)) -> Any:
+    """
+    Complete an upload and process the file
+
+    Args:
+        upload_id: ID returned when the session was created
+        db: Database session
+
+    Returns:
+        dict: The same result/error entry ``/api/bulk-process-documents``
+            produces for a single file
+
+    Raises:
+        HTTPException: If the session is unknown or not all bytes have arrived
+    """
+    async with upload_store.lock(upload_id):
+        session = _get_session_or_404(upload_id)
+        if session["offset"] != session["total_size"]:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Upload incomplete", "expected_offset": session["offset"]}
+            )
+
+        # Same content already uploaded: link to it, don't store or convert again
+        sha256 = compute_sha256(upload_store.data_path(upload_id))
+        existing = find_duplicate(db, sha256)
+        if existing:
+            upload_store.delete(upload_id)
+            return {"status": "success", "upload_id": upload_id, "result": duplicate_result(existing)}
+
+        filename, file_path = unique_upload_path(secure_filename(session["filename"]))
+        os.replace(upload_store.data_path(upload_id), file_path)
+        upload_store.delete(upload_id)
+
+    result, error = await run_in_threadpool(
+        ingest_document, db, file_path, filename, session["filename"], session["total_size"], sha256
+    )
+    if error:
+        return {"status": "error", "upload_id": upload_id, "error": error}
+    return {"status": "success", "upload_id": upload_id, "result": result}
+
+@router.delete("/{upload_id}")
+async def abort_upload(upload_id: str) -> Any:
+    """
+    Abandon an upload and discard the bytes received so far
+
+    Args:
+        upload_id: ID returned when the session was created
+
+    Returns:
+        dict: Success message
+    """
+    async with upload_store.lock(upload_id):
+        _get_session_or_404(upload_id)
+        upload_store.delete(upload_id)
+    return {"message": "Upload aborted", "upload_id": upload_id}
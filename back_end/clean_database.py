@@ -4,15 +4,18 @@ Script to clean the database and remove all uploaded file records
 """
 
 from database import SessionLocal
-from models import UploadedFile
+from models import DocumentBlob, DocumentVersion, UploadedFile
 
 def clean_database():
     """Remove all records from the uploaded_files table"""
     db = SessionLocal()
     
     try:
-        # Delete all existing records
+        # Delete all existing records; versions first, SQLite does not cascade
+        db.query(DocumentVersion).delete()
         deleted_count = db.query(UploadedFile).delete()
+        # A bulk delete skips the ORM cascade, so remove the files' JSON payloads too
+        db.query(DocumentBlob).delete()
         db.commit()
         print(f'✅ Deleted {deleted_count} records from database')
         
@@ -0,0 +1,162 @@
+"""
+Compressed JSON column type.
+
+Report JSON is large and highly repetitive - every audit log entry and
+draft carries near-identical copies of the same report - so payloads are
+stored compressed in a binary column:
+
+    <marker byte><payload>
+
+    0x00  uncompressed compact JSON (payloads under COMPRESS_MIN_BYTES)
+    0x01  zlib
+    0x02  zstd
+    0x03  zstd with the shared dictionary (see train_dictionary)
+
+zstd is used when the optional ``zstandard`` package is installed,
+otherwise zlib. Values are decompressed when the column is loaded, so
+deferred columns are only decompressed when accessed. Rows written before
+the column was compressed hold plain JSON text, which is read as is;
+``migrate_database.py`` converts them.
+
+Once data has been written with a dictionary, JSON_ZSTD_DICT_PATH must stay
+available to read it back.
+"""
+
+import json
+import os
+import zlib
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+from json_utils import compact_json_dumps
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON_COMPRESSION_LEVEL = int(os.getenv("JSON_COMPRESSION_LEVEL", "6"))
+# Payloads smaller than this are stored uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "256"))
+# zstd dictionary trained on the report corpus (optional)
+JSON_ZSTD_DICT_PATH = os.getenv("JSON_ZSTD_DICT_PATH", "json_zstd.dict")
+
+_PLAIN = 0x00
+_ZLIB = 0x01
+_ZSTD = 0x02
+_ZSTD_DICT = 0x03
+
+_zstd_dictionary = None
+
+def load_dictionary(path: str = JSON_ZSTD_DICT_PATH) -> bool:
+    """
+    Load the zstd dictionary used for new writes and dictionary-compressed reads.
+
+    Returns:
+        bool: True if a dictionary is now in use
+    """
+    global _zstd_dictionary
+    if zstandard is None or not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        _zstd_dictionary = zstandard.ZstdCompressionDict(f.read())
+    return True
+
+load_dictionary()
+
+def compress_json(value) -> bytes:
+    """Serialize value compactly and compress it with the best available codec"""
+    raw = compact_json_dumps(value).encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return bytes([_PLAIN]) + raw
+    if zstandard is not None:
+        if _zstd_dictionary is not None:
+            compressor = zstandard.ZstdCompressor(level=JSON_COMPRESSION_LEVEL, dict_data=_zstd_dictionary)
+            return bytes([_ZSTD_DICT]) + compressor.compress(raw)
+        return bytes([_ZSTD]) + zstandard.ZstdCompressor(level=JSON_COMPRESSION_LEVEL).compress(raw)
+    return bytes([_ZLIB]) + zlib.compress(raw, JSON_COMPRESSION_LEVEL)
+
+def decompress_json(stored):
+    """
+    Decode a stored value, accepting legacy uncompressed JSON text.
+
+    Raises:
+        ValueError: If the value needs zstd (or its dictionary) and it is unavailable
+    """
+    if isinstance(stored, str):
+        return json.loads(stored)
+    stored = bytes(stored)
+    if not stored:
+        return None
+
+    marker, payload = stored[0], stored[1:]
+    if marker == _PLAIN:
+        raw = payload
+    elif marker == _ZLIB:
+        raw = zlib.decompress(payload)
+    elif marker in (_ZSTD, _ZSTD_DICT):
+        if zstandard is None:
+            raise ValueError("Value is zstd-compressed but the zstandard package is not installed")
+        if marker == _ZSTD_DICT:
+            if _zstd_dictionary is None:
+                raise ValueError(f"Value needs the zstd dictionary at {JSON_ZSTD_DICT_PATH}")
+            raw = zstandard.ZstdDecompressor(dict_data=_zstd_dictionary).decompress(payload)
+        else:
+            raw = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        # Legacy row: plain JSON text stored before compression was enabled
+        raw = stored
+    return json.loads(raw.decode("utf-8"))
+
+def is_compressed(stored) -> bool:
+    """True if a raw column value is already in the compressed format"""
+    if stored is None or isinstance(stored, str):
+        return False
+    stored = bytes(stored)
+    return bool(stored) and stored[0] in (_PLAIN, _ZLIB, _ZSTD, _ZSTD_DICT)
+
+class CompressedJSON(TypeDecorator):
+    """JSON stored compressed in a binary column"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_json(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_json(value)
+
+def train_dictionary(samples, dict_size: int = 112 * 1024, path: str = JSON_ZSTD_DICT_PATH) -> str:
+    """
+    Train a zstd dictionary on sample payloads and save it to path.
+
+    An existing dictionary is never replaced: payloads written with it
+    could no longer be read. Call load_dictionary() (or restart) to start
+    using the new one.
+
+    Args:
+        samples: Iterable of JSON-serializable payloads from the report corpus
+        dict_size: Target dictionary size in bytes
+        path: Where to write the dictionary
+
+    Returns:
+        str: The path written
+
+    Raises:
+        RuntimeError: If the zstandard package is not installed
+        FileExistsError: If a dictionary already exists at path
+    """
+    if zstandard is None:
+        raise RuntimeError("Training a dictionary requires the zstandard package")
+    if os.path.exists(path):
+        raise FileExistsError(f"A zstd dictionary already exists at {path}")
+    encoded = [compact_json_dumps(sample).encode("utf-8") for sample in samples]
+    dictionary = zstandard.train_dictionary(dict_size, encoded)
+    with open(path, "wb") as f:
+        f.write(dictionary.as_bytes())
+    return path
@@ -0,0 +1,215 @@
+"""
+Run DOCX conversions in sandboxed worker processes.
+
+Parsing a DOCX means inflating a zip archive and building large XML trees,
+so one malformed or hostile upload can hang or exhaust the memory of the
+process doing it. Conversions therefore never run in the web process:
+
+- Before anything is parsed, the archive's central directory is checked
+  for absurd uncompressed sizes, compression ratios and entry counts.
+- The conversion runs in a child process with an address-space cap.
+- Only CONVERSION_WORKERS conversions are handed to the pool at a time;
+  the rest wait their turn in the caller. Once handed over, a conversion
+  gets CONVERSION_TIMEOUT_SECONDS; a worker that overruns is killed and
+  the pool rebuilt. Conversions that were running
+  beside it in the killed pool are run again in the new one, so one slow
+  upload does not fail the others.
+- Workers are recycled after CONVERSION_MAX_TASKS_PER_CHILD conversions so
+  leaked memory does not accumulate.
+"""
+
+import multiprocessing
+import os
+import threading
+import weakref
+import zipfile
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Try to import the full pipeline, fallback to simple processor
+try:
+    from document_processing_pipeline import convert_docx_to_json
+    PIPELINE_AVAILABLE = True
+except ImportError:
+    from simple_docx_processor import simple_convert_docx_to_json as convert_docx_to_json
+    PIPELINE_AVAILABLE = False
+
+# Worker pool
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", "2"))
+CONVERSION_MAX_TASKS_PER_CHILD = int(os.getenv("CONVERSION_MAX_TASKS_PER_CHILD", "20"))
+CONVERSION_TIMEOUT_SECONDS = int(os.getenv("CONVERSION_TIMEOUT_SECONDS", "300"))
+# Address-space cap per worker (MB), 0 disables it
+CONVERSION_MEMORY_LIMIT_MB = int(os.getenv("CONVERSION_MEMORY_LIMIT_MB", "2048"))
+# Times a conversion is started when pools are killed under it for other tasks' timeouts
+CONVERSION_MAX_ATTEMPTS = int(os.getenv("CONVERSION_MAX_ATTEMPTS", "3"))
+
+# Archive pre-check limits
+DOCX_MAX_UNCOMPRESSED_BYTES = int(os.getenv("DOCX_MAX_UNCOMPRESSED_BYTES", str(512 * 1024 * 1024)))
+DOCX_MAX_COMPRESSION_RATIO = int(os.getenv("DOCX_MAX_COMPRESSION_RATIO", "100"))
+DOCX_MAX_ENTRIES = int(os.getenv("DOCX_MAX_ENTRIES", "10000"))
+
+class ConversionError(Exception):
+    """A document could not be converted safely"""
+
+class UnsafeArchiveError(ConversionError):
+    """The archive failed the pre-check and was not parsed"""
+
+class ConversionTimeoutError(ConversionError):
+    """The conversion did not finish within CONVERSION_TIMEOUT_SECONDS"""
+
+def check_archive(path: str) -> None:
+    """
+    Reject archives whose central directory describes a zip bomb.
+
+    Only the central directory is read; no entry is decompressed.
+
+    Args:
+        path: Path to the DOCX (zip) file
+
+    Raises:
+        UnsafeArchiveError: If the archive is unreadable or exceeds a limit
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            entries = archive.infolist()
+    except (zipfile.BadZipFile, OSError) as e:
+        raise UnsafeArchiveError(f"Not a readable DOCX archive: {e}")
+
+    if len(entries) > DOCX_MAX_ENTRIES:
+        raise UnsafeArchiveError(f"Archive has {len(entries)} entries (limit {DOCX_MAX_ENTRIES})")
+
+    total_uncompressed = 0
+    for entry in entries:
+        total_uncompressed += entry.file_size
+        if entry.file_size > 1024 * 1024 and entry.file_size > entry.compress_size * DOCX_MAX_COMPRESSION_RATIO:
+            raise UnsafeArchiveError(
+                f"Entry {entry.filename} expands {entry.file_size // max(entry.compress_size, 1)}x "
+                f"(limit {DOCX_MAX_COMPRESSION_RATIO}x)"
+            )
+    if total_uncompressed > DOCX_MAX_UNCOMPRESSED_BYTES:
+        raise UnsafeArchiveError(
+            f"Archive expands to {total_uncompressed} bytes (limit {DOCX_MAX_UNCOMPRESSED_BYTES})"
+        )
+
+def _limit_worker_memory(limit_mb: int) -> None:
+    """Pool initializer: cap the worker's address space"""
+    if resource is None or limit_mb <= 0:
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+class ConversionPool:
+    """A process pool that is torn down and rebuilt when a worker hangs or dies"""
+
+    def __init__(self, workers: int, max_tasks_per_child: int, memory_limit_mb: int):
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.memory_limit_mb = memory_limit_mb
+        self._executor = None
+        self._lock = threading.Lock()
+        # At most one submitted task per worker, so a task starts running as
+        # soon as it is submitted and its timeout never covers time queued
+        self._slots = threading.BoundedSemaphore(workers)
+        # Pools killed because one of their tasks timed out
+        self._killed = weakref.WeakSet()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Fresh interpreters: nothing from the web process leaks in
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_limit_worker_memory,
+                    initargs=(self.memory_limit_mb,),
+                    max_tasks_per_child=self.max_tasks_per_child,
+                )
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor, killed: bool = False) -> None:
+        """
+        Kill the workers of a pool that hung or broke; the next call builds a new one.
+
+        Args:
+            executor: The pool to discard
+            killed: True when it is discarded for a task's timeout, so the
+                other tasks it breaks are run again
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+            if killed:
+                self._killed.add(executor)
+        # ProcessPoolExecutor cannot cancel a running task, so stop its workers
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn, *args, timeout: int):
+        with self._slots:
+            return self._run(fn, *args, timeout=timeout)
+
+    def _run(self, fn, *args, timeout: int):
+        for _ in range(CONVERSION_MAX_ATTEMPTS):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+                error = future.exception(timeout=timeout)
+            except FutureTimeoutError:
+                self._discard(executor, killed=True)
+                raise ConversionTimeoutError(f"Conversion did not finish within {timeout} seconds")
+            except (BrokenProcessPool, CancelledError, RuntimeError):
+                # RuntimeError: submitted to a pool that was shut down in the meantime
+                if executor in self._killed:
+                    continue  # Killed for another task's timeout; run this one again
+                self._discard(executor)
+                raise ConversionError("Conversion worker crashed (out of memory or killed)")
+
+            if isinstance(error, BrokenProcessPool):
+                if executor in self._killed:
+                    continue
+                # The worker died - typically killed for exceeding its memory cap
+                self._discard(executor)
+                raise ConversionError("Conversion worker crashed (out of memory or killed)")
+            if isinstance(error, MemoryError):
+                # Raised inside the worker when an allocation hit its address-space cap
+                raise ConversionError("Conversion ran out of memory")
+            if error is not None:
+                raise error
+            return future.result()
+        raise ConversionError("Conversion was interrupted by other conversions timing out; try again")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+conversion_pool = ConversionPool(
+    CONVERSION_WORKERS, CONVERSION_MAX_TASKS_PER_CHILD, CONVERSION_MEMORY_LIMIT_MB
+)
+
+def convert_docx_sandboxed(docx_path: str, timeout: int = CONVERSION_TIMEOUT_SECONDS):
+    """
+    Convert a DOCX to structured JSON in a sandboxed worker process.
+
+    Args:
+        docx_path: Path to the DOCX file
+        timeout: Seconds to wait before the worker is killed
+
+    Returns:
+        dict: Structured JSON data extracted from the document
+
+    Raises:
+        UnsafeArchiveError: If the archive fails the pre-check
+        ConversionError: If the worker times out, crashes or runs out of memory
+        Exception: Any error raised by the conversion itself
+    """
+    if str(docx_path).lower().endswith(".docx"):
+        check_archive(docx_path)
+    return conversion_pool.run(convert_docx_to_json, os.path.abspath(docx_path), timeout=timeout)
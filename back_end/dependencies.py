@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 from database import get_db
 from jwt_token import decode_token
 from models import User
+from principals import get_principal
 from schemas import TokenPayload
 
 load_dotenv()
@@ -19,15 +20,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     """
     Get the current user from the token
     
+    The user, with roles and config loaded, comes from the principal cache;
+    the database is only read the first time a token is seen within
+    PRINCIPAL_CACHE_SECONDS.
+    
     Args:
         token: JWT token from request
         db: Database session
         
     Returns:
-        User: Current authenticated user
+        User: Current authenticated user (a transient copy, not attached to db)
         
     Raises:
-        HTTPException: If token is invalid or user not found
+        HTTPException: If token is invalid or revoked, or user not found
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,15 +45,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         payload = decode_token(token)
         email = payload.get("sub")
         user_id = payload.get("user_id")
+        # Tokens issued before token versions existed count as version 0
+        token_version = payload.get("token_version", 0)
         
-        if email is None or user_id is None:
+        if email is None or user_id is None or not isinstance(token_version, int):
             raise credentials_exception
             
     except JWTError:
         raise credentials_exception
     
-    # Get user from database
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_principal(db, user_id, token_version)
     
     if user is None:
         raise credentials_exception
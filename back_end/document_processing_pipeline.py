@@ -3,11 +3,14 @@
 Document Processing Pipeline
 ============================
 
-This script processes Word documents (.docx) directly to JSON and stores in database.
-Simplified flow: DOCX → JSON → Database
+This script converts Word documents (.docx) to structured JSON.
+Flow: DOCX → XML → Markdown → JSON
+
+The web app calls convert_docx_to_json through conversion_sandbox, which
+stores the result; run as a script it batch-converts a folder.
 
 Usage:
-    python document_processing_pipeline.py [docx_file_path] [db_session] [file_id]
+    python document_processing_pipeline.py [input_folder] [output_folder]
     
 If no arguments provided, it will use default folders for batch processing.
 """
@@ -19,7 +22,8 @@ import logging
 from pathlib import Path
 import tempfile
 import shutil
-from datetime import datetime, timezone
+
+from json_utils import compact_json_dumps
 
 # Import the three processing modules
 try:
@@ -46,118 +50,78 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def process_docx_to_json_and_db(docx_path, db_session, file_id):
+def convert_docx_to_json(docx_path):
     """
-    Process a single DOCX file to JSON and store in database.
+    Convert a single DOCX file to structured JSON data.
+    
+    Runs the three conversion steps in temporary folders and returns the
+    result without touching the database or writing any output file.
     
     Args:
         docx_path (str): Path to the DOCX file
-        db_session: Database session
-        file_id (int): ID of the file record in database
     
     Returns:
-        dict: Result with status and extracted JSON data
+        dict: Structured JSON data extracted from the document
+    
+    Raises:
+        Exception: If any conversion step fails
     """
     docx_path = Path(docx_path)
     base_name = docx_path.stem
     
     logger.info(f"Processing: {docx_path.name}")
     
+    # Create temporary folders for intermediate files
+    temp_xml_folder = Path(tempfile.mkdtemp(prefix='pipeline_xml_'))
+    temp_md_folder = Path(tempfile.mkdtemp(prefix='pipeline_md_'))
+    
     try:
-        # Create temporary folders for intermediate files
-        temp_xml_folder = Path(tempfile.mkdtemp(prefix='pipeline_xml_'))
-        temp_md_folder = Path(tempfile.mkdtemp(prefix='pipeline_md_'))
+        # Step 1: DOCX to XML
+        logger.info(f"Step 1: Converting {docx_path.name} to XML")
+        xml_path = temp_xml_folder / f"{base_name}.xml"
+        cag_doc_xml.docx_to_custom_xml(str(docx_path), str(xml_path))
+        
+        if not xml_path.exists():
+            raise Exception("Failed to create XML file")
+        
+        logger.info(f"✓ XML created: {xml_path.name}")
+        
+        # Step 2: XML to Markdown
+        logger.info(f"Step 2: Converting {xml_path.name} to Markdown")
+        md_path = temp_md_folder / f"{base_name}.md"
+        cag_xml_md.xml_to_md(str(xml_path), str(md_path))
         
+        if not md_path.exists():
+            raise Exception("Failed to create Markdown file")
+        
+        logger.info(f"✓ Markdown created: {md_path.name}")
+        
+        # Step 3: Markdown to JSON
+        logger.info(f"Step 3: Converting {md_path.name} to JSON")
+        
+        # Process the markdown file using the existing function
+        structured_data = cag_md_json.process_markdown_file(str(md_path))
+        
+        # Make sure the data serializes before it is handed to the database
         try:
-            # Step 1: DOCX to XML
-            logger.info(f"Step 1: Converting {docx_path.name} to XML")
-            xml_path = temp_xml_folder / f"{base_name}.xml"
-            cag_doc_xml.docx_to_custom_xml(str(docx_path), str(xml_path))
-            
-            if not xml_path.exists():
-                raise Exception("Failed to create XML file")
-            
-            logger.info(f"✓ XML created: {xml_path.name}")
-            
-            # Step 2: XML to Markdown
-            logger.info(f"Step 2: Converting {xml_path.name} to Markdown")
-            md_path = temp_md_folder / f"{base_name}.md"
-            cag_xml_md.xml_to_md(str(xml_path), str(md_path))
-            
-            if not md_path.exists():
-                raise Exception("Failed to create Markdown file")
-            
-            logger.info(f"✓ Markdown created: {md_path.name}")
-            
-            # Step 3: Markdown to JSON
-            logger.info(f"Step 3: Converting {md_path.name} to JSON")
-            
-            # Process the markdown file using the existing function
-            structured_data = cag_md_json.process_markdown_file(str(md_path))
-            
-            # Convert to JSON string with proper escaping
-            try:
-                json_string = json.dumps(structured_data, indent=2, ensure_ascii=False)
-            except Exception as e:
-                logger.error(f"JSON serialization error: {e}")
-                # Try to fix the structured data before JSON conversion
-                structured_data = _fix_structured_data_for_json(structured_data)
-                json_string = json.dumps(structured_data, indent=2, ensure_ascii=False)
-            
-            # Save JSON file to uploads folder
-            json_filename = f"{base_name}.json"
-            json_file_path = os.path.join(os.path.dirname(docx_path), json_filename)
-            
-            try:
-                with open(json_file_path, 'w', encoding='utf-8') as json_file:
-                    json_file.write(json_string)
-                logger.info(f"✓ JSON file saved: {json_file_path}")
-            except Exception as e:
-                logger.error(f"Failed to save JSON file: {e}")
-            
-            # Update database record with extracted JSON
-            from models import UploadedFile
-            file_record = db_session.query(UploadedFile).filter(UploadedFile.id == file_id).first()
-            
-            if file_record:
-                file_record.extracted_json = structured_data
-                file_record.json_updated_at = datetime.now(timezone.utc)
-                db_session.commit()
-                logger.info(f"✓ JSON stored in database for file ID: {file_id}")
-            else:
-                logger.error(f"File record not found for ID: {file_id}")
-                return {
-                    'status': 'error',
-                    'message': f'File record not found for ID: {file_id}',
-                    'extracted_json': None
-                }
-            
-            logger.info(f"✅ Successfully processed: {docx_path.name}")
-            
-            return {
-                'status': 'success',
-                'message': f'Successfully processed {docx_path.name}',
-                'extracted_json': structured_data
-            }
-            
-        finally:
-            # Clean up temporary folders
-            if temp_xml_folder and temp_xml_folder.exists():
-                shutil.rmtree(temp_xml_folder)
-                logger.info(f"Cleaned up temp XML folder: {temp_xml_folder}")
-            
-            if temp_md_folder and temp_md_folder.exists():
-                shutil.rmtree(temp_md_folder)
-                logger.info(f"Cleaned up temp MD folder: {temp_md_folder}")
-            
-    except Exception as e:
-        error_msg = f"❌ Error processing {docx_path.name}: {str(e)}"
-        logger.error(error_msg)
-        return {
-            'status': 'error',
-            'message': error_msg,
-            'extracted_json': None
-        }
+            compact_json_dumps(structured_data)
+        except Exception as e:
+            logger.error(f"JSON serialization error: {e}")
+            # Try to fix the structured data before JSON conversion
+            structured_data = _fix_structured_data_for_json(structured_data)
+        
+        logger.info(f"✅ Successfully converted: {docx_path.name}")
+        return structured_data
+        
+    finally:
+        # Clean up temporary folders
+        if temp_xml_folder and temp_xml_folder.exists():
+            shutil.rmtree(temp_xml_folder)
+            logger.info(f"Cleaned up temp XML folder: {temp_xml_folder}")
+        
+        if temp_md_folder and temp_md_folder.exists():
+            shutil.rmtree(temp_md_folder)
+            logger.info(f"Cleaned up temp MD folder: {temp_md_folder}")
 
 def _fix_structured_data_for_json(data):
     """Fix structured data to ensure it's JSON serializable"""
@@ -339,15 +303,6 @@ class DocumentProcessor:
 def main():
     """Main function to run the pipeline"""
     
-    # Check if called with direct processing arguments (docx_path, db_session, file_id)
-    if len(sys.argv) == 4:
-        docx_path = sys.argv[1]
-        # For direct processing, we expect the caller to handle database session
-        # This is mainly for backward compatibility with batch processing
-        print(f"Direct processing mode not supported via command line")
-        print(f"Use process_docx_to_json_and_db() function instead")
-        sys.exit(1)
-    
     # Default folders - Updated for local development
     default_input = "uploads"  # Local uploads folder
     default_output = "converted_json"  # Local output folder
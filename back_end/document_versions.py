@@ -0,0 +1,563 @@
+"""
+Versioned document store.
+
+Every edit to a report's JSON is recorded as a row in ``document_versions``
+holding a JSON Patch (RFC 6902) against the previous version - typically a
+few hundred bytes instead of another full copy of the report. Every
+DOCUMENT_SNAPSHOT_INTERVAL versions a full snapshot is stored instead, so
+rebuilding any historical version reads one snapshot and at most
+DOCUMENT_SNAPSHOT_INTERVAL - 1 patches.
+
+Edits are made against a version number. If other edits were saved in the
+meantime they are merged automatically as long as they changed different
+parts of the document (see ``check_mergeable``); only overlapping changes
+are rejected as conflicts.
+
+The latest state is still kept whole on the file record (``extracted_json``
+for submitted content, ``updated_json`` for pending changes), so reading the
+current document never replays history.
+
+A file's history starts when its JSON is extracted. Files extracted before
+histories were kept start theirs on their first edit: version 1 is the
+extracted JSON at that point, and pending changes already on the record
+become version 2. Until then, reads report those numbers without writing
+anything (see ``unrecorded_versions``).
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session, undefer
+
+from database import get_db
+from dependencies import get_current_user
+from json_diff import iter_json_diffs, summarize_diffs
+from json_patch import JsonPatchError, apply_patch, make_patch, parse_pointer, paths_overlap, resolve_pointer, touched_paths
+import models
+from report_outline import build_outline
+
+# A full snapshot is stored every this many versions
+DOCUMENT_SNAPSHOT_INTERVAL = max(1, int(os.getenv("DOCUMENT_SNAPSHOT_INTERVAL", "20")))
+
+# Number of computed diffs kept in memory
+DIFF_CACHE_ENTRIES = int(os.getenv("DIFF_CACHE_ENTRIES", "256"))
+
+# Number of report outlines kept in memory
+OUTLINE_CACHE_ENTRIES = int(os.getenv("OUTLINE_CACHE_ENTRIES", "256"))
+
+# Versions that represent submitted (extracted_json) content rather than pending edits
+SUBMITTED_ACTIONS = ("extract", "submit")
+
+class VersionConflict(Exception):
+    """Edits made against an old version overlap changes saved since"""
+
+    def __init__(self, latest_version: int, paths: List[str]):
+        self.latest_version = latest_version
+        self.paths = paths
+        super().__init__(f"Conflicting changes at {', '.join(paths) or 'unknown paths'} (document is at version {latest_version})")
+
+def latest_version(db: Session, file_id: int, actions=None) -> Optional[models.DocumentVersion]:
+    """
+    Return the newest version row of a file, optionally limited to some actions.
+
+    Payload columns are not loaded.
+    """
+    query = db.query(models.DocumentVersion).filter(models.DocumentVersion.file_id == file_id)
+    if actions:
+        query = query.filter(models.DocumentVersion.action.in_(actions))
+    return query.order_by(models.DocumentVersion.version.desc()).first()
+
+def get_document(db: Session, file_id: int, version: int):
+    """
+    Rebuild the document as it was at a given version.
+
+    Args:
+        db: Database session
+        file_id: ID of the uploaded file
+        version: Version number to rebuild
+
+    Returns:
+        The JSON document at that version
+
+    Raises:
+        LookupError: If the file has no such version
+    """
+    snapshot_version = db.query(func.max(models.DocumentVersion.version)).filter(
+        models.DocumentVersion.file_id == file_id,
+        models.DocumentVersion.version <= version,
+        models.DocumentVersion.snapshot.isnot(None),
+    ).scalar()
+    if snapshot_version is None:
+        raise LookupError(f"Version {version} of file {file_id} not found")
+
+    rows = db.query(models.DocumentVersion).options(
+        undefer(models.DocumentVersion.snapshot), undefer(models.DocumentVersion.patch)
+    ).filter(
+        models.DocumentVersion.file_id == file_id,
+        models.DocumentVersion.version >= snapshot_version,
+        models.DocumentVersion.version <= version,
+    ).order_by(models.DocumentVersion.version).all()
+    if not rows or rows[-1].version != version:
+        raise LookupError(f"Version {version} of file {file_id} not found")
+
+    document = rows[0].snapshot
+    for row in rows[1:]:
+        document = row.snapshot if row.snapshot is not None else apply_patch(document, row.patch or [])
+    return document
+
+def _append(db: Session, file_id: int, previous, document, action: str, user_id: Optional[int], patch=None):
+    """Add the version after previous (a row or None), as a snapshot or a patch"""
+    number = previous.version + 1 if previous is not None else 1
+    row = models.DocumentVersion(file_id=file_id, version=number, action=action, user_id=user_id)
+    if (number - 1) % DOCUMENT_SNAPSHOT_INTERVAL == 0:
+        row.snapshot = document
+    elif patch is not None:
+        row.patch = patch
+    else:
+        row.patch = make_patch(get_document(db, file_id, previous.version), document)
+    db.add(row)
+    db.flush()
+    return row
+
+def start_history(db: Session, file_id: int, document, user_id: Optional[int] = None) -> models.DocumentVersion:
+    """Record freshly extracted JSON as version 1 of a file that has no history"""
+    row = models.DocumentVersion(file_id=file_id, version=1, action="extract", user_id=user_id, snapshot=document)
+    db.add(row)
+    return row
+
+def unrecorded_versions(file_record: models.UploadedFile) -> int:
+    """
+    Number of versions ensure_history would record for a file without history.
+
+    Reads use it to number the current JSON without writing the history;
+    the numbers hold once it is written, since every later change goes
+    through record_version.
+    """
+    return (file_record.extracted_json_id is not None) + (file_record.updated_json_id is not None)
+
+def current_version(db: Session, file_record: models.UploadedFile) -> Optional[int]:
+    """The version number of a file's current JSON, or None if it has none"""
+    latest = latest_version(db, file_record.id)
+    if latest is not None:
+        return latest.version
+    return unrecorded_versions(file_record) or None
+
+def ensure_history(db: Session, file_record: models.UploadedFile) -> Optional[models.DocumentVersion]:
+    """
+    Start the version history of a file from its current JSON if it has none.
+
+    Returns:
+        The latest version row, or None if the file has no JSON yet
+    """
+    latest = latest_version(db, file_record.id)
+    if latest is not None:
+        return latest
+    if file_record.extracted_json is not None:
+        latest = _append(db, file_record.id, None, file_record.extracted_json, "extract", file_record.uploaded_by)
+    if file_record.updated_json is not None:
+        latest = _append(db, file_record.id, latest, file_record.updated_json, "save", None)
+    return latest
+
+def record_version(
+    db: Session,
+    file_record: models.UploadedFile,
+    document,
+    action: str,
+    user_id: Optional[int] = None,
+    patch: Optional[List[Dict[str, Any]]] = None,
+) -> models.DocumentVersion:
+    """
+    Record document as the next version of a file.
+
+    Call this before the new JSON is written to the file record; the caller
+    commits both together.
+
+    Args:
+        db: Database session
+        file_record: The uploaded file being changed
+        document: The new JSON document
+        action: What produced it ('extract', 'save', 'submit')
+        user_id: ID of the user making the change
+        patch: Operations that turn the previous version into document, if
+            the caller already has them; otherwise they are computed
+
+    Returns:
+        DocumentVersion: The new version row
+    """
+    previous = ensure_history(db, file_record)
+    return _append(db, file_record.id, previous, document, action, user_id, patch)
+
+def diff_versions(db: Session, file_id: int, from_version: int, to_version: int) -> List[Dict[str, Any]]:
+    """
+    JSON Patch turning one version of a file into another.
+
+    Raises:
+        LookupError: If either version does not exist
+    """
+    return make_patch(get_document(db, file_id, from_version), get_document(db, file_id, to_version))
+
+def check_mergeable(
+    db: Session,
+    file_id: int,
+    base_version: int,
+    operations: List[Dict[str, Any]],
+    latest: models.DocumentVersion,
+) -> None:
+    """
+    Check that operations made against base_version can be applied on top of latest.
+
+    They can if none of the paths they touch overlaps a path changed between
+    base_version and latest; the operations then apply unchanged to the
+    latest document.
+
+    Args:
+        db: Database session
+        file_id: ID of the uploaded file
+        base_version: Version the operations were made against
+        operations: The client's JSON Patch operations
+        latest: The file's latest version row
+
+    Raises:
+        VersionConflict: If the changes overlap or base_version is unknown
+    """
+    if base_version == latest.version:
+        return
+    if base_version < 1 or base_version > latest.version:
+        raise VersionConflict(latest.version, [])
+
+    changed = touched_paths(diff_versions(db, file_id, base_version, latest.version))
+    conflicts = [
+        path for path in dict.fromkeys(touched_paths(operations))
+        if any(paths_overlap(path, other) for other in changed)
+    ]
+    if conflicts:
+        raise VersionConflict(latest.version, conflicts)
+
+def latest_submitted_document(db: Session, file_id: int):
+    """The most recent submitted content in the history, or None"""
+    row = latest_version(db, file_id, SUBMITTED_ACTIONS)
+    return get_document(db, file_id, row.version) if row is not None else None
+
+def latest_edited_document(db: Session, file_id: int):
+    """The most recent edited (not submitted) content in the history, or None"""
+    row = db.query(models.DocumentVersion).filter(
+        models.DocumentVersion.file_id == file_id,
+        models.DocumentVersion.action.notin_(SUBMITTED_ACTIONS),
+    ).order_by(models.DocumentVersion.version.desc()).first()
+    return get_document(db, file_id, row.version) if row is not None else None
+
+def resolve_diff_source(db: Session, file_record: models.UploadedFile, source: str) -> Tuple:
+    """
+    Turn a diff source into an immutable key.
+
+    Sources are ``extracted`` (submitted JSON), ``updated`` (pending
+    changes), a version number, ``audit:<id>`` (an audit log entry's new
+    JSON) or ``audit:<id>:old`` (its old JSON). ``extracted`` and
+    ``updated`` are resolved to the version they currently are, so a key
+    always refers to the same content; load them with ``_load_source``, as
+    a file without history has no version rows yet.
+
+    Raises:
+        LookupError: If the source does not exist for this file
+        ValueError: If the source is not recognised
+    """
+    if source in ("extracted", "updated"):
+        if source == "updated":
+            version = current_version(db, file_record)
+            if file_record.updated_json_id is None or version is None:
+                raise LookupError("File has no pending changes")
+            return ("version", version)
+        if file_record.extracted_json_id is None:
+            raise LookupError("File has no extracted JSON")
+        row = latest_version(db, file_record.id, SUBMITTED_ACTIONS)
+        # Without history the extracted JSON is what will become version 1
+        return ("version", row.version if row is not None else 1)
+    if source.isdigit():
+        return ("version", int(source))
+    parts = source.split(":")
+    if parts[0] == "audit" and len(parts) in (2, 3) and parts[1].isdigit():
+        side = parts[2] if len(parts) == 3 else "new"
+        if side in ("old", "new"):
+            return ("audit", int(parts[1]), side)
+    raise ValueError(f"Unknown diff source {source!r}: use extracted, updated, a version number or audit:<id>[:old]")
+
+def load_diff_source(db: Session, file_id: int, key: Tuple):
+    """
+    Load the JSON a resolve_diff_source key refers to.
+
+    Raises:
+        LookupError: If the version or audit log entry does not exist for this file
+    """
+    if key[0] == "version":
+        return get_document(db, file_id, key[1])
+    entry = db.query(models.AuditLog).filter(
+        models.AuditLog.id == key[1], models.AuditLog.file_id == file_id
+    ).first()
+    if entry is None:
+        raise LookupError(f"Audit log entry {key[1]} not found for file {file_id}")
+    return entry.old_json if key[2] == "old" else entry.new_json
+
+class DiffCache:
+    """Thread-safe LRU of results computed from immutable version keys (diffs, outlines)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard_file(self, file_id: int) -> None:
+        """Drop every entry of a file (keys start with the file id)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == file_id]:
+                del self._entries[key]
+
+diff_cache = DiffCache(DIFF_CACHE_ENTRIES)
+outline_cache = DiffCache(OUTLINE_CACHE_ENTRIES)
+
+def delete_history(db: Session, file_id: int) -> None:
+    """
+    Delete a file's versions, in the transaction that deletes the file.
+
+    ON DELETE CASCADE would do it on Postgres, but SQLite does not enforce
+    foreign keys. Call forget_file after committing.
+    """
+    db.query(models.DocumentVersion).filter(
+        models.DocumentVersion.file_id == file_id
+    ).delete(synchronize_session=False)
+
+def forget_file(file_id: int) -> None:
+    """Drop a deleted file's cached diffs and outlines, so a reused id never serves them"""
+    diff_cache.discard_file(file_id)
+    outline_cache.discard_file(file_id)
+
+# Create API router for document version endpoints
+router = APIRouter(
+    prefix="/api/documents",
+    tags=["document versions"],
+    responses={404: {"description": "Not found"}}
+)
+
+def _get_file(db: Session, file_id: int) -> models.UploadedFile:
+    file_record = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+    if not file_record:
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_record
+
+@router.get("/{file_id}/versions")
+def list_versions(
+    file_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    List the versions of a file's JSON, newest first, without their content
+    """
+    _get_file(db, file_id)
+    rows = db.query(models.DocumentVersion).filter(
+        models.DocumentVersion.file_id == file_id
+    ).order_by(models.DocumentVersion.version.desc()).all()
+    return {
+        "file_id": file_id,
+        "versions": [
+            {
+                "version": row.version,
+                "action": row.action,
+                "user_id": row.user_id,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows
+        ],
+    }
+
+@router.get("/{file_id}/versions/{version}")
+def get_version(
+    file_id: int,
+    version: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Get a file's JSON as it was at a given version
+    """
+    _get_file(db, file_id)
+    try:
+        content = get_document(db, file_id, version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"file_id": file_id, "version": version, "content": content}
+
+@router.get("/{file_id}/diff")
+def get_version_diff(
+    file_id: int,
+    from_version: int = Query(..., alias="from"),
+    to_version: int = Query(..., alias="to"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Get the JSON Patch between two versions of a file's JSON
+    """
+    _get_file(db, file_id)
+    try:
+        patch = diff_versions(db, file_id, from_version, to_version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"file_id": file_id, "from": from_version, "to": to_version, "patch": patch}
+
+def _load_source(db: Session, file_record: models.UploadedFile, source: str, key: Tuple):
+    """The document behind a resolved source, read from the file record when it is the current head"""
+    if source == "extracted":
+        return file_record.extracted_json
+    if source == "updated":
+        return file_record.updated_json
+    return load_diff_source(db, file_record.id, key)
+
+@router.get("/{file_id}/diffs")
+def get_field_diffs(
+    file_id: int,
+    from_source: str = Query("extracted", alias="from"),
+    to_source: str = Query("updated", alias="to"),
+    stream: bool = False,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Field-level differences between two versions of a file's JSON.
+
+    Both versions are loaded server-side, so clients no longer post whole
+    reports to /api/compute-diffs. ``from`` and ``to`` accept ``extracted``,
+    ``updated``, a version number or ``audit:<id>[:old]``. Results are
+    cached per version pair.
+
+    With ``stream=true`` the diffs are sent as newline-delimited JSON while
+    they are computed, and are not cached.
+    """
+    file_record = _get_file(db, file_id)
+    try:
+        from_key = resolve_diff_source(db, file_record, from_source)
+        to_key = resolve_diff_source(db, file_record, to_source)
+
+        cache_key = (file_id, from_key, to_key)
+        summary = diff_cache.get(cache_key)
+        cached = summary is not None
+        if summary is None:
+            old_json = _load_source(db, file_record, from_source, from_key)
+            new_json = _load_source(db, file_record, to_source, to_key)
+            if stream:
+                lines = (json.dumps(diff, ensure_ascii=False) + "\n" for diff in iter_json_diffs(old_json, new_json))
+                return StreamingResponse(lines, media_type="application/x-ndjson")
+            summary = summarize_diffs(list(iter_json_diffs(old_json, new_json)))
+            diff_cache.put(cache_key, summary)
+        elif stream:
+            lines = (json.dumps(diff, ensure_ascii=False) + "\n" for diff in summary["diffs"])
+            return StreamingResponse(lines, media_type="application/x-ndjson")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "success": True,
+        "file_id": file_id,
+        "from": from_source,
+        "to": to_source,
+        "cached": cached,
+        **summary
+    }
+
+@router.get("/{file_id}/outline")
+def get_outline(
+    file_id: int,
+    source: str = "extracted",
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Metadata plus the titles, JSON Pointers and sizes of a report's parts,
+    sections and sub-sections, without their content.
+
+    ``source`` accepts the same values as the diff endpoints. Outlines are
+    cached per version; fetch sections with ``/content?path=``.
+    """
+    file_record = _get_file(db, file_id)
+    try:
+        key = resolve_diff_source(db, file_record, source)
+
+        cache_key = (file_id, key)
+        outline = outline_cache.get(cache_key)
+        cached = outline is not None
+        if outline is None:
+            outline = build_outline(_load_source(db, file_record, source, key))
+            outline_cache.put(cache_key, outline)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "file_id": file_id,
+        "source": source,
+        "version": key[1] if key[0] == "version" else None,
+        "cached": cached,
+        **outline
+    }
+
+@router.get("/{file_id}/content")
+def get_content_at(
+    file_id: int,
+    path: str = "",
+    source: str = "extracted",
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    The part of a report a JSON Pointer refers to, e.g. ``path=/parts/3/sections/2``.
+
+    An empty path returns the whole document. ``source`` accepts the same
+    values as the diff endpoints.
+    """
+    file_record = _get_file(db, file_id)
+    try:
+        parse_pointer(path)
+    except JsonPatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        key = resolve_diff_source(db, file_record, source)
+        content = resolve_pointer(_load_source(db, file_record, source, key), path)
+    except JsonPatchError as e:
+        # Checked before ValueError, which it subclasses: the pointer is valid but not in the document
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "file_id": file_id,
+        "source": source,
+        "version": key[1] if key[0] == "version" else None,
+        "path": path,
+        "content": content
+    }
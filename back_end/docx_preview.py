@@ -0,0 +1,121 @@
+"""
+Quick metadata preview for an uploaded inspection report.
+
+The full pipeline (DOCX -> XML -> Markdown -> JSON) builds the whole
+document model before any metadata is available. Validators first need to
+know which report they uploaded - its heading, state, department, period and
+dates of audit - and all of those are found in the opening paragraphs.
+
+This module streams ``word/document.xml`` straight out of the DOCX archive,
+stops after the first PREVIEW_PARAGRAPHS paragraphs and turns them into the
+same Markdown-style lines the pipeline produces, so the metadata extractors
+from ``cag_md_json`` can run on them unchanged.
+"""
+
+import os
+import re
+import zipfile
+
+from lxml import etree
+
+import cag_md_json
+from cag_doc_xml import matches_heading_patterns
+
+# Number of non-empty paragraphs read for the preview
+PREVIEW_PARAGRAPHS = int(os.getenv("PREVIEW_PARAGRAPHS", "60"))
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_PART_HEADING_RE = re.compile(r"^PART(\s|\-|–|—)*([IVX]+|\d+)\b", re.I)
+
+def _is_bold(run_properties):
+    """True if a w:rPr element switches bold on"""
+    if run_properties is None:
+        return False
+    bold = run_properties.find(f"{_W}b")
+    return bold is not None and bold.get(f"{_W}val") not in ("0", "false")
+
+def read_leading_paragraphs(docx_path, limit=PREVIEW_PARAGRAPHS):
+    """
+    Read the first paragraphs of a DOCX without loading the whole document.
+
+    Paragraphs inside tables are skipped, matching the top-level text the
+    pipeline uses for headings and metadata.
+
+    Args:
+        docx_path: Path to the DOCX file
+        limit: Maximum number of non-empty paragraphs to return
+
+    Returns:
+        list: (text, is_heading) tuples in document order
+    """
+    paragraphs = []
+    table_depth = 0
+    with zipfile.ZipFile(docx_path) as archive:
+        with archive.open("word/document.xml") as document_xml:
+            for event, element in etree.iterparse(document_xml, events=("start", "end")):
+                if element.tag == f"{_W}tbl":
+                    table_depth += 1 if event == "start" else -1
+                    continue
+                if event != "end" or element.tag != f"{_W}p":
+                    continue
+
+                if table_depth == 0:
+                    text = "".join(t.text or "" for t in element.iter(f"{_W}t"))
+                    if text.strip():
+                        style = element.find(f"{_W}pPr/{_W}pStyle")
+                        style_name = (style.get(f"{_W}val") or "").lower() if style is not None else ""
+                        runs = [
+                            run for run in element.iter(f"{_W}r")
+                            if "".join(t.text or "" for t in run.iter(f"{_W}t")).strip()
+                        ]
+                        is_bold = bool(runs) and all(_is_bold(run.find(f"{_W}rPr")) for run in runs)
+                        is_heading = style_name.startswith("heading") or is_bold or matches_heading_patterns(text)
+                        paragraphs.append((text, is_heading))
+                        if len(paragraphs) >= limit:
+                            break
+
+                # Free the parsed paragraph - only the running text is needed
+                element.clear()
+    return paragraphs
+
+def paragraphs_to_lines(paragraphs):
+    """
+    Render paragraphs as the Markdown lines the pipeline would produce.
+
+    The first heading becomes the ``#`` title and PART headings become
+    ``##`` headings, which is all the metadata extractors rely on.
+    """
+    lines = []
+    title_seen = False
+    for text, is_heading in paragraphs:
+        if is_heading and not title_seen and not text.startswith(" "):
+            lines.append(f"# {text.strip()}\n")
+            title_seen = True
+        elif is_heading and _PART_HEADING_RE.match(text.strip()):
+            lines.append(f"## {text.strip()}\n")
+        else:
+            lines.append(f"{text.strip()}\n")
+    return lines
+
+def build_metadata_preview(docx_path, limit=PREVIEW_PARAGRAPHS):
+    """
+    Extract the headline metadata of a report from its opening paragraphs.
+
+    Args:
+        docx_path: Path to the DOCX file
+        limit: Maximum number of non-empty paragraphs to read
+
+    Returns:
+        dict: document_heading, state, departments, Period_of_audit and
+            Date_of_audit in the same shape as the full extraction
+    """
+    lines = paragraphs_to_lines(read_leading_paragraphs(docx_path, limit))
+    metadata = cag_md_json.extract_metadata_from_lines(lines)
+    cag_md_json.extract_heading_period_and_dates(lines, metadata)
+    return {
+        "document_heading": metadata["document_heading"],
+        "state": metadata["state"],
+        "departments": metadata["departments"],
+        "Period_of_audit": metadata["Period_of_audit"],
+        "Date_of_audit": metadata["Date_of_audit"],
+    }
@@ -1,78 +1,289 @@
 """
-Simple DOCX recovery tool for handling corrupted or problematic DOCX files.
-This is a minimal implementation to prevent import errors.
+DOCX recovery tool for handling corrupted or problematic DOCX files.
+
+``open_docx`` parses a document once: if python-docx can open it, that same
+Document is used for conversion. Only when opening fails is the package
+repaired at the zip and XML level and opened again:
+
+- a truncated or missing central directory is rebuilt by scanning the
+  local file headers, keeping whatever part data can be inflated
+- malformed XML parts are re-parsed in lxml's recover mode
+- relationships pointing at parts that no longer exist are dropped, and
+  [Content_Types].xml is regenerated if it is lost
 """
 
 import os
+import posixpath
 import shutil
+import struct
 import tempfile
-from docx import Document
-from docx.shared import Inches
+import zipfile
+import zlib
 import logging
 
+from docx import Document
+from lxml import etree
+
 logger = logging.getLogger(__name__)
 
-def validate_and_repair_docx(file_path, repair_if_needed=True):
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_RELATIONSHIPS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_MAIN_DOCUMENT_PART = "word/document.xml"
+
+def open_docx(file_path, repair_if_needed=True):
     """
-    Validate and repair a DOCX file if possible.
-    
+    Open a DOCX file, repairing the package if it cannot be opened as is.
+
     Args:
         file_path (str): Path to the DOCX file
-        repair_if_needed (bool): Whether to attempt repair if validation fails
-        
+        repair_if_needed (bool): Whether to attempt repair if opening fails
+
     Returns:
-        tuple: (is_valid, file_path) where is_valid is bool and file_path is str
+        tuple: (document, file_path) where document is a python-docx Document
+            (None if the file could not be opened) and file_path is the file
+            it was opened from - a repaired temporary copy if repair was needed
     """
     try:
-        # First, try to open the file normally
         doc = Document(file_path)
-        
-        # Try to access some basic properties to validate
-        paragraphs = list(doc.paragraphs)
-        tables = list(doc.tables)
-        
-        # If we can access these without errors, the file is probably fine
         logger.info(f"File {file_path} appears to be valid")
-        return True, file_path
-        
+        return doc, file_path
     except Exception as e:
         logger.warning(f"File {file_path} appears to be corrupted: {e}")
-        
-        # Try to create a minimal repair
-        if repair_if_needed:
-            try:
-                repaired_path = _attempt_repair(file_path)
-                return True, repaired_path
-            except Exception as repair_error:
-                logger.error(f"Failed to repair {file_path}: {repair_error}")
-                return False, file_path
-        else:
-            return False, file_path
+        if not repair_if_needed:
+            return None, file_path
+
+    try:
+        repaired_path = _attempt_repair(file_path)
+        return Document(repaired_path), repaired_path
+    except Exception as repair_error:
+        logger.error(f"Failed to repair {file_path}: {repair_error}")
+        return None, file_path
+
+def validate_and_repair_docx(file_path, repair_if_needed=True):
+    """
+    Validate and repair a DOCX file if possible.
+
+    Prefer ``open_docx`` when the document is going to be read anyway, so
+    the package is only parsed once.
+
+    Args:
+        file_path (str): Path to the DOCX file
+        repair_if_needed (bool): Whether to attempt repair if validation fails
+
+    Returns:
+        tuple: (is_valid, file_path) where is_valid is bool and file_path is str
+    """
+    doc, working_path = open_docx(file_path, repair_if_needed=repair_if_needed)
+    return doc is not None, working_path
 
 def _attempt_repair(file_path):
     """
-    Attempt to repair a corrupted DOCX file by creating a minimal valid document.
+    Attempt to repair a corrupted DOCX file at the zip and XML level.
+
+    Returns:
+        str: Path of the repaired copy in a temporary directory
+
+    Raises:
+        ValueError: If the main document part cannot be recovered
+    """
+    parts = _read_parts(file_path)
+    logger.info(f"Recovered {len(parts)} part(s) from {file_path}")
+
+    parts = _recover_xml_parts(parts)
+    if _MAIN_DOCUMENT_PART not in parts:
+        raise ValueError(f"{_MAIN_DOCUMENT_PART} could not be recovered")
+    if "_rels/.rels" not in parts:
+        logger.warning("_rels/.rels missing, regenerating")
+        parts["_rels/.rels"] = _package_relationships()
+    parts = _drop_broken_relationships(parts)
+    parts["[Content_Types].xml"] = _content_types(parts)
+
+    temp_dir = tempfile.mkdtemp()
+    temp_file = os.path.join(temp_dir, os.path.basename(file_path))
+    with zipfile.ZipFile(temp_file, "w", zipfile.ZIP_DEFLATED) as archive:
+        # [Content_Types].xml conventionally comes first
+        archive.writestr("[Content_Types].xml", parts.pop("[Content_Types].xml"))
+        for name, data in parts.items():
+            archive.writestr(name, data)
+
+    logger.info(f"Created repaired version at {temp_file}")
+    return temp_file
+
+def _inflate(data):
+    """Inflate raw deflate data, keeping whatever precedes a truncation or corruption"""
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+    output = bytearray()
+    # Feed in blocks so the output before a corrupt block is kept
+    for start in range(0, len(data), 64 * 1024):
+        try:
+            output += inflater.decompress(data[start:start + 64 * 1024])
+        except zlib.error:
+            break
+        if inflater.eof:
+            break
+    return bytes(output)
+
+def _read_parts(file_path):
+    """
+    Read every part of the package that can still be read.
+
+    Uses the central directory when it is intact and falls back to scanning
+    the local file headers when it is truncated or missing. A central
+    directory without the main document part is not trusted either: in a
+    truncated file the last one left may belong to an embedded package.
+
+    Returns:
+        dict: Part name -> raw bytes
     """
     try:
-        # Create a temporary file
-        temp_dir = tempfile.mkdtemp()
-        temp_file = os.path.join(temp_dir, os.path.basename(file_path))
-        
-        # Create a minimal valid DOCX
-        doc = Document()
-        doc.add_heading('Document Recovery', 0)
-        doc.add_paragraph('This document was recovered from a corrupted file.')
-        doc.add_paragraph('Original file: ' + os.path.basename(file_path))
-        
-        # Save the repaired document
-        doc.save(temp_file)
-        
-        logger.info(f"Created repaired version at {temp_file}")
-        return temp_file
-        
-    except Exception as e:
-        logger.error(f"Repair attempt failed: {e}")
-        raise
+        parts = {}
+        with zipfile.ZipFile(file_path) as archive:
+            for info in archive.infolist():
+                try:
+                    parts[info.filename] = archive.read(info)
+                except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                    logger.warning(f"Entry {info.filename} is damaged ({e}), salvaging from local header")
+                    with open(file_path, "rb") as f:
+                        f.seek(info.header_offset)
+                        salvaged = _scan_local_headers(f.read(info.compress_size + 1024 + _LOCAL_HEADER.size))
+                    if info.filename in salvaged:
+                        parts[info.filename] = salvaged[info.filename]
+        if _MAIN_DOCUMENT_PART in parts:
+            return parts
+        logger.warning(f"Central directory has no {_MAIN_DOCUMENT_PART}, scanning local file headers")
+    except zipfile.BadZipFile as e:
+        logger.warning(f"Central directory unusable ({e}), scanning local file headers")
+
+    with open(file_path, "rb") as f:
+        return _scan_local_headers(f.read())
+
+def _scan_local_headers(data):
+    """
+    Rebuild the part list from local file headers.
+
+    Entries whose sizes are deferred to a data descriptor are inflated until
+    the deflate stream ends; stored entries of that kind run to the next
+    header.
+    """
+    parts = {}
+    position = data.find(_LOCAL_HEADER_SIGNATURE)
+    while position != -1 and position + _LOCAL_HEADER.size <= len(data):
+        (_, _, flags, method, _, _, _, compressed_size, _, name_length, extra_length) = _LOCAL_HEADER.unpack_from(data, position)
+        name_start = position + _LOCAL_HEADER.size
+        data_start = name_start + name_length + extra_length
+        name = data[name_start:name_start + name_length].decode("utf-8" if flags & 0x800 else "cp437", "replace")
+
+        sizes_deferred = bool(flags & 0x08) and compressed_size == 0
+        if sizes_deferred:
+            next_header = data.find(_LOCAL_HEADER_SIGNATURE, data_start)
+            raw = data[data_start:next_header if next_header != -1 else len(data)]
+        else:
+            raw = data[data_start:data_start + compressed_size]
+
+        if method == zipfile.ZIP_STORED:
+            content = raw
+        elif method == zipfile.ZIP_DEFLATED:
+            content = _inflate(raw)
+        else:
+            content = None
+            logger.warning(f"Skipping {name}: unsupported compression method {method}")
+
+        if content is not None and name and not name.endswith("/"):
+            parts[name] = content
+
+        next_from = data_start if sizes_deferred else data_start + compressed_size
+        position = data.find(_LOCAL_HEADER_SIGNATURE, max(next_from, position + 1))
+    return parts
+
+def _recover_xml_parts(parts):
+    """Re-parse XML parts, recovering malformed ones and dropping the unrecoverable"""
+    recovered = {}
+    recover_parser = etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+    for name, data in parts.items():
+        if not name.endswith((".xml", ".rels")):
+            recovered[name] = data
+            continue
+        try:
+            etree.fromstring(data)
+            recovered[name] = data
+            continue
+        except etree.XMLSyntaxError as e:
+            logger.warning(f"Part {name} is malformed ({e}), recovering")
+
+        root = etree.fromstring(data, recover_parser) if data.strip() else None
+        if root is None:
+            logger.warning(f"Dropping unrecoverable part {name}")
+            continue
+        recovered[name] = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    return recovered
+
+def _relationship_source_dir(rels_name):
+    """Directory relationship targets in a .rels part are relative to"""
+    # word/_rels/document.xml.rels describes word/document.xml
+    rels_dir = posixpath.dirname(rels_name)
+    return posixpath.dirname(rels_dir)
+
+def _drop_broken_relationships(parts):
+    """Remove internal relationships whose target part is missing"""
+    for name in [n for n in parts if n.endswith(".rels")]:
+        root = etree.fromstring(parts[name])
+        source_dir = _relationship_source_dir(name)
+        dropped = []
+        for relationship in list(root):
+            if relationship.get("TargetMode") == "External":
+                continue
+            target = relationship.get("Target") or ""
+            if target.startswith("/"):
+                target_part = target.lstrip("/")
+            else:
+                target_part = posixpath.normpath(posixpath.join(source_dir, target))
+            if target_part not in parts:
+                root.remove(relationship)
+                dropped.append(relationship.get("Id"))
+        if dropped:
+            logger.warning(f"Dropped relationship(s) {dropped} from {name}: target parts missing")
+            parts[name] = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    return parts
+
+def _content_types(parts):
+    """Keep [Content_Types].xml in step with the recovered parts, rebuilding it if lost"""
+    if "[Content_Types].xml" in parts:
+        root = etree.fromstring(parts["[Content_Types].xml"])
+        for override in root.findall(f"{{{_CONTENT_TYPES_NS}}}Override"):
+            if override.get("PartName", "").lstrip("/") not in parts:
+                root.remove(override)
+    else:
+        logger.warning("[Content_Types].xml missing, regenerating")
+        root = etree.Element(f"{{{_CONTENT_TYPES_NS}}}Types", nsmap={None: _CONTENT_TYPES_NS})
+        defaults = {
+            "rels": "application/vnd.openxmlformats-package.relationships+xml",
+            "xml": "application/xml",
+            "png": "image/png",
+            "jpeg": "image/jpeg",
+            "jpg": "image/jpeg",
+            "emf": "image/x-emf",
+        }
+        for extension, content_type in defaults.items():
+            etree.SubElement(root, f"{{{_CONTENT_TYPES_NS}}}Default", Extension=extension, ContentType=content_type)
+        etree.SubElement(
+            root, f"{{{_CONTENT_TYPES_NS}}}Override",
+            PartName=f"/{_MAIN_DOCUMENT_PART}",
+            ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml",
+        )
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+def _package_relationships():
+    """Minimal _rels/.rels pointing at the main document part"""
+    root = etree.Element(f"{{{_RELATIONSHIPS_NS}}}Relationships", nsmap={None: _RELATIONSHIPS_NS})
+    etree.SubElement(
+        root, f"{{{_RELATIONSHIPS_NS}}}Relationship",
+        Id="rId1",
+        Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument",
+        Target=_MAIN_DOCUMENT_PART,
+    )
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
 
 def cleanup_temp_files(file_path):
     """
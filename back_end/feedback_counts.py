@@ -0,0 +1,76 @@
+"""
+Feedback counts by status for the badge the UI polls.
+
+Counts are read from ``feedback_status_counts`` - one row per user and
+status, kept current by the DataValidationFeedback listeners in models.py -
+instead of counting the feedback table, so one small GROUP BY answers for a
+single user or for everyone. Responses are cached for
+FEEDBACK_COUNT_CACHE_SECONDS and dropped whenever feedback is written.
+"""
+
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+from ttl_cache import TTLCache
+
+FEEDBACK_STATUSES = ("pending", "reviewed", "resolved")
+
+# How long a computed count response is reused
+FEEDBACK_COUNT_CACHE_SECONDS = float(os.getenv("FEEDBACK_COUNT_CACHE_SECONDS", "30"))
+
+feedback_count_cache = TTLCache(FEEDBACK_COUNT_CACHE_SECONDS)
+
+def feedback_counts(db: Session, user_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Feedback entries by status.
+
+    Args:
+        db: Database session
+        user_id: Count only this user's feedback; None counts everyone's
+
+    Returns:
+        dict: total plus one count per status in FEEDBACK_STATUSES
+    """
+    counts = models.FeedbackStatusCount
+    query = db.query(counts.status, func.sum(counts.count))
+    if user_id is not None:
+        query = query.filter(counts.user_id == user_id)
+    by_status = {status: int(total or 0) for status, total in query.group_by(counts.status)}
+    result = {"total": sum(by_status.values())}
+    for status in FEEDBACK_STATUSES:
+        result[status] = by_status.get(status, 0)
+    return result
+
+def rebuild_feedback_counts(db: Session) -> None:
+    """Recompute every count from the feedback table (for the migration, or after bulk changes)"""
+    feedback = models.DataValidationFeedback
+    db.query(models.FeedbackStatusCount).delete(synchronize_session=False)
+    rows = db.query(
+        feedback.user_id, func.coalesce(feedback.status, "pending"), func.count(feedback.id)
+    ).group_by(feedback.user_id, func.coalesce(feedback.status, "pending")).all()
+    if rows:
+        db.bulk_insert_mappings(models.FeedbackStatusCount, [
+            {"user_id": user_id, "status": status, "count": count} for user_id, status, count in rows
+        ])
+
+def delete_file_feedback(db: Session, file_id: int) -> None:
+    """
+    Delete a file's feedback entries and take them off the counts.
+
+    Deleting the file would otherwise remove them by ON DELETE CASCADE,
+    where no listener sees it. Clear feedback_count_cache after committing.
+    """
+    feedback = models.DataValidationFeedback
+    rows = db.query(
+        feedback.user_id, feedback.status, func.count(feedback.id)
+    ).filter(feedback.file_id == file_id).group_by(feedback.user_id, feedback.status).all()
+    if not rows:
+        return
+    connection = db.connection()
+    for user_id, status, count in rows:
+        models.count_feedback(connection, user_id, status or "pending", -count)
+    db.query(feedback).filter(feedback.file_id == file_id).delete(synchronize_session=False)
@@ -0,0 +1,310 @@
+"""
+Document ingestion helpers shared by the upload endpoints.
+
+A document that has been saved into UPLOAD_FOLDER is recorded in the
+uploaded_files table and, for Word documents, run through the processing
+pipeline so its extracted JSON is stored alongside the record.
+
+Uploads are deduplicated by the SHA-256 of their content: a file whose
+content is already on record is linked to the existing row and its JSON
+instead of being stored and converted a second time. Rows whose conversion
+failed keep no hash, so the same file uploaded again is converted afresh.
+
+Conversions run in sandboxed worker processes (see conversion_sandbox).
+Each file is written to the database once. Documents are converted before
+their row is inserted, so the row goes in with its final status and
+extracted JSON, and rows are inserted and committed in batches of
+INGEST_BATCH_SIZE. The extracted JSON is recorded as version 1 of the
+file's history (see document_versions) in the same transaction.
+"""
+
+import hashlib
+import os
+import traceback
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from document_versions import start_history
+from json_utils import write_json_sidecar
+from models import UploadedFile
+
+from conversion_sandbox import PIPELINE_AVAILABLE, convert_docx_sandboxed
+
+# Configuration
+UPLOAD_FOLDER = 'uploads'
+ALLOWED_EXTENSIONS = {'docx', 'doc', 'pdf', 'txt', 'json', 'csv', 'xlsx', 'xls'}
+# Number of uploaded_files rows inserted per commit during bulk ingestion
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+
+# Create uploads directory if it doesn't exist
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def is_word_document(filename):
+    return filename.lower().endswith(('.docx', '.doc'))
+
+def compute_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a file on disk without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_duplicate(db: Session, sha256: str) -> Optional[UploadedFile]:
+    """Return the record already holding this content, if any"""
+    return db.query(UploadedFile).filter(UploadedFile.sha256 == sha256).first()
+
+def duplicate_result(existing: UploadedFile):
+    """Result entry for an upload whose content is already on record"""
+    return {
+        "file_id": existing.id,
+        "filename": existing.filename,
+        "status": "duplicate",
+        "duplicate_of": existing.id,
+        "data": existing.extracted_json
+    }
+
+def existing_by_hash(db: Session, hashes: Iterable[str]) -> Dict[str, UploadedFile]:
+    """Look up the records already holding any of these hashes in one query"""
+    hashes = list({h for h in hashes if h})
+    if not hashes:
+        return {}
+    rows = db.query(UploadedFile).filter(UploadedFile.sha256.in_(hashes)).all()
+    return {row.sha256: row for row in rows}
+
+def unique_upload_path(filename: str):
+    """
+    Pick a path in UPLOAD_FOLDER that does not overwrite an existing file.
+
+    Two different reports can share a name, so ``report.docx`` becomes
+    ``report_1.docx``, ``report_2.docx``... when the name is taken.
+
+    Returns:
+        tuple: (filename, file_path)
+    """
+    stem, ext = os.path.splitext(filename)
+    candidate = filename
+    counter = 1
+    while os.path.exists(os.path.join(UPLOAD_FOLDER, candidate)):
+        candidate = f"{stem}_{counter}{ext}"
+        counter += 1
+    return candidate, os.path.join(UPLOAD_FOLDER, candidate)
+
+def _convert(saved: dict):
+    """
+    Run a saved Word document through the pipeline.
+
+    Returns:
+        tuple: (extracted_json, error) - error is None on success
+    """
+    if not is_word_document(saved["filename"]):
+        return None, None
+    try:
+        extracted_json = convert_docx_sandboxed(saved["file_path"])
+        # Optional JSON copy next to the DOCX
+        write_json_sidecar(saved["file_path"], extracted_json)
+        return extracted_json, None
+    except Exception as e:
+        print(f"Error processing {saved['original_filename']}: {str(e)}")
+        traceback.print_exc()
+        return None, {
+            "filename": saved["original_filename"],
+            "error": str(e),
+            "step_failed": "pipeline_processing"
+        }
+
+def _new_record(saved: dict, extracted_json, error) -> UploadedFile:
+    """Build the row for a saved upload with its final status and JSON"""
+    now = datetime.now()
+    if error:
+        status = "error"
+    elif is_word_document(saved["filename"]):
+        status = "processed"
+    else:
+        status = "uploaded"
+    return UploadedFile(
+        filename=saved["filename"],
+        original_filename=saved["original_filename"],
+        file_path=saved["file_path"],
+        file_size=saved["file_size"],
+        file_type=saved["filename"].rsplit('.', 1)[1].lower(),
+        uploaded_at=now,
+        status=status,
+        # A failed conversion must not turn later uploads of the file into duplicates
+        sha256=None if error else saved["sha256"],
+        extracted_json=extracted_json,
+        json_updated_at=now if extracted_json is not None else None
+    )
+
+def _record_result(db_file: UploadedFile, saved: dict, error):
+    """Result/error entry for a newly inserted row"""
+    if error:
+        return None, error
+    if db_file.status == "processed":
+        return {
+            "file_id": db_file.id,
+            "filename": db_file.filename,
+            "status": "processed",
+            "data": db_file.extracted_json
+        }, None
+    return {
+        "file_id": db_file.id,
+        "filename": db_file.filename,
+        "status": "uploaded",
+        "data": {"message": "File uploaded successfully"}
+    }, None
+
+def _discard(saved: dict):
+    """Remove the stored copy of an upload that duplicates an existing record"""
+    if os.path.exists(saved["file_path"]):
+        os.remove(saved["file_path"])
+
+def _start_history(db: Session, db_file: UploadedFile, extracted_json) -> None:
+    """Record a converted document as version 1 once its row has an id"""
+    if extracted_json is not None:
+        start_history(db, db_file.id, extracted_json)
+
+def _insert_one(db: Session, saved: dict, extracted_json, error):
+    """Insert a single row, resolving a concurrent duplicate upload"""
+    db_file = _new_record(saved, extracted_json, error)
+    db.add(db_file)
+    try:
+        db.flush()
+        _start_history(db, db_file, extracted_json)
+        db.commit()
+    except IntegrityError:
+        # A concurrent upload of the same content won the race
+        db.rollback()
+        existing = find_duplicate(db, saved["sha256"])
+        if not existing:
+            raise
+        _discard(saved)
+        return duplicate_result(existing), None
+    return _record_result(db_file, saved, error)
+
+def _insert_batch(db: Session, batch: List[tuple]) -> List[tuple]:
+    """
+    Insert a batch of converted uploads with a single commit.
+
+    Falls back to row-by-row inserts if the batch collides with rows
+    committed concurrently, so one duplicate cannot fail the whole batch.
+    """
+    records = [_new_record(saved, extracted_json, error) for saved, extracted_json, error in batch]
+    db.add_all(records)
+    try:
+        db.flush()
+        for db_file, (_, extracted_json, _) in zip(records, batch):
+            _start_history(db, db_file, extracted_json)
+        outcomes = [
+            _record_result(db_file, saved, error)
+            for db_file, (saved, _, error) in zip(records, batch)
+        ]
+        db.commit()
+        return outcomes
+    except IntegrityError:
+        db.rollback()
+        return [_insert_one(db, saved, extracted_json, error) for saved, extracted_json, error in batch]
+
+def ingest_saved_files(db: Session, saved_files: List[dict]) -> List[tuple]:
+    """
+    Record and process a batch of uploads already saved into UPLOAD_FOLDER.
+
+    Duplicates (of existing records or of each other) are resolved with one
+    lookup, each remaining document is converted, and the rows are inserted
+    INGEST_BATCH_SIZE at a time with their extracted JSON already set.
+
+    Args:
+        db: Database session
+        saved_files: One dict per upload with file_path, filename,
+            original_filename, file_size and sha256 (computed when missing)
+
+    Returns:
+        list: One (result, error) tuple per entry of saved_files, in order
+    """
+    outcomes: List[Optional[tuple]] = [None] * len(saved_files)
+    try:
+        for saved in saved_files:
+            if not saved.get("sha256"):
+                saved["sha256"] = compute_sha256(saved["file_path"])
+        existing = existing_by_hash(db, (saved["sha256"] for saved in saved_files))
+    except Exception as e:
+        print(f"Error processing upload batch: {str(e)}")
+        traceback.print_exc()
+        return [(None, {
+            "filename": saved["original_filename"],
+            "error": str(e),
+            "step_failed": "processing"
+        }) for saved in saved_files]
+
+    # Same content already on record or earlier in this batch: link to it
+    first_in_batch: Dict[str, int] = {}
+    repeats = []
+    pending = []
+    for index, saved in enumerate(saved_files):
+        sha256 = saved["sha256"]
+        if sha256 in existing:
+            _discard(saved)
+            outcomes[index] = (duplicate_result(existing[sha256]), None)
+        elif sha256 in first_in_batch:
+            _discard(saved)
+            repeats.append((index, first_in_batch[sha256]))
+        else:
+            first_in_batch[sha256] = index
+            pending.append(index)
+
+    for start in range(0, len(pending), INGEST_BATCH_SIZE):
+        chunk = pending[start:start + INGEST_BATCH_SIZE]
+        try:
+            batch = [(saved_files[i],) + _convert(saved_files[i]) for i in chunk]
+            for index, outcome in zip(chunk, _insert_batch(db, batch)):
+                outcomes[index] = outcome
+        except Exception as e:
+            db.rollback()
+            print(f"Error processing upload batch: {str(e)}")
+            traceback.print_exc()
+            for index in chunk:
+                outcomes[index] = (None, {
+                    "filename": saved_files[index]["original_filename"],
+                    "error": str(e),
+                    "step_failed": "processing"
+                })
+
+    for index, first in repeats:
+        result, error = outcomes[first]
+        if result and result.get("file_id"):
+            record = db.get(UploadedFile, result["file_id"])
+            outcomes[index] = (duplicate_result(record), None)
+        else:
+            outcomes[index] = (result, error)
+
+    return outcomes
+
+def ingest_document(db: Session, file_path: str, filename: str, original_filename: str, file_size: int, sha256: Optional[str] = None):
+    """
+    Record a saved upload and process it if it is a Word document.
+
+    Args:
+        db: Database session
+        file_path: Path of the saved file inside UPLOAD_FOLDER
+        filename: Sanitised filename the file was saved under
+        original_filename: Filename as supplied by the client
+        file_size: Size of the saved file in bytes
+        sha256: Content hash, computed from file_path when not given
+
+    Returns:
+        tuple: (result, error) - exactly one of them is a dict, the other None
+    """
+    return ingest_saved_files(db, [{
+        "file_path": file_path,
+        "filename": filename,
+        "original_filename": original_filename,
+        "file_size": file_size,
+        "sha256": sha256
+    }])[0]
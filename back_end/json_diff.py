@@ -0,0 +1,158 @@
+"""
+Field-level differences between two versions of a report's JSON.
+
+Paths use the dotted form shown in the validation UI (``parts[0].title``).
+
+Lists are aligned on subtree digests (difflib's longest-matching-block
+algorithm), so inserting a paragraph reports one added item rather than
+every later paragraph as modified. Digests are computed only for the part
+of a list that changed and memoised, so once a subtree has been hashed,
+comparing it again is a single digest comparison; unchanged branches are
+otherwise skipped with a C-level equality check. ``iter_json_diffs``
+yields changes as they are found for callers that stream large diffs.
+"""
+
+import difflib
+import hashlib
+from typing import Any, Dict, Iterator, List
+
+def _digest(value, hashes: Dict[int, bytes]) -> bytes:
+    """
+    Hash of a subtree, memoised by object id for the lifetime of one diff.
+
+    Equal subtrees hash equal regardless of dict key order.
+    """
+    key = id(value)
+    cached = hashes.get(key)
+    if cached is not None:
+        return cached
+
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(value, dict):
+        h.update(b"d")
+        for name in sorted(value):
+            encoded = str(name).encode("utf-8", "surrogatepass")
+            h.update(len(encoded).to_bytes(4, "big"))
+            h.update(encoded)
+            h.update(_digest(value[name], hashes))
+    elif isinstance(value, list):
+        h.update(b"l")
+        for item in value:
+            h.update(_digest(item, hashes))
+    else:
+        h.update(repr((type(value).__name__, value)).encode("utf-8", "surrogatepass"))
+    hashes[key] = h.digest()
+    return hashes[key]
+
+def _same(old_obj, new_obj, hashes: Dict[int, bytes]) -> bool:
+    """Equality using digests when both sides have been hashed already"""
+    if old_obj is new_obj:
+        return True
+    old_digest, new_digest = hashes.get(id(old_obj)), hashes.get(id(new_obj))
+    if old_digest is not None and new_digest is not None:
+        return old_digest == new_digest
+    return old_obj == new_obj
+
+def _diff_nodes(old_obj, new_obj, path: str, hashes: Dict[int, bytes]) -> Iterator[Dict[str, Any]]:
+    if _same(old_obj, new_obj, hashes):
+        return
+
+    if type(old_obj) != type(new_obj):
+        # 1 and 1.0 compare equal and were never reported as a change
+        if not isinstance(old_obj, (dict, list)) and not isinstance(new_obj, (dict, list)) and old_obj == new_obj:
+            return
+        yield {"path": path, "oldValue": old_obj, "newValue": new_obj, "type": "type_change"}
+        return
+
+    if isinstance(old_obj, dict):
+        for key, old_val in old_obj.items():
+            current_path = f"{path}.{key}" if path else key
+            if key not in new_obj:
+                yield {"path": current_path, "oldValue": old_val, "newValue": None, "type": "removed"}
+            else:
+                yield from _diff_nodes(old_val, new_obj[key], current_path, hashes)
+        for key, new_val in new_obj.items():
+            if key not in old_obj:
+                current_path = f"{path}.{key}" if path else key
+                yield {"path": current_path, "oldValue": None, "newValue": new_val, "type": "added"}
+    elif isinstance(old_obj, list):
+        yield from _diff_lists(old_obj, new_obj, path, hashes)
+    else:
+        yield {"path": path, "oldValue": old_obj, "newValue": new_obj, "type": "modified"}
+
+def _diff_lists(old_list: list, new_list: list, path: str, hashes: Dict[int, bytes]) -> Iterator[Dict[str, Any]]:
+    """
+    Align two lists on their items' digests so an inserted or removed item
+    is reported as such instead of shifting every later item.
+
+    The common prefix and suffix are skipped first, so only the changed
+    middle of a list is hashed. Unmatched runs that replace each other are
+    compared item by item; whatever is left over is reported as added or
+    removed. Added and modified items use their index in the new list,
+    removed items their index in the old one.
+    """
+    start = 0
+    while start < len(old_list) and start < len(new_list) and _same(old_list[start], new_list[start], hashes):
+        start += 1
+    old_end, new_end = len(old_list), len(new_list)
+    while old_end > start and new_end > start and _same(old_list[old_end - 1], new_list[new_end - 1], hashes):
+        old_end -= 1
+        new_end -= 1
+
+    if (old_end - start) * (new_end - start) <= 1:
+        # Nothing to align: a single item changed, or items were only added or removed
+        opcodes = [("replace", 0, old_end - start, 0, new_end - start)]
+    else:
+        opcodes = difflib.SequenceMatcher(
+            None,
+            [_digest(item, hashes) for item in old_list[start:old_end]],
+            [_digest(item, hashes) for item in new_list[start:new_end]],
+            autojunk=False,
+        ).get_opcodes()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            continue
+        i1, i2, j1, j2 = i1 + start, i2 + start, j1 + start, j2 + start
+        paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+        for offset in range(paired):
+            yield from _diff_nodes(old_list[i1 + offset], new_list[j1 + offset], f"{path}[{j1 + offset}]", hashes)
+        for index in range(i1 + paired, i2):
+            yield {"path": f"{path}[{index}]", "oldValue": old_list[index], "newValue": None, "type": "removed"}
+        for index in range(j1 + paired, j2):
+            yield {"path": f"{path}[{index}]", "oldValue": None, "newValue": new_list[index], "type": "added"}
+
+def iter_json_diffs(old_obj, new_obj, base_path: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Yield the differences between two JSON documents one at a time.
+
+    Args:
+        old_obj: Original document
+        new_obj: Modified document
+        base_path: Path prefix for reported changes
+
+    Yields:
+        dict: ``{"path", "oldValue", "newValue", "type"}`` where type is
+            added, removed, modified or type_change
+    """
+    yield from _diff_nodes(old_obj, new_obj, base_path, {})
+
+def compute_json_diffs(old_obj, new_obj, base_path=""):
+    """Compute differences between two JSON objects (see iter_json_diffs)"""
+    return list(iter_json_diffs(old_obj, new_obj, base_path))
+
+def summarize_diffs(diffs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Package diffs for API responses, with the modified list audit logs store.
+    """
+    modified = []
+    for diff in diffs:
+        modified.append({
+            'path': diff.get('path', ''),
+            'oldValue': diff.get('oldValue'),
+            'newValue': diff.get('newValue')
+        })
+    return {
+        "diffs": diffs,
+        "modified": modified,
+        "total_changes": len(diffs)
+    }
@@ -0,0 +1,251 @@
+"""
+JSON Pointer (RFC 6901) and JSON Patch (RFC 6902) helpers.
+
+``apply_patch`` applies a list of patch operations to a document and
+``make_patch`` produces the operations that turn one document into another.
+Documents are never modified in place; both return new objects.
+"""
+
+import copy
+from typing import Any, Dict, List
+
+class JsonPatchError(ValueError):
+    """A patch or pointer could not be applied to the document"""
+
+def escape_pointer_token(token) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+def parse_pointer(pointer: str) -> List[str]:
+    """
+    Split a JSON Pointer into its unescaped reference tokens.
+
+    Raises:
+        JsonPatchError: If the pointer is not empty and does not start with "/"
+    """
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+def _list_index(container: list, token: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+def _child(container, token: str):
+    if isinstance(container, dict):
+        if token not in container:
+            raise JsonPatchError(f"Member not found: {token!r}")
+        return container[token]
+    if isinstance(container, list):
+        return container[_list_index(container, token)]
+    raise JsonPatchError(f"Cannot descend into a {type(container).__name__} with {token!r}")
+
+def resolve_pointer(document, pointer: str):
+    """
+    Return the value a JSON Pointer refers to.
+
+    Raises:
+        JsonPatchError: If the pointer does not resolve
+    """
+    value = document
+    for token in parse_pointer(pointer):
+        value = _child(value, token)
+    return value
+
+def _parent(document, pointer: str):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("The operation needs a path below the document root")
+    parent = document
+    for token in tokens[:-1]:
+        parent = _child(parent, token)
+    return parent, tokens[-1]
+
+def _add(document, pointer: str, value):
+    if pointer == "":
+        return value
+    parent, token = _parent(document, pointer)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, token, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add to a {type(parent).__name__}")
+    return document
+
+def _remove(document, pointer: str):
+    parent, token = _parent(document, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"Member not found: {token!r}")
+        return parent.pop(token)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, token))
+    raise JsonPatchError(f"Cannot remove from a {type(parent).__name__}")
+
+def _replace(document, pointer: str, value):
+    # Assigned in place so a replaced member keeps its position in the object
+    parent, token = _parent(document, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"Member not found: {token!r}")
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent[_list_index(parent, token)] = value
+    else:
+        raise JsonPatchError(f"Cannot replace in a {type(parent).__name__}")
+    return document
+
+def _apply_operation(document, operation: Dict[str, Any]):
+    op = operation.get("op")
+    path = operation.get("path")
+    if not isinstance(path, str):
+        raise JsonPatchError(f"Operation is missing a path: {operation!r}")
+
+    if op == "add":
+        if "value" not in operation:
+            raise JsonPatchError("add operation is missing a value")
+        return _add(document, path, copy.deepcopy(operation["value"]))
+    if op == "remove":
+        if path == "":
+            raise JsonPatchError("Cannot remove the document root")
+        _remove(document, path)
+        return document
+    if op == "replace":
+        if "value" not in operation:
+            raise JsonPatchError("replace operation is missing a value")
+        if path == "":
+            return copy.deepcopy(operation["value"])
+        return _replace(document, path, copy.deepcopy(operation["value"]))
+    if op in ("move", "copy"):
+        source = operation.get("from")
+        if not isinstance(source, str):
+            raise JsonPatchError(f"{op} operation is missing 'from'")
+        if op == "move":
+            if path.startswith(source + "/"):
+                raise JsonPatchError("Cannot move a value into one of its own children")
+            if path == source:
+                return document
+            value = _remove(document, source)
+        else:
+            value = copy.deepcopy(resolve_pointer(document, source))
+        return _add(document, path, value)
+    if op == "test":
+        if "value" not in operation:
+            raise JsonPatchError("test operation is missing a value")
+        if resolve_pointer(document, path) != operation["value"]:
+            raise JsonPatchError(f"Test failed at {path!r}")
+        return document
+    raise JsonPatchError(f"Unknown operation: {op!r}")
+
+def apply_patch(document, patch: List[Dict[str, Any]]):
+    """
+    Apply RFC 6902 operations to a copy of document.
+
+    The patch is atomic: if any operation fails, JsonPatchError is raised
+    and no partial result is returned.
+
+    Args:
+        document: The JSON document to patch
+        patch: List of operations
+
+    Returns:
+        The patched document
+
+    Raises:
+        JsonPatchError: If the patch is malformed or an operation fails
+    """
+    if not isinstance(patch, list):
+        raise JsonPatchError("A patch must be a list of operations")
+    result = copy.deepcopy(document)
+    for operation in patch:
+        if not isinstance(operation, dict):
+            raise JsonPatchError(f"Invalid operation: {operation!r}")
+        result = _apply_operation(result, operation)
+    return result
+
+def _diff(source, target, path: str, patch: list) -> None:
+    if source == target:
+        return
+    if isinstance(source, dict) and isinstance(target, dict):
+        for key in source:
+            if key not in target:
+                patch.append({"op": "remove", "path": f"{path}/{escape_pointer_token(key)}"})
+        for key, value in target.items():
+            child = f"{path}/{escape_pointer_token(key)}"
+            if key in source:
+                _diff(source[key], value, child, patch)
+            else:
+                patch.append({"op": "add", "path": child, "value": copy.deepcopy(value)})
+        return
+    if isinstance(source, list) and isinstance(target, list):
+        # Trim the common prefix and suffix, then pair up what is left
+        start = 0
+        while start < len(source) and start < len(target) and source[start] == target[start]:
+            start += 1
+        source_end, target_end = len(source), len(target)
+        while source_end > start and target_end > start and source[source_end - 1] == target[target_end - 1]:
+            source_end -= 1
+            target_end -= 1
+        common = min(source_end, target_end) - start
+        for offset in range(common):
+            _diff(source[start + offset], target[start + offset], f"{path}/{start + offset}", patch)
+        # Remove surplus items from the end so earlier indexes stay valid
+        for index in range(source_end - 1, start + common - 1, -1):
+            patch.append({"op": "remove", "path": f"{path}/{index}"})
+        for index in range(start + common, target_end):
+            patch.append({"op": "add", "path": f"{path}/{index}", "value": copy.deepcopy(target[index])})
+        return
+    patch.append({"op": "replace", "path": path, "value": copy.deepcopy(target)})
+
+def make_patch(source, target) -> List[Dict[str, Any]]:
+    """
+    Compute the operations that turn source into target.
+
+    Args:
+        source: Original document
+        target: Modified document
+
+    Returns:
+        list: RFC 6902 operations; empty if the documents are equal
+    """
+    patch: List[Dict[str, Any]] = []
+    _diff(source, target, "", patch)
+    return patch
+
+def touched_paths(patch: List[Dict[str, Any]]) -> List[str]:
+    """
+    Pointers a patch reads or writes.
+
+    Adding, removing, moving or copying an array item shifts the indexes of
+    the items after it, so those operations count as touching the whole
+    array. A copy's source is only read, so it is not widened.
+    """
+    paths = []
+    for operation in patch:
+        op = operation.get("op")
+        for key in ("path", "from"):
+            pointer = operation.get(key)
+            if not isinstance(pointer, str):
+                continue
+            tokens = parse_pointer(pointer)
+            inserts_or_removes = op in ("add", "remove", "move") or (op == "copy" and key == "path")
+            shifts_items = inserts_or_removes and tokens and (
+                tokens[-1] == "-" or tokens[-1].isdigit()
+            )
+            if shifts_items:
+                pointer = "".join(f"/{escape_pointer_token(token)}" for token in tokens[:-1])
+            paths.append(pointer)
+    return paths
+
+def paths_overlap(first: str, second: str) -> bool:
+    """True if one pointer is the other or lies inside it"""
+    return first == second or first.startswith(second + "/") or second.startswith(first + "/")
@@ -0,0 +1,36 @@
+"""
+JSON serialization shared by the database layer and the ingestion pipeline.
+
+Report JSON is written in one compact form everywhere: no indentation, no
+padding after separators and non-ASCII text kept as UTF-8 rather than
+\\u-escaped. Key order is preserved because the validation UI renders
+metadata fields in document order.
+"""
+
+import json
+import os
+
+# Write a <name>.json copy next to each converted DOCX. The database is the
+# source of truth, so this is off unless a deployment still needs the files.
+STORE_JSON_SIDECAR = os.getenv("STORE_JSON_SIDECAR", "false").lower() == "true"
+# Also copy freshly extracted JSON into updated_json on validation uploads.
+# Readers already fall back to extracted_json when updated_json is empty.
+DUPLICATE_UPDATED_JSON = os.getenv("DUPLICATE_UPDATED_JSON", "false").lower() == "true"
+
+def compact_json_dumps(obj) -> str:
+    """Serialize obj in the compact form used for storage"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def write_json_sidecar(docx_path, data) -> bool:
+    """
+    Write data next to docx_path as <name>.json if STORE_JSON_SIDECAR is on
+
+    Returns:
+        bool: True if a file was written
+    """
+    if not STORE_JSON_SIDECAR:
+        return False
+    json_path = os.path.splitext(str(docx_path))[0] + ".json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        f.write(compact_json_dumps(data))
+    return True
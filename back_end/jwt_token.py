@@ -12,7 +12,8 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-for-development")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))  # 1 hour by default
 
-def create_access_token(subject: str, user_id: int, role_status: str, expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(subject: str, user_id: int, role_status: str, expires_delta: Optional[timedelta] = None,
+                        token_version: int = 0, claims: Optional[Dict[str, Any]] = None) -> str:
     """
     Create a JWT access token
     
@@ -21,6 +22,8 @@ def create_access_token(subject: str, user_id: int, role_status: str, expires_de
         user_id: User ID to include in the token
         role_status: User role status
         expires_delta: Optional token expiration time
+        token_version: User's token version; the token is refused once it changes
+        claims: Optional extra claims to include
         
     Returns:
         str: JWT token
@@ -34,8 +37,11 @@ def create_access_token(subject: str, user_id: int, role_status: str, expires_de
         "exp": expire, 
         "sub": str(subject),
         "user_id": user_id,
-        "role_status": role_status
+        "role_status": role_status,
+        "token_version": token_version
     }
+    if claims:
+        to_encode.update(claims)
     
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -1,34 +1,50 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Depends, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Depends, Request, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uvicorn
 import os
+import re
+import shutil
 import tempfile
 import json
-import csv
-import io
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta, timezone
 import traceback
 from werkzeug.utils import secure_filename
-from sqlalchemy.orm import Session
-from database import get_db, engine
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, defer, joinedload, load_only, selectinload
+from database import get_db, engine, SessionLocal
 import models
 from models import UploadedFile, User
 from schemas import RoleCreate
 from otp_cleanup import otp_cleanup_scheduler
-import openpyxl
 from passlib.context import CryptContext
-from security import hash_password
+from security import shutdown_password_pool
 
-# Try to import the full pipeline, fallback to simple processor
-try:
-    from document_processing_pipeline import process_docx_to_json_and_db
-    PIPELINE_AVAILABLE = True
-except ImportError:
-    from simple_docx_processor import simple_docx_to_json as process_docx_to_json_and_db
-    PIPELINE_AVAILABLE = False
+from ingestion import (
+    UPLOAD_FOLDER, PIPELINE_AVAILABLE, allowed_file, is_word_document, ingest_saved_files,
+    compute_sha256, find_duplicate, existing_by_hash, duplicate_result, unique_upload_path,
+)
+from json_utils import DUPLICATE_UPDATED_JSON, write_json_sidecar
+from docx_preview import build_metadata_preview
+from report_metadata import parse_report_date
+from user_import import import_jobs, run_import
+from feedback_counts import delete_file_feedback, feedback_count_cache, feedback_counts
+from principals import invalidate_principal, revoke_tokens
+from permissions import grants_of, is_admin, rebuild_permissions
+from pagination import NEXT_CURSOR_HEADER, count_total, keyset_page
+from projection import FieldSelection
+from conversion_sandbox import UnsafeArchiveError, check_archive, conversion_pool, convert_docx_sandboxed
+from document_versions import (
+    VersionConflict, check_mergeable, current_version, delete_history, ensure_history, forget_file, get_document,
+    latest_edited_document, latest_submitted_document, record_version,
+)
+from json_patch import JsonPatchError, apply_patch, make_patch
+from json_diff import compute_json_diffs, summarize_diffs
 
 # Create FastAPI instance
 app = FastAPI(
@@ -44,12 +60,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Import and include authentication router after app is defined
 from auth import router as auth_router
+from chunked_upload import router as chunked_upload_router
+from document_versions import router as document_versions_router
 from dependencies import get_current_user, get_current_active_user
 app.include_router(auth_router)
+app.include_router(chunked_upload_router)
+app.include_router(document_versions_router)
 
 # Application startup and shutdown events
 @app.on_event("startup")
@@ -66,19 +87,11 @@ async def shutdown_event():
     print("Shutting down the application...")
     # Stop the OTP cleanup scheduler
     otp_cleanup_scheduler.stop_scheduler()
+    # Stop the document conversion and password hashing workers
+    conversion_pool.shutdown()
+    shutdown_password_pool()
     print("Application shutdown complete")
 
-# Configuration
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'docx', 'doc', 'pdf', 'txt', 'json', 'csv', 'xlsx', 'xls'}
-
-# Create uploads directory if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 # Pydantic models
 class ContactMessage(BaseModel):
     name: str
@@ -195,83 +208,21 @@ async def bulk_process_documents(files: List[UploadFile] = File(...), db: Sessio
         errors = []
         word_documents = 0
         
+        # Hash every upload first so duplicates are found with a single query
+        accepted = []
         for file in files:
             if file and allowed_file(file.filename):
+                if is_word_document(file.filename):
+                    word_documents += 1
+                
                 try:
-                    # Save file temporarily
-                    filename = secure_filename(file.filename)
-                    file_path = os.path.join(UPLOAD_FOLDER, filename)
-                    
-                    # Read file content and save
-                    content = await file.read()
-                    with open(file_path, "wb") as f:
-                        f.write(content)
-                    
-                    # Create database record first
-                    db_file = UploadedFile(
-                        filename=filename,
-                        original_filename=file.filename,
-                        file_path=file_path,
-                        file_size=len(content),
-                        file_type=filename.rsplit('.', 1)[1].lower(),
-                        uploaded_at=datetime.now(),
-                        status="uploaded"
-                    )
-                    db.add(db_file)
-                    db.commit()
-                    db.refresh(db_file)
-                    
-                    # Process DOCX files through the pipeline
-                    if filename.lower().endswith(('.docx', '.doc')):
-                        word_documents += 1
-                        try:
-                            # Use the document processing pipeline
-                            pipeline_result = process_docx_to_json_and_db(file_path, db, db_file.id)
-                            
-                            if pipeline_result['status'] == 'success':
-                                # Update the database record with processed status
-                                db_file.status = "processed"
-                                db_file.extracted_json = pipeline_result['extracted_json']
-                                db_file.json_updated_at = datetime.now()
-                                db.commit()
-                                
-                                results.append({
-                                    "file_id": db_file.id,
-                                    "filename": filename,
-                                    "status": "processed",
-                                    "data": pipeline_result['extracted_json']
-                                })
-                            else:
-                                # Pipeline failed, mark as error
-                                db_file.status = "error"
-                                db.commit()
-                                errors.append({
-                                    "filename": file.filename,
-                                    "error": pipeline_result['message'],
-                                    "step_failed": "pipeline_processing"
-                                })
-                                
-                        except Exception as pipeline_error:
-                            # Pipeline processing failed
-                            db_file.status = "error"
-                            db.commit()
-                            errors.append({
-                                "filename": file.filename,
-                                "error": str(pipeline_error),
-                                "step_failed": "pipeline_processing"
-                            })
-                    else:
-                        # For non-Word documents, just mark as uploaded
-                        db_file.status = "uploaded"
-                        db.commit()
-                        
-                        results.append({
-                            "file_id": db_file.id,
-                            "filename": filename,
-                            "status": "uploaded",
-                            "data": {"message": "File uploaded successfully"}
-                        })
-                    
+                    digest = hashlib.sha256()
+                    size = 0
+                    for chunk in iter(lambda: file.file.read(1024 * 1024), b""):
+                        digest.update(chunk)
+                        size += len(chunk)
+                    file.file.seek(0)
+                    accepted.append((file, digest.hexdigest(), size))
                 except Exception as e:
                     errors.append({
                         "filename": file.filename,
@@ -287,6 +238,43 @@ async def bulk_process_documents(files: List[UploadFile] = File(...), db: Sessio
                     "step_failed": "validation"
                 })
         
+        existing = existing_by_hash(db, (sha256 for _, sha256, _ in accepted))
+        
+        saved_files = []
+        for file, sha256, size in accepted:
+            # Same content already uploaded: link to it, don't store or convert again
+            if sha256 in existing:
+                results.append(duplicate_result(existing[sha256]))
+                continue
+            
+            try:
+                # Save file to the uploads folder without overwriting a different report
+                filename, file_path = unique_upload_path(secure_filename(file.filename))
+                with open(file_path, "wb") as f:
+                    shutil.copyfileobj(file.file, f)
+                saved_files.append({
+                    "file_path": file_path,
+                    "filename": filename,
+                    "original_filename": file.filename,
+                    "file_size": size,
+                    "sha256": sha256
+                })
+            except Exception as e:
+                errors.append({
+                    "filename": file.filename,
+                    "error": str(e),
+                    "step_failed": "processing"
+                })
+                print(f"Error processing {file.filename}: {str(e)}")
+                traceback.print_exc()
+        
+        # Convert and insert the new documents in batches, off the event loop
+        for result, error in await run_in_threadpool(ingest_saved_files, db, saved_files):
+            if result:
+                results.append(result)
+            else:
+                errors.append(error)
+        
         return {
             "status": "success",
             "results": results,
@@ -301,18 +289,62 @@ async def bulk_process_documents(files: List[UploadFile] = File(...), db: Sessio
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Bulk processing failed: {str(e)}")
 
+# Keys of an uploaded file in list and detail responses, with the columns each one needs
+_FILE_FIELDS = {
+    "id": lambda file: file.id,
+    "filename": lambda file: file.filename,
+    "original_filename": lambda file: file.original_filename,
+    "file_size": lambda file: file.file_size,
+    "file_type": lambda file: file.file_type,
+    "uploaded_at": lambda file: file.uploaded_at.isoformat() if file.uploaded_at else None,
+    "status": lambda file: file.status,
+    "extracted_json": lambda file: file.extracted_json,
+}
+_FILE_FIELD_COLUMNS = {
+    "id": [UploadedFile.id],
+    "filename": [UploadedFile.filename],
+    "original_filename": [UploadedFile.original_filename],
+    "file_size": [UploadedFile.file_size],
+    "file_type": [UploadedFile.file_type],
+    "uploaded_at": [UploadedFile.uploaded_at],
+    "status": [UploadedFile.status],
+    "extracted_json": [UploadedFile.extracted_json_id],
+}
+
+def _file_query(db: Session, selection: FieldSelection):
+    """UploadedFile query loading only the columns, and JSON, the selection needs"""
+    query = db.query(UploadedFile).options(load_only(*selection.columns(_FILE_FIELD_COLUMNS)))
+    if selection.wants("extracted_json"):
+        query = query.options(selectinload(UploadedFile.extracted_blob).undefer(models.DocumentBlob.data))
+    return query
+
 @app.get("/api/uploaded-files")
 async def get_uploaded_files(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
     search: str = Query(""),
     assignment: str = Query(""),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get list of uploaded files with pagination and filtering"""
+    """
+    Get list of uploaded files with pagination and filtering
+
+    Files are listed by id. Pass the returned ``next_cursor`` as ``cursor``
+    to fetch the next page by keyset; ``page`` still works but reads and
+    discards every earlier row.
+
+    ``fields`` limits each file to the listed keys, e.g.
+    ``fields=id,filename,metadata.state``; the extracted JSON is only read
+    when it or a path inside it is requested.
+    """
     try:
+        selection = FieldSelection(fields, _FILE_FIELDS, "extracted_json")
+        
         # Build query
-        query = db.query(UploadedFile)
+        query = _file_query(db, selection)
         
         # Apply search filter
         if search:
@@ -326,59 +358,53 @@ async def get_uploaded_files(
             query = query.filter(UploadedFile.extracted_json.is_(None))
         
         # Get total count
-        total_count = query.count()
+        total_count, total_estimated = None, False
+        if include_total:
+            total_count, total_estimated = count_total(db, query, UploadedFile.id, bool(search or assignment))
         
-        # Apply pagination
-        offset = (page - 1) * limit
-        files = query.offset(offset).limit(limit).all()
+        # Apply pagination; the page's JSON payloads, if requested, are fetched in one query
+        files, next_cursor = keyset_page(
+            query, [UploadedFile.id], limit, cursor, offset=0 if cursor else (page - 1) * limit
+        )
         
         # Format response
-        files_data = []
-        for file in files:
-            files_data.append({
-                "id": file.id,
-                "filename": file.filename,
-                "original_filename": file.original_filename,
-                "file_size": file.file_size,
-                "file_type": file.file_type,
-                "uploaded_at": file.uploaded_at.isoformat() if file.uploaded_at else None,
-                "status": file.status,
-                "extracted_json": file.extracted_json
-            })
+        files_data = [selection.render(file, _FILE_FIELDS) for file in files]
         
         return {
             "files": files_data,
             "total": total_count,
+            "total_estimated": total_estimated,
             "page": page,
             "limit": limit,
-            "pages": (total_count + limit - 1) // limit
+            "pages": (total_count + limit - 1) // limit if total_count is not None else None,
+            "next_cursor": next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching files: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to fetch files: {str(e)}")
 
 @app.get("/api/uploaded-files/{file_id}")
-async def get_file_details(file_id: int, db: Session = Depends(get_db)):
-    """Get details of a specific uploaded file"""
+async def get_file_details(file_id: int, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Get details of a specific uploaded file
+
+    ``fields`` selects keys and paths into the extracted JSON as for the file list.
+    """
     try:
-        file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+        selection = FieldSelection(fields, _FILE_FIELDS, "extracted_json")
+        file = _file_query(db, selection).filter(UploadedFile.id == file_id).first()
         
         if not file:
             raise HTTPException(status_code=404, detail="File not found")
         
-        return {
-            "id": file.id,
-            "filename": file.filename,
-            "original_filename": file.original_filename,
-            "file_size": file.file_size,
-            "file_type": file.file_type,
-            "uploaded_at": file.uploaded_at.isoformat() if file.uploaded_at else None,
-            "status": file.status,
-            "extracted_json": file.extracted_json
-        }
+        return selection.render(file, _FILE_FIELDS)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching file details: {str(e)}")
         traceback.print_exc()
@@ -455,9 +481,13 @@ async def delete_uploaded_file(file_id: int, db: Session = Depends(get_db)):
             except Exception as e:
                 print(f"Warning: Could not delete physical file {file_path}: {str(e)}")
         
-        # Delete the database record
+        # Delete the database record with its history, taking its feedback off the counts
+        delete_file_feedback(db, file.id)
+        delete_history(db, file.id)
         db.delete(file)
         db.commit()
+        feedback_count_cache.clear()
+        forget_file(file_id)
         
         return {
             "status": "success",
@@ -526,22 +556,15 @@ async def get_users_list():
 
 
 @app.get("/users/me")
-async def get_current_user(current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    """Get current user information"""
+async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+    """Get current user information (roles and config come with the cached principal)"""
     try:
-        # Get user's role and permissions
-        user_roles = db.query(models.UserRole).filter(models.UserRole.user_id == current_user.id).all()
-        user_config = db.query(models.UserConfig).filter(models.UserConfig.user_id == current_user.id).first()
-        
         # Build permissions list
-        permissions = []
-        for user_role in user_roles:
-            role = db.query(models.Role).filter(models.Role.id == user_role.role_id).first()
-            if role:
-                permissions.append(f"{role.role_name}:{user_role.action or 'view'}")
+        permissions = [f"{user_role.role.name}:view" for user_role in current_user.user_roles]
         
         # Build config object
         config = {}
+        user_config = current_user.config
         if user_config and user_config.config:
             # UserConfig has a JSON config field
             config = {
@@ -575,6 +598,7 @@ async def get_current_user(current_user: User = Depends(get_current_active_user)
             "gender": current_user.gender,
             "role": current_user.role_status,
             "permissions": permissions,
+            "menus": grants_of(current_user).menus(),
             "config": config,
             "account_created_at": current_user.account_created_at.isoformat() if current_user.account_created_at else None
         }
@@ -598,8 +622,8 @@ def review_and_submit_changes(
     Review and Submit: Move updated_json to extracted_json (finalize changes)
     """
     try:
-        # Get the file record
-        file_record = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+        # Get the file record, locked so concurrent edits queue behind the submit
+        file_record = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).with_for_update().first()
         if not file_record:
             raise HTTPException(status_code=404, detail="File not found")
         
@@ -607,6 +631,9 @@ def review_and_submit_changes(
         if not file_record.updated_json:
             raise HTTPException(status_code=400, detail="No pending changes to submit")
         
+        # The submitted JSON is the latest version already, so nothing changes
+        version = record_version(db, file_record, file_record.updated_json, "submit", current_user.id, patch=[])
+        
         # Move updated_json to extracted_json (finalize the changes)
         file_record.extracted_json = file_record.updated_json
         file_record.json_updated_at = datetime.now(timezone.utc)
@@ -619,66 +646,194 @@ def review_and_submit_changes(
         return {
             "status": "success",
             "message": "Changes have been reviewed and submitted successfully",
-            "file_id": file_id
+            "file_id": file_id,
+            "version": version.version
         }
         
     except HTTPException:
         raise
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Document was modified concurrently, please retry")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to submit changes: {str(e)}")
 
+_VALIDATION_FIELDS = ("status", "file_id", "filename", "content", "source", "has_pending_changes", "version")
+
 @app.get("/api/validate-json/{file_id}")
 def get_validation_json(
     file_id: int,
+    fields: Optional[str] = None,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Validate: Get updated_json for validation (shows pending changes)
+
+    ``fields`` selects response keys and paths into the content, e.g.
+    ``fields=version,metadata.state``. The JSON is only read when content is
+    requested, and the version history only when version is.
     """
     try:
+        selection = FieldSelection(fields, _VALIDATION_FIELDS, "content")
+        
         # Get the file record
         file_record = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
         if not file_record:
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Return updated_json if available, otherwise return extracted_json
-        json_data = file_record.updated_json if file_record.updated_json else file_record.extracted_json
+        if selection.wants("content"):
+            # Return updated_json if available, otherwise return extracted_json
+            json_data = file_record.updated_json if file_record.updated_json else file_record.extracted_json
+            has_updated = bool(file_record.updated_json)
+        else:
+            # The blob ids tell whether each JSON exists without reading it
+            json_data = None
+            has_updated = file_record.updated_json_id is not None
+            if not has_updated and file_record.extracted_json_id is None:
+                raise HTTPException(status_code=404, detail="No JSON data available for validation")
         
-        if not json_data:
+        if selection.wants("content") and not json_data:
             raise HTTPException(status_code=404, detail="No JSON data available for validation")
         
-        return {
+        response = {
             "status": "success",
             "file_id": file_id,
             "filename": file_record.original_filename or file_record.filename,
             "content": json_data,
-            "source": "updated_json" if file_record.updated_json else "extracted_json",
-            "has_pending_changes": bool(file_record.updated_json)
+            "source": "updated_json" if has_updated else "extracted_json",
+            "has_pending_changes": has_updated,
         }
+        if selection.wants("version"):
+            # Version the client sends back with PATCH edits
+            response["version"] = current_version(db, file_record)
+        
+        return selection.project(response)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get validation data: {str(e)}")
 
+def _version_conflict(conflict: VersionConflict) -> HTTPException:
+    return HTTPException(status_code=409, detail={
+        "message": str(conflict),
+        "version": conflict.latest_version,
+        "conflicts": conflict.paths
+    })
+
+class ValidationPatchRequest(BaseModel):
+    version: int
+    operations: List[Dict[str, Any]]
+
+@app.patch("/api/validate-json/{file_id}")
+def patch_validation_json(
+    file_id: int,
+    payload: ValidationPatchRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply JSON Patch (RFC 6902) operations to the JSON being validated.
+
+    Only the changed fields travel over the wire and the operations are
+    stored as the new version's patch. ``version`` is the version the
+    operations were made against, as returned by GET /api/validate-json.
+    If other validators saved since, the edits are merged onto the latest
+    version when they touch different fields; overlapping edits get a 409
+    listing the conflicting paths.
+    """
+    try:
+        # Locked so concurrent saves of the same file get consecutive versions
+        file_record = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).with_for_update().first()
+        if not file_record:
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        current_json = file_record.updated_json if file_record.updated_json is not None else file_record.extracted_json
+        if current_json is None:
+            raise HTTPException(status_code=404, detail="No JSON data available for validation")
+        
+        latest = ensure_history(db, file_record)
+        try:
+            check_mergeable(db, file_id, payload.version, payload.operations, latest)
+        except VersionConflict as conflict:
+            raise _version_conflict(conflict)
+        
+        try:
+            updated_json = apply_patch(current_json, payload.operations)
+        except JsonPatchError as e:
+            raise HTTPException(status_code=422, detail=f"Patch could not be applied: {str(e)}")
+        
+        version = record_version(
+            db, file_record, updated_json, "save", current_user.id, patch=payload.operations
+        )
+        file_record.updated_json = updated_json
+        
+        db.commit()
+        
+        return {
+            "status": "success",
+            "file_id": file_id,
+            "version": version.version,
+            "merged": payload.version != latest.version,
+            "has_pending_changes": True
+        }
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Document was modified concurrently, please retry")
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to apply validation changes: {str(e)}")
+
 @app.post("/api/save-validation-changes")
 def save_validation_changes(
     file_id: int,
     updated_json: dict,
+    version: Optional[int] = None,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Save validation changes to updated_json (pending changes)
+
+    Pass the ``version`` the changes were made against to have them merged
+    with edits other validators saved since; without it the document is
+    overwritten as is.
     """
     try:
-        # Get the file record
-        file_record = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+        # Get the file record, locked so concurrent saves get consecutive versions
+        file_record = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).with_for_update().first()
         if not file_record:
             raise HTTPException(status_code=404, detail="File not found")
         
+        operations = None
+        merged = False
+        # The record holds the latest version whole, so edits are diffed against it
+        current_json = file_record.updated_json if file_record.updated_json is not None else file_record.extracted_json
+        latest = ensure_history(db, file_record)
+        if version is not None and latest is not None and version != latest.version:
+            # Someone saved since this client loaded the document: merge
+            try:
+                operations = make_patch(get_document(db, file_id, version), updated_json)
+            except LookupError:
+                raise _version_conflict(VersionConflict(latest.version, []))
+            try:
+                check_mergeable(db, file_id, version, operations, latest)
+            except VersionConflict as conflict:
+                raise _version_conflict(conflict)
+            updated_json = apply_patch(current_json, operations)
+            merged = True
+        elif current_json is not None:
+            operations = make_patch(current_json, updated_json)
+        
+        # Record the edit as a patch in the version history
+        new_version = record_version(db, file_record, updated_json, "save", current_user.id, patch=operations)
+        
         # Save changes to updated_json (pending changes)
         file_record.updated_json = updated_json
         
@@ -688,11 +843,17 @@ def save_validation_changes(
             "status": "success",
             "message": "Validation changes saved successfully",
             "file_id": file_id,
+            "version": new_version.version,
+            "merged": merged,
             "has_pending_changes": True
         }
         
     except HTTPException:
+        db.rollback()
         raise
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Document was modified concurrently, please retry")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save validation changes: {str(e)}")
@@ -750,181 +911,119 @@ async def list_audit_logs(
     report_period_to: Optional[str] = None,
     log_date_from: Optional[str] = None,
     log_date_to: Optional[str] = None,
+    include_json: bool = False,
     page: int = 1,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
 ):
+    """
+    List audit log entries, newest first.
+
+    Every filter runs in SQL on the indexed state / departments / period
+    columns, so pages and totals are consistent and no JSON is read. Pass
+    ``include_json=true`` to also return each entry's old and new JSON.
+
+    Pages are fetched by keyset on (timestamp, id): pass the returned
+    ``next_cursor`` as ``cursor`` for the next page. ``page`` is still
+    accepted for older clients but gets slower the deeper it goes. The total
+    is skipped with ``include_total=false`` and estimated for large
+    unfiltered tables.
+    """
     try:
-        # Calculate offset for pagination
-        offset = (page - 1) * limit
-        
-        # Build optimized query with joins to reduce N+1 queries
         query = db.query(models.AuditLog)
-        
-        # Apply filters at database level for better performance
+        if not include_json:
+            query = query.options(defer(models.AuditLog.old_json), defer(models.AuditLog.new_json))
+        
+        # State and department match either column, as the UI filters used to
+        if state:
+            query = query.filter(or_(
+                models.AuditLog.state.ilike(f"%{state.strip()}%"),
+                models.AuditLog.departments.ilike(f"%{state.strip()}%")
+            ))
+        if department:
+            query = query.filter(or_(
+                models.AuditLog.departments.ilike(f"%{department.strip()}%"),
+                models.AuditLog.state.ilike(f"%{department.strip()}%")
+            ))
         if search:
             query = query.filter(
                 or_(
                     models.AuditLog.title.ilike(f"%{search}%"),
                     models.AuditLog.username.ilike(f"%{search}%"),
-                    models.AuditLog.action.ilike(f"%{search}%")
+                    models.AuditLog.action.ilike(f"%{search}%"),
+                    models.AuditLog.state.ilike(f"%{search}%"),
+                    models.AuditLog.departments.ilike(f"%{search}%")
                 )
             )
         
-        if log_date_from:
-            try:
-                from_date = datetime.strptime(log_date_from, "%Y-%m-%d").date()
-                query = query.filter(models.AuditLog.timestamp >= from_date)
-            except ValueError:
-                pass
-                
-        if log_date_to:
-            try:
-                to_date = datetime.strptime(log_date_to, "%Y-%m-%d").date()
-                query = query.filter(models.AuditLog.timestamp <= to_date)
-            except ValueError:
-                pass
-        
-        # Get total count for pagination info (optimized)
-        total_count = query.count()
-        
-        # Get paginated logs with optimized ordering
-        logs = query.order_by(models.AuditLog.timestamp.desc()).offset(offset).limit(limit).all()
-
-        def safe_lower(s: Optional[str]) -> str:
-            return (s or "").strip().lower()
-
-        def parse_date(date_str: Optional[str]):
-            if not date_str:
-                return None
-            try:
-                # Try ISO first
-                return datetime.fromisoformat(date_str).date()
-            except Exception:
-                pass
-            try:
-                # Try YYYY-MM-DD
-                return datetime.strptime(date_str, "%Y-%m-%d").date()
-            except Exception:
-                pass
-            try:
-                # Try DD/MM/YYYY
-                return datetime.strptime(date_str, "%d/%m/%Y").date()
-            except Exception:
-                pass
-            try:
-                # Try YYYY only -> set to Jan 1st
-                if len(date_str) == 4 and date_str.isdigit():
-                    return datetime(int(date_str), 1, 1).date()
-            except Exception:
-                pass
-            return None
-
-        def extract_meta(obj: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
-            if not obj:
-                return {"state": None, "departments": None, "period_from": None, "period_to": None}
-            try:
-                report = obj
-                # New schema: Parts -> PART I -> Inspection_Report
-                parts = report.get("Parts") if isinstance(report, dict) else None
-                if parts and isinstance(parts, dict):
-                    part_i = parts.get("PART I")
-                    if part_i and isinstance(part_i, dict):
-                        ir = part_i.get("Inspection_Report")
-                        if ir and isinstance(ir, dict):
-                            report = ir
-                rp = (report.get("Reporting_Period") if isinstance(report, dict) else None) or {}
-                ip = (report.get("Inspection_Period") if isinstance(report, dict) else None) or {}
-                state_name = rp.get("state_name") or ip.get("state_name")
-                departments = rp.get("departments") or ip.get("departments")
-                pf = rp.get("Period_From") or ip.get("Period_From")
-                pt = rp.get("Period_To") or ip.get("Period_To")
-                return {
-                    "state": state_name,
-                    "departments": departments,
-                    "period_from": pf,
-                    "period_to": pt,
-                }
-            except Exception:
-                return {"state": None, "departments": None, "period_from": None, "period_to": None}
-
-        # Pre-parse filter dates
-        rp_from_date = parse_date(report_period_from)
-        rp_to_date = parse_date(report_period_to)
-        ld_from_date = parse_date(log_date_from)
-        ld_to_date = parse_date(log_date_to)
+        # Report period: keep entries whose period overlaps the requested range.
+        # An entry with only one end of its period known is treated as that single day.
+        rp_from_date = parse_report_date(report_period_from)
+        rp_to_date = parse_report_date(report_period_to)
+        if rp_from_date or rp_to_date:
+            period_start = func.coalesce(models.AuditLog.period_from, models.AuditLog.period_to)
+            period_end = func.coalesce(models.AuditLog.period_to, models.AuditLog.period_from)
+            query = query.filter(period_start.isnot(None))
+            if rp_from_date:
+                query = query.filter(period_end >= rp_from_date)
+            if rp_to_date:
+                query = query.filter(period_start <= rp_to_date)
+        
+        ld_from_date = parse_report_date(log_date_from)
+        ld_to_date = parse_report_date(log_date_to)
+        if ld_from_date:
+            query = query.filter(models.AuditLog.timestamp >= ld_from_date)
+        if ld_to_date:
+            # Inclusive of the whole last day
+            query = query.filter(models.AuditLog.timestamp < ld_to_date + timedelta(days=1))
+        
+        total_count, total_estimated = None, False
+        if include_total:
+            filtered = any([state, department, search, rp_from_date, rp_to_date, ld_from_date, ld_to_date])
+            total_count, total_estimated = count_total(db, query, models.AuditLog.id, filtered)
+        
+        # page is still honoured (by offset) for clients that do not send a cursor
+        logs, next_cursor = keyset_page(
+            query, [models.AuditLog.timestamp, models.AuditLog.id], limit, cursor, descending=True,
+            offset=0 if cursor else (page - 1) * limit
+        )
 
-        filtered = []
+        results = []
         for l in logs:
-            meta = extract_meta(l.new_json) or extract_meta(l.old_json)
-            state_val = safe_lower(meta.get("state"))
-            dept_val = safe_lower(meta.get("departments"))
-
-            # Text search across state/department if provided
-            if state and safe_lower(state) not in state_val:
-                # Allow match also inside department for convenience
-                if safe_lower(state) not in dept_val:
-                    continue
-            if department and safe_lower(department) not in dept_val:
-                # Allow match also inside state
-                if safe_lower(department) not in state_val:
-                    continue
-            if search:
-                sterm = safe_lower(search)
-                hay = " ".join([state_val, dept_val, safe_lower(l.title), safe_lower(l.username), safe_lower(l.action)])
-                if sterm not in hay:
-                    continue
-
-            # Report period date filtering
-            if rp_from_date or rp_to_date:
-                pf = parse_date(meta.get("period_from"))
-                pt = parse_date(meta.get("period_to"))
-                # If we cannot parse period dates, skip this record when period filter is used
-                if not pf and not pt:
-                    continue
-                # Consider a record within range if its period overlaps with the requested range
-                candidate_start = pf or pt
-                candidate_end = pt or pf
-                if rp_from_date and candidate_end and candidate_end < rp_from_date:
-                    continue
-                if rp_to_date and candidate_start and candidate_start > rp_to_date:
-                    continue
-
-            # Log timestamp date filtering
-            if (ld_from_date or ld_to_date) and l.timestamp:
-                log_date = l.timestamp.date()
-                if ld_from_date and log_date < ld_from_date:
-                    continue
-                if ld_to_date and log_date > ld_to_date:
-                    continue
-
-            filtered.append({
+            entry = {
                 "id": l.id,
                 "title": l.title,
-                "oldJson": l.old_json,
-                "newJson": l.new_json,
                 "modified": l.modified,
                 "username": l.username,
                 "ip": l.ip,
                 "action": l.action,
                 "timestamp": l.timestamp.isoformat() if l.timestamp else None,
                 "fileId": l.file_id,
-                # Word document HTML for comparison
                 # Expose meta for UI
-                "state": meta.get("state"),
-                "departments": meta.get("departments"),
-                "reportPeriodFrom": meta.get("period_from"),
-                "reportPeriodTo": meta.get("period_to"),
-            })
+                "state": l.state,
+                "departments": l.departments,
+                "reportPeriodFrom": l.period_from.isoformat() if l.period_from else None,
+                "reportPeriodTo": l.period_to.isoformat() if l.period_to else None,
+            }
+            if include_json:
+                entry["oldJson"] = l.old_json
+                entry["newJson"] = l.new_json
+            results.append(entry)
 
         return {
-            "logs": filtered,
+            "logs": results,
             "pagination": {
                 "page": page,
                 "limit": limit,
                 "total": total_count,
-                "pages": (total_count + limit - 1) // limit
+                "total_estimated": total_estimated,
+                "pages": (total_count + limit - 1) // limit if total_count is not None else None,
+                "next_cursor": next_cursor
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list audit logs: {str(e)}")
 
@@ -935,8 +1034,23 @@ class AssignFilesPayload(BaseModel):
 
 
 @app.get("/admin/users/all")
-def list_all_users(db: Session = Depends(get_db)):
-    users = db.query(models.User).order_by(models.User.id.asc()).all()
+def list_all_users(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    List users by id. With ``limit`` one page is returned and the cursor for
+    the next page is sent in the X-Next-Cursor header.
+    """
+    query = db.query(models.User)
+    if limit:
+        users, next_cursor = keyset_page(query, [models.User.id], limit, cursor)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    else:
+        users = query.order_by(models.User.id.asc()).all()
     return [
         {
             "id": u.id,
@@ -956,8 +1070,24 @@ def list_all_users(db: Session = Depends(get_db)):
 
 
 @app.get("/admin/files/all")
-def list_all_files(db: Session = Depends(get_db)):
-    files = db.query(models.UploadedFile).order_by(models.UploadedFile.uploaded_at.desc()).all()
+def list_all_files(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    List files, newest first. With ``limit`` one page is returned and the
+    cursor for the next page is sent in the X-Next-Cursor header.
+    """
+    query = db.query(models.UploadedFile)
+    columns = [models.UploadedFile.uploaded_at, models.UploadedFile.id]
+    if limit:
+        files, next_cursor = keyset_page(query, columns, limit, cursor, descending=True)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    else:
+        files = query.order_by(*[column.desc() for column in columns]).all()
     return [
         {
             "id": f.id,
@@ -970,6 +1100,39 @@ def list_all_files(db: Session = Depends(get_db)):
     ]
 
 
+# Assignment rows inserted per statement by /admin/assign-files
+ASSIGNMENT_INSERT_CHUNK = int(os.getenv("ASSIGNMENT_INSERT_CHUNK", "1000"))
+
+def _insert_new_assignments(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert assignment rows, ignoring (user_id, file_id) pairs that already exist.
+
+    Returns:
+        int: Number of rows inserted
+    """
+    table = models.UserFileAssignment.__table__
+    dialect = db.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as insert_ignore
+        else:
+            from sqlalchemy.dialects.sqlite import insert as insert_ignore
+        # Run as one batched multi-row INSERT; RETURNING lists only the rows actually inserted
+        statement = insert_ignore(table).on_conflict_do_nothing(
+            index_elements=[table.c.user_id, table.c.file_id]
+        ).returning(table.c.id)
+        return len(db.execute(statement, rows).all())
+    # Other databases: leave out the pairs that exist, found with one query
+    existing = set(db.query(models.UserFileAssignment.user_id, models.UserFileAssignment.file_id).filter(
+        tuple_(models.UserFileAssignment.user_id, models.UserFileAssignment.file_id).in_(
+            [(row["user_id"], row["file_id"]) for row in rows]
+        )
+    ).all())
+    new_rows = [row for row in rows if (row["user_id"], row["file_id"]) not in existing]
+    if new_rows:
+        db.execute(table.insert(), new_rows)
+    return len(new_rows)
+
 @app.post("/admin/assign-files")
 def assign_files(payload: AssignFilesPayload, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     if not payload.user_ids or not payload.file_ids:
@@ -989,32 +1152,18 @@ def assign_files(payload: AssignFilesPayload, db: Session = Depends(get_db), cur
         if missing_users or missing_files:
             raise HTTPException(status_code=400, detail=f"Invalid IDs. Missing users: {missing_users}, Missing files: {missing_files}")
 
-        # Insert or ignore duplicates
+        # Insert every pair in a few statements, skipping pairs that are already assigned
+        rows = [
+            {"user_id": uid, "file_id": fid, "assigned_by": current_user.id, "validated": 0}
+            for uid in user_ids
+            for fid in file_ids
+        ]
         created = 0
-        for uid in user_ids:
-            for fid in file_ids:
-                exists = db.query(models.UserFileAssignment).filter(
-                    models.UserFileAssignment.user_id == uid,
-                    models.UserFileAssignment.file_id == fid,
-                ).first()
-                
-                if exists:
-                    continue
-                    
-                # Handle both dict and User object cases
-                assigned_by_id = None
-                if current_user:
-                    if isinstance(current_user, dict):
-                        assigned_by_id = current_user.get('id')
-                    else:
-                        assigned_by_id = getattr(current_user, 'id', None)
-                
-                assignment = models.UserFileAssignment(user_id=uid, file_id=fid, assigned_by=assigned_by_id)
-                db.add(assignment)
-                created += 1
+        for start in range(0, len(rows), ASSIGNMENT_INSERT_CHUNK):
+            created += _insert_new_assignments(db, rows[start:start + ASSIGNMENT_INSERT_CHUNK])
 
         db.commit()
-        return {"status": "success", "created": created}
+        return {"status": "success", "created": created, "skipped": len(rows) - created}
     except HTTPException:
         raise
     except Exception as e:
@@ -1048,20 +1197,30 @@ def update_role_permissions(role_data: RoleCreate, db: Session = Depends(get_db)
                     can_delete=can_delete
                 )
                 db.add(role_menu)
-        db.commit()
+    db.commit()
+    # Principals read the compiled table, so this applies to every signed-in user
+    rebuild_permissions(db)
     return {"message": "Role permissions updated successfully"}
 
 @app.post("/admin/users/bulk-upload")
-async def bulk_upload_users(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def bulk_upload_users(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    background: bool = False
+):
     """
     Bulk upload users from CSV or Excel file
     
+    The file is read as a stream and imported in chunks (see user_import.py).
+    With ``background=true`` the import runs after the response, which is a
+    202 with a job id; poll /admin/users/bulk-upload/{job_id} for progress.
+    
     Args:
         file: CSV or Excel file containing user data
-        db: Database session
+        background: Return at once instead of waiting for the import
         
     Returns:
-        dict: Upload results with successful and failed counts
+        dict: Upload results with successful and failed counts, or the job when run in the background
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
@@ -1081,154 +1240,41 @@ async def bulk_upload_users(file: UploadFile = File(...), db: Session = Depends(
         )
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Parse file based on extension
-        users_data = []
-        if file_extension == '.csv':
-            # Parse CSV
-            csv_data = content.decode('utf-8')
-            csv_reader = csv.DictReader(io.StringIO(csv_data))
-            users_data = list(csv_reader)
-        else:
-            # Parse Excel
-            workbook = openpyxl.load_workbook(io.BytesIO(content))
-            sheet = workbook.active
-            
-            # Get headers from first row
-            headers = []
-            for cell in sheet[1]:
-                headers.append(cell.value)
-            
-            # Parse data rows
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                if any(row):  # Skip empty rows
-                    user_dict = {}
-                    for i, value in enumerate(row):
-                        if i < len(headers) and headers[i]:
-                            user_dict[headers[i]] = value
-                    users_data.append(user_dict)
-        
-        if not users_data:
-            raise HTTPException(status_code=400, detail="No valid user data found in file")
-        
-        # Required fields
-        required_fields = ['firstname', 'lastname', 'email', 'password']
-        
-        # Process users
-        successful_users = 0
-        failed_users = 0
-        errors = []
-        
-        for row_num, user_data in enumerate(users_data, start=2):  # Start from row 2 (after header)
-            try:
-                # Validate required fields
-                missing_fields = []
-                for field in required_fields:
-                    if field not in user_data or not user_data[field] or str(user_data[field]).strip() == '':
-                        missing_fields.append(field)
-                
-                if missing_fields:
-                    errors.append(f"Row {row_num}: Missing required fields: {', '.join(missing_fields)}")
-                    failed_users += 1
-                    continue
-                
-                # Clean and validate email
-                email = str(user_data['email']).strip().lower()
-                if '@' not in email or '.' not in email:
-                    errors.append(f"Row {row_num}: Invalid email format")
-                    failed_users += 1
-                    continue
-                
-                # Check if user already exists
-                existing_user = db.query(models.User).filter(models.User.email == email).first()
-                if existing_user:
-                    errors.append(f"Row {row_num}: User with email {email} already exists")
-                    failed_users += 1
-                    continue
-                
-                # Hash password
-                password = str(user_data['password']).strip()
-                if len(password) < 6:
-                    errors.append(f"Row {row_num}: Password must be at least 6 characters long")
-                    failed_users += 1
-                    continue
-                
-                hashed_password = hash_password(password)
-                
-                # Parse date of birth if provided
-                dob = None
-                if user_data.get('dob'):
-                    try:
-                        dob_str = str(user_data['dob']).strip()
-                        if dob_str:
-                            # Try to parse common date formats
-                            for date_format in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y']:
-                                try:
-                                    dob = datetime.strptime(dob_str, date_format).date()
-                                    break
-                                except ValueError:
-                                    continue
-                            
-                            if not dob:
-                                errors.append(f"Row {row_num}: Invalid date format for dob. Use YYYY-MM-DD format.")
-                                failed_users += 1
-                                continue
-                    except:
-                        pass  # dob is optional, so we ignore parsing errors
-                
-                # Create user object
-                new_user = models.User(
-                    firstname=str(user_data['firstname']).strip(),
-                    lastname=str(user_data['lastname']).strip(),
-                    email=email,
-                    password=hashed_password,
-                    contactno=str(user_data.get('contactno', '')).strip() or None,
-                    dob=dob,
-                    place=str(user_data.get('place', '')).strip() or None,
-                    city=str(user_data.get('city', '')).strip() or None,
-                    state=str(user_data.get('state', '')).strip() or None,
-                    pincode=str(user_data.get('pincode', '')).strip() or None,
-                    gender=str(user_data.get('gender', '')).strip() or None,
-                    role_status='unassigned'
-                )
-                
-                # Add to database
-                db.add(new_user)
-                successful_users += 1
-                
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
-                failed_users += 1
-                continue
-        
-        # Commit successful users
-        if successful_users > 0:
-            db.commit()
-        else:
-            db.rollback()
-        
-        # Prepare response
-        response = {
-            "successful_users": successful_users,
-            "failed_users": failed_users,
-            "total_rows": len(users_data)
-        }
-        
-        if errors:
-            response["errors"] = errors[:10]  # Limit to first 10 errors
-            if len(errors) > 10:
-                response["additional_errors"] = len(errors) - 10
-        
-        return response
-        
+        # Spool the upload to disk so the import can stream it after this request ends
+        def save_upload():
+            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as saved:
+                shutil.copyfileobj(file.file, saved)
+                return saved.name
+        path = await run_in_threadpool(save_upload)
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=500, 
             detail=f"Failed to process bulk upload: {str(e)}"
         )
+    
+    job = import_jobs.create(file.filename)
+    if background:
+        background_tasks.add_task(run_import, job, path, file_extension)
+        return JSONResponse(status_code=202, content=job.to_dict())
+    
+    # Off the event loop: other requests are served while the file is imported
+    await run_in_threadpool(run_import, job, path, file_extension)
+    if job.total_rows == 0 and job.status == "failed":
+        raise HTTPException(status_code=400, detail="No valid user data found in file")
+    if job.status == "failed":
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Failed to process bulk upload: {job.detail}"
+        )
+    return job.result()
+
+@app.get("/admin/users/bulk-upload/{job_id}")
+async def get_bulk_upload_job(job_id: str):
+    """Progress of a bulk user import: status, rows processed so far and their results"""
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.to_dict()
 
 @app.delete("/admin/users/{user_id}")
 async def delete_user(user_id: int, db: Session = Depends(get_db)):
@@ -1262,6 +1308,7 @@ async def delete_user(user_id: int, db: Session = Depends(get_db)):
         # Delete the user
         db.delete(user)
         db.commit()
+        invalidate_principal(user_id)
         
         return {"message": "User deleted successfully", "deleted_user_id": user_id}
         
@@ -1304,9 +1351,12 @@ async def update_user_status(user_id: int, status_data: dict, db: Session = Depe
                 detail=f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
             )
         
-        # Update user status
-        user.role_status = new_status
+        # Update user status; tokens issued under the old status stop working
+        if user.role_status != new_status:
+            user.role_status = new_status
+            revoke_tokens(user)
         db.commit()
+        invalidate_principal(user_id)
         
         return {
             "message": "User status updated successfully", 
@@ -1328,17 +1378,16 @@ async def update_user_status(user_id: int, status_data: dict, db: Session = Depe
 async def get_user_assigned_files(user_id: int, db: Session = Depends(get_db)):
     """Get list of files assigned to a specific user"""
     try:
-        # Get all file assignments for the user
-        assignments = db.query(models.UserFileAssignment).filter(
+        # Get all file assignments for the user, with their files in the same query
+        assignments = db.query(models.UserFileAssignment).options(
+            joinedload(models.UserFileAssignment.file)
+        ).filter(
             models.UserFileAssignment.user_id == user_id
         ).all()
         
         assigned_files = []
         for assignment in assignments:
-            # Get the file details
-            file_record = db.query(models.UploadedFile).filter(
-                models.UploadedFile.id == assignment.file_id
-            ).first()
+            file_record = assignment.file
             
             if file_record:
                 assigned_files.append({
@@ -1387,32 +1436,24 @@ async def get_my_assigned_files(current_user: models.User = Depends(get_current_
             
         print(f"Fetching assigned files for user ID: {user_id}")
         
-        # Get all file assignments for the current user
-        assignments = db.query(models.UserFileAssignment).filter(
+        # Get all file assignments for the current user; files and assigning
+        # admins are loaded by the same query instead of one query each per row
+        assignments = db.query(models.UserFileAssignment).options(
+            joinedload(models.UserFileAssignment.file),
+            joinedload(models.UserFileAssignment.assigner).load_only(models.User.firstname, models.User.lastname),
+        ).filter(
             models.UserFileAssignment.user_id == user_id
         ).all()
         
         print(f"Found {len(assignments)} assignments for user {user_id}")
-        print(f"Assignment details: {[(a.id, a.user_id, a.file_id, a.assigned_at) for a in assignments]}")
         
         assigned_files = []
         for assignment in assignments:
-            print(f"Processing assignment: file_id={assignment.file_id}, assigned_at={assignment.assigned_at}")
-            
-            # Get the file details
-            file_record = db.query(models.UploadedFile).filter(
-                models.UploadedFile.id == assignment.file_id
-            ).first()
+            file_record = assignment.file
             
             if file_record:
-                print(f"Found file record: {file_record.filename}")
-                
-                # Get the name of the admin who assigned the file
-                assigned_by_user = None
-                if assignment.assigned_by:
-                    assigned_by_user = db.query(models.User).filter(
-                        models.User.id == assignment.assigned_by
-                    ).first()
+                # Name of the admin who assigned the file
+                assigned_by_user = assignment.assigner
                 
                 assigned_files.append({
                     "id": file_record.id,
@@ -1428,7 +1469,6 @@ async def get_my_assigned_files(current_user: models.User = Depends(get_current_
                 print(f"File record not found for file_id: {assignment.file_id}")
         
         print(f"Returning {len(assigned_files)} assigned files")
-        print(f"Assigned files data: {assigned_files}")
         return {
             "status": "success",
             "assigned_files": assigned_files,
@@ -1784,6 +1824,7 @@ def create_data_validation_feedback(
         db.add(feedback)
         db.commit()
         db.refresh(feedback)
+        feedback_count_cache.clear()
         
         # Create activity log entry for feedback submission
         try:
@@ -1873,16 +1914,28 @@ def create_data_validation_feedback(
 
 @app.get("/api/data-validation-feedback", response_model=List[FeedbackResponse])
 def get_data_validation_feedback(
+    response: Response,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
     status_filter: Optional[str] = None,
     severity_filter: Optional[str] = None,
     date_from: Optional[str] = None,
-    date_to: Optional[str] = None
+    date_to: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None
 ):
-    """Get data validation feedback entries"""
+    """
+    Get data validation feedback entries, newest first
+
+    With ``limit`` one page is returned and the cursor for the next page is
+    sent in the X-Next-Cursor header.
+    """
     try:
-        query = db.query(models.DataValidationFeedback)
+        # Author and file names come from the same query
+        query = db.query(models.DataValidationFeedback).options(
+            joinedload(models.DataValidationFeedback.user).load_only(models.User.firstname, models.User.lastname),
+            joinedload(models.DataValidationFeedback.file).load_only(models.UploadedFile.original_filename),
+        )
         
         # Apply filters
         if status_filter:
@@ -1907,24 +1960,22 @@ def get_data_validation_feedback(
                 pass
         
         # If user is not superadmin or admin, only show their own feedback
-        user_roles = [ur.role.name for ur in current_user.user_roles]
-        if "superadmin" not in user_roles and "admin" not in user_roles:
+        if not is_admin(current_user):
             query = query.filter(models.DataValidationFeedback.user_id == current_user.id)
         
-        feedback_entries = query.order_by(models.DataValidationFeedback.created_at.desc()).all()
+        columns = [models.DataValidationFeedback.created_at, models.DataValidationFeedback.id]
+        if limit:
+            feedback_entries, next_cursor = keyset_page(query, columns, limit, cursor, descending=True)
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        else:
+            feedback_entries = query.order_by(*[column.desc() for column in columns]).all()
         
         result = []
         for feedback in feedback_entries:
-            # Get user name
-            user = db.query(models.User).filter(models.User.id == feedback.user_id).first()
+            user = feedback.user
             user_name = f"{user.firstname} {user.lastname}".strip() if user else "Unknown User"
-            
-            # Get file name
-            file_name = None
-            if feedback.file_id:
-                file_obj = db.query(models.UploadedFile).filter(models.UploadedFile.id == feedback.file_id).first()
-                if file_obj:
-                    file_name = file_obj.original_filename
+            file_name = feedback.file.original_filename if feedback.file else None
             
             result.append(FeedbackResponse(
                 id=feedback.id,
@@ -1942,6 +1993,8 @@ def get_data_validation_feedback(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching feedback: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch feedback: {str(e)}")
@@ -1957,8 +2010,7 @@ def update_feedback_status(
     """Update feedback status (admin only)"""
     try:
         # Check if user is superadmin or admin
-        user_roles = [ur.role.name for ur in current_user.user_roles]
-        if "superadmin" not in user_roles and "admin" not in user_roles:
+        if not is_admin(current_user):
             raise HTTPException(status_code=403, detail="Only SuperAdmin or Admin can update feedback status")
         
         # Validate status
@@ -1981,6 +2033,7 @@ def update_feedback_status(
         
         db.commit()
         db.refresh(feedback)
+        feedback_count_cache.clear()
         
         return {
             "status": "success",
@@ -2000,26 +2053,25 @@ def get_feedback_count(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get count of feedback entries by status"""
+    """
+    Get count of feedback entries by status
+
+    Counts come from per-user counters maintained on every feedback write and
+    the response is cached per user until the next write.
+    """
     try:
-        query = db.query(models.DataValidationFeedback)
+        cached = feedback_count_cache.get(current_user.id)
+        if cached is not None:
+            return cached
         
         # If user is not superadmin or admin, only count their own feedback
-        user_roles = [ur.role.name for ur in current_user.user_roles]
-        if "superadmin" not in user_roles and "admin" not in user_roles:
-            query = query.filter(models.DataValidationFeedback.user_id == current_user.id)
-        
-        total = query.count()
-        pending = query.filter(models.DataValidationFeedback.status == "pending").count()
-        reviewed = query.filter(models.DataValidationFeedback.status == "reviewed").count()
-        resolved = query.filter(models.DataValidationFeedback.status == "resolved").count()
+        if not is_admin(current_user):
+            counts = feedback_counts(db, current_user.id)
+        else:
+            counts = feedback_counts(db)
         
-        return {
-            "total": total,
-            "pending": pending,
-            "reviewed": reviewed,
-            "resolved": resolved
-        }
+        feedback_count_cache.put(current_user.id, counts)
+        return counts
         
     except Exception as e:
         print(f"Error counting feedback: {str(e)}")
@@ -2032,7 +2084,12 @@ async def compute_diffs(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Compute differences between old and new JSON for data validation"""
+    """
+    Compute differences between old and new JSON for data validation
+
+    Prefer GET /api/documents/{file_id}/diffs, which loads both versions
+    server-side and caches the result.
+    """
     try:
         data = await request.json()
         old_json = data.get('oldJson', {})
@@ -2040,23 +2097,7 @@ async def compute_diffs(
         file_id = data.get('fileId')
         
         # Compute diffs efficiently
-        diffs = compute_json_diffs(old_json, new_json)
-        
-        # Convert diffs to modified format for audit logs
-        modified = []
-        for diff in diffs:
-            modified.append({
-                'path': diff.get('path', ''),
-                'oldValue': diff.get('oldValue'),
-                'newValue': diff.get('newValue')
-            })
-        
-        return {
-            "success": True,
-            "diffs": diffs,
-            "modified": modified,
-            "total_changes": len(diffs)
-        }
+        return {"success": True, **summarize_diffs(compute_json_diffs(old_json, new_json))}
         
     except Exception as e:
         print(f"Error computing diffs: {e}")
@@ -2065,82 +2106,6 @@ async def compute_diffs(
             detail=f"Failed to compute differences: {str(e)}"
         )
 
-def compute_json_diffs(old_obj, new_obj, base_path=""):
-    """Efficiently compute differences between two JSON objects"""
-    diffs = []
-    
-    if old_obj == new_obj:
-        return diffs
-    
-    if type(old_obj) != type(new_obj):
-        diffs.append({
-            "path": base_path,
-            "oldValue": old_obj,
-            "newValue": new_obj,
-            "type": "type_change"
-        })
-        return diffs
-    
-    if isinstance(old_obj, dict):
-        all_keys = set(old_obj.keys()) | set(new_obj.keys())
-        for key in all_keys:
-            old_val = old_obj.get(key)
-            new_val = new_obj.get(key)
-            current_path = f"{base_path}.{key}" if base_path else key
-            
-            if key not in old_obj:
-                diffs.append({
-                    "path": current_path,
-                    "oldValue": None,
-                    "newValue": new_val,
-                    "type": "added"
-                })
-            elif key not in new_obj:
-                diffs.append({
-                    "path": current_path,
-                    "oldValue": old_val,
-                    "newValue": None,
-                    "type": "removed"
-                })
-            else:
-                diffs.extend(compute_json_diffs(old_val, new_val, current_path))
-    
-    elif isinstance(old_obj, list):
-        max_len = max(len(old_obj), len(new_obj))
-        for i in range(max_len):
-            current_path = f"{base_path}[{i}]"
-            old_val = old_obj[i] if i < len(old_obj) else None
-            new_val = new_obj[i] if i < len(new_obj) else None
-            
-            if i >= len(old_obj):
-                diffs.append({
-                    "path": current_path,
-                    "oldValue": None,
-                    "newValue": new_val,
-                    "type": "added"
-                })
-            elif i >= len(new_obj):
-                diffs.append({
-                    "path": current_path,
-                    "oldValue": old_val,
-                    "newValue": None,
-                    "type": "removed"
-                })
-            else:
-                diffs.extend(compute_json_diffs(old_val, new_val, current_path))
-    
-    else:
-        # Primitive values
-        if old_obj != new_obj:
-            diffs.append({
-                "path": base_path,
-                "oldValue": old_obj,
-                "newValue": new_obj,
-                "type": "modified"
-            })
-    
-    return diffs
-
 # Inspection Report API Endpoints
 
 
@@ -2153,33 +2118,12 @@ async def get_inspection_reports(
 ):
     """Get all uploaded files for inspection period"""
     try:
-        # Get uploaded files with their associated JSON files
+        # The uploader's name and the latest audit log entry are summarised on the
+        # file record (see the listeners in models.py), so this is a single scan
         uploaded_files = db.query(models.UploadedFile).offset(skip).limit(limit).all()
         
         reports = []
         for file in uploaded_files:
-            # Get the latest audit log for this file to check if there's an updated JSON
-            latest_audit = db.query(models.AuditLog).filter(
-                models.AuditLog.file_id == file.id
-            ).order_by(models.AuditLog.timestamp.desc()).first()
-            
-            # Get user info
-            user = db.query(models.User).filter(models.User.id == file.uploaded_by).first()
-            
-            # Handle user name display
-            uploaded_by_name = "Unknown"
-            if user:
-                firstname = user.firstname or ""
-                lastname = user.lastname or ""
-                if firstname and lastname:
-                    uploaded_by_name = f"{firstname} {lastname}"
-                elif firstname:
-                    uploaded_by_name = firstname
-                elif lastname:
-                    uploaded_by_name = lastname
-                else:
-                    uploaded_by_name = user.email or "Unknown"
-            
             reports.append({
                 "id": file.id,
                 "filename": file.original_filename,
@@ -2187,14 +2131,14 @@ async def get_inspection_reports(
                 "file_size": file.file_size,
                 "file_type": file.file_type,
                 "uploaded_at": file.uploaded_at.isoformat() if file.uploaded_at else None,
-                "uploaded_by": uploaded_by_name,
+                "uploaded_by": file.uploaded_by_name or "Unknown",
                 "status": file.status,
-                "has_json": bool(file.extracted_json),
-                "json_filename": f"{file.original_filename}.json" if file.extracted_json else None,
+                "has_json": file.extracted_json_id is not None,
+                "json_filename": f"{file.original_filename}.json" if file.extracted_json_id is not None else None,
                 "json_file_path": None,  # JSON is stored in database, not as separate files
                 "json_uploaded_at": file.json_updated_at.isoformat() if file.json_updated_at else None,
-                "has_updated_json": bool(getattr(file, 'updated_json', None)) or (latest_audit is not None and latest_audit.new_json is not None),
-                "last_updated": latest_audit.timestamp.isoformat() if latest_audit else None
+                "has_updated_json": bool(file.has_updated_json),
+                "last_updated": file.last_audit_at.isoformat() if file.last_audit_at else None
             })
         
         return {
@@ -2252,16 +2196,19 @@ async def get_inspection_report_json(
         if file_type == "original_json":
             # Get the original JSON file from database
             if not uploaded_file.extracted_json:
-                # Try to get the latest JSON from audit logs as fallback
-                latest_audit = db.query(models.AuditLog).filter(
-                    models.AuditLog.file_id == uploaded_file.id,
-                    models.AuditLog.old_json.isnot(None)
-                ).order_by(models.AuditLog.timestamp.desc()).first()
-                
-                if not latest_audit or not latest_audit.old_json:
-                    raise HTTPException(status_code=404, detail="Original JSON data not found")
-                
-                json_data = latest_audit.old_json
+                # Fall back to the latest submitted version in the history
+                json_data = latest_submitted_document(db, uploaded_file.id)
+                if json_data is None:
+                    # Files edited before versioning only have audit log copies
+                    latest_audit = db.query(models.AuditLog).filter(
+                        models.AuditLog.file_id == uploaded_file.id,
+                        models.AuditLog.old_json.isnot(None)
+                    ).order_by(models.AuditLog.timestamp.desc()).first()
+                    
+                    if not latest_audit or not latest_audit.old_json:
+                        raise HTTPException(status_code=404, detail="Original JSON data not found")
+                    
+                    json_data = latest_audit.old_json
             else:
                 json_data = uploaded_file.extracted_json
             
@@ -2271,16 +2218,19 @@ async def get_inspection_report_json(
             # Get the updated JSON file from database
             json_obj = getattr(uploaded_file, 'updated_json', None)
             if json_obj is None:
-                # Fallback to the latest updated JSON from audit logs
-                latest_audit = db.query(models.AuditLog).filter(
-                    models.AuditLog.file_id == uploaded_file.id,
-                    models.AuditLog.new_json.isnot(None)
-                ).order_by(models.AuditLog.timestamp.desc()).first()
-                
-                if not latest_audit or not latest_audit.new_json:
-                    raise HTTPException(status_code=404, detail="Updated JSON data not found")
-                
-                json_data = latest_audit.new_json
+                # Fall back to the latest edited version in the history
+                json_data = latest_edited_document(db, uploaded_file.id)
+                if json_data is None:
+                    # Files edited before versioning only have audit log copies
+                    latest_audit = db.query(models.AuditLog).filter(
+                        models.AuditLog.file_id == uploaded_file.id,
+                        models.AuditLog.new_json.isnot(None)
+                    ).order_by(models.AuditLog.timestamp.desc()).first()
+                    
+                    if not latest_audit or not latest_audit.new_json:
+                        raise HTTPException(status_code=404, detail="Updated JSON data not found")
+                    
+                    json_data = latest_audit.new_json
             else:
                 json_data = json_obj
             
@@ -2333,16 +2283,19 @@ async def download_inspection_report_file(
         elif file_type == "original_json":
             # Download the original JSON file from database
             if not uploaded_file.extracted_json:
-                # Try to get the latest JSON from audit logs as fallback
-                latest_audit = db.query(models.AuditLog).filter(
-                    models.AuditLog.file_id == uploaded_file.id,
-                    models.AuditLog.old_json.isnot(None)
-                ).order_by(models.AuditLog.timestamp.desc()).first()
-                
-                if not latest_audit or not latest_audit.old_json:
-                    raise HTTPException(status_code=404, detail="Original JSON data not found")
-                
-                json_data = latest_audit.old_json
+                # Fall back to the latest submitted version in the history
+                json_data = latest_submitted_document(db, uploaded_file.id)
+                if json_data is None:
+                    # Files edited before versioning only have audit log copies
+                    latest_audit = db.query(models.AuditLog).filter(
+                        models.AuditLog.file_id == uploaded_file.id,
+                        models.AuditLog.old_json.isnot(None)
+                    ).order_by(models.AuditLog.timestamp.desc()).first()
+                    
+                    if not latest_audit or not latest_audit.old_json:
+                        raise HTTPException(status_code=404, detail="Original JSON data not found")
+                    
+                    json_data = latest_audit.old_json
             else:
                 json_data = uploaded_file.extracted_json
             
@@ -2367,7 +2320,10 @@ async def download_inspection_report_file(
             # Prefer the updated_json stored on the file row
             json_obj = getattr(uploaded_file, 'updated_json', None)
             if json_obj is None:
-                # Fallback to the latest updated JSON from audit logs
+                # Fall back to the latest edited version in the history
+                json_obj = latest_edited_document(db, uploaded_file.id)
+            if json_obj is None:
+                # Files edited before versioning only have audit log copies
                 latest_audit = db.query(models.AuditLog).filter(
                     models.AuditLog.file_id == uploaded_file.id,
                     models.AuditLog.new_json.isnot(None)
@@ -2453,9 +2409,13 @@ async def delete_inspection_report(
         
         # JSON data is stored in database, no separate file to delete
         
-        # Delete from database
+        # Delete from database with its history, taking its feedback off the counts
+        delete_file_feedback(db, uploaded_file.id)
+        delete_history(db, uploaded_file.id)
         db.delete(uploaded_file)
         db.commit()
+        feedback_count_cache.clear()
+        forget_file(report_id)
         
         return {
             "success": True,
@@ -2618,39 +2578,45 @@ def create_data_validation_draft(
 
 @app.get("/api/data-validation-drafts", response_model=List[DraftResponse])
 def get_data_validation_drafts(
+    response: Response,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    file_id: Optional[int] = None
+    file_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None
 ):
-    """Get all drafts for the current user, optionally filtered by file_id"""
+    """
+    Get all drafts for the current user, optionally filtered by file_id
+
+    Drafts are listed most recently saved first. With ``limit`` one page is
+    returned and the cursor for the next page is sent in the X-Next-Cursor
+    header.
+    """
     try:
-        query = db.query(models.DataValidationDraft).filter(
+        query = db.query(models.DataValidationDraft).options(
+            # File names come from the same query
+            joinedload(models.DataValidationDraft.file).load_only(models.UploadedFile.original_filename)
+        ).filter(
             models.DataValidationDraft.user_id == current_user.id
         )
         
         if file_id:
             query = query.filter(models.DataValidationDraft.file_id == file_id)
         
-        drafts = query.order_by(models.DataValidationDraft.last_saved.desc()).all()
+        columns = [models.DataValidationDraft.last_saved, models.DataValidationDraft.id]
+        if limit:
+            drafts, next_cursor = keyset_page(query, columns, limit, cursor, descending=True)
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        else:
+            drafts = query.order_by(*[column.desc() for column in columns]).all()
         
         # Get user name for response
         user_name = f"{current_user.firstname} {current_user.lastname}".strip()
         
         result = []
         for draft in drafts:
-            # Get file name if file_id is provided
-            file_name = None
-            if draft.file_id:
-                file_obj = db.query(models.UploadedFile).filter(models.UploadedFile.id == draft.file_id).first()
-                if file_obj:
-                    file_name = file_obj.original_filename
-            
-            # Debug logging for draft data
-            print(f"Draft {draft.id}: {draft.draft_name}")
-            print(f"  - Has extracted_data: {bool(draft.extracted_data)}")
-            print(f"  - Has working_json: {bool(draft.working_json)}")
-            print(f"  - Has pending_changes: {bool(draft.pending_changes)}")
-            print(f"  - Last saved: {draft.last_saved}")
+            file_name = draft.file.original_filename if draft.file else None
             
             result.append(DraftResponse(
                 id=draft.id,
@@ -2947,10 +2913,70 @@ async def process_md_to_json(request: dict):
 # DATA VALIDATION UPLOAD ENDPOINT WITH 3-STEP CONVERSION
 # =============================================================================
 
+def _duplicate_upload_response(existing: UploadedFile):
+    """Response for a validation upload whose content is already on record"""
+    return {
+        "success": True,
+        "message": "File already uploaded",
+        "file_id": existing.id,
+        "filename": existing.filename,
+        "file_path": existing.file_path,
+        "duplicate": True,
+        "status": existing.status,
+        "conversion_completed": existing.extracted_json is not None,
+        "conversion_pending": existing.status == "processing",
+        "json_data": existing.extracted_json,
+        "has_json": existing.extracted_json is not None
+    }
+
+def run_validation_extraction(file_id: int):
+    """
+    Background step of /data-validation-upload: run the full 3-step
+    conversion and store the extracted JSON on the record.
+
+    Args:
+        file_id: ID of the record created by the upload
+    """
+    db = SessionLocal()
+    try:
+        db_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+        if not db_file:
+            print(f"Validation extraction skipped, file {file_id} no longer exists")
+            return
+
+        try:
+            print(f"Starting 3-step conversion for DOCX file: {db_file.filename}")
+            json_data = convert_docx_sandboxed(db_file.file_path)
+
+            # Optional JSON copy next to the DOCX
+            write_json_sidecar(db_file.file_path, json_data)
+
+            record_version(db, db_file, json_data, "extract", db_file.uploaded_by)
+            db_file.extracted_json = json_data
+            db_file.json_updated_at = datetime.now()
+            if DUPLICATE_UPDATED_JSON:
+                db_file.updated_json = json_data
+            db_file.status = "processed"
+            print(f"3-step conversion completed successfully for: {db_file.filename}")
+        except Exception as e:
+            print(f"Error in 3-step conversion: {str(e)}")
+            traceback.print_exc()
+            db_file.status = "error"
+            # Release the hash so uploading the file again retries the conversion
+            db_file.sha256 = None
+        db.commit()
+    finally:
+        db.close()
+
 @app.post("/data-validation-upload")
-async def data_validation_upload(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def data_validation_upload(background_tasks: BackgroundTasks, file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
     Upload file for data validation with 3-step DOCX conversion workflow
+
+    DOCX uploads return straight away with a metadata preview (heading,
+    state, department, period and dates of audit) read from the opening
+    paragraphs. The full conversion runs in the background; poll
+    ``/data-validation-upload/{file_id}`` for its result.
     """
     try:
         # Validate file type
@@ -2966,122 +2992,114 @@ async def data_validation_upload(file: UploadFile = File(...), db: Session = Dep
         clean_filename = re.sub(r'[^\w\s.-]', '', clean_filename)
         clean_filename = re.sub(r'\s+', ' ', clean_filename).strip()
         
-        unique_path = os.path.join(upload_dir, clean_filename)
+        # Never overwrite a different report that happens to share the name
+        clean_filename, unique_path = unique_upload_path(clean_filename)
         
         # Save file to disk
         with open(unique_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        # Create database record
+        # Same content already uploaded: link to the existing record and its JSON
+        sha256 = compute_sha256(unique_path)
+        existing = find_duplicate(db, sha256)
+        if existing:
+            os.remove(unique_path)
+            return _duplicate_upload_response(existing)
+        
+        is_docx = file.filename.lower().endswith('.docx')
+        if is_docx:
+            # Reject zip bombs before anything parses the archive
+            try:
+                check_archive(unique_path)
+            except UnsafeArchiveError as e:
+                os.remove(unique_path)
+                raise HTTPException(status_code=400, detail=f"Rejected DOCX file: {str(e)}")
+        
+        # Create database record; DOCX files are completed by the background step
         db_file = models.UploadedFile(
             filename=clean_filename,
             original_filename=clean_filename,
             file_path=unique_path,
             file_size=os.path.getsize(unique_path),
             file_type=file.content_type or "application/octet-stream",
-            uploaded_at=datetime.now()
+            uploaded_at=datetime.now(),
+            status="processing" if is_docx else "uploaded",
+            sha256=sha256
         )
         db.add(db_file)
-        db.commit()
-        db.refresh(db_file)
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent upload of the same content won the race
+            db.rollback()
+            existing = find_duplicate(db, sha256)
+            if not existing:
+                raise
+            os.remove(unique_path)
+            return _duplicate_upload_response(existing)
         
         result = {
             "success": True,
             "message": "File uploaded successfully",
             "file_id": db_file.id,
             "filename": clean_filename,
-            "file_path": unique_path
+            "file_path": unique_path,
+            "status": db_file.status
         }
         
-        # If it's a DOCX file, perform 3-step conversion
-        if file.filename.lower().endswith('.docx'):
+        if is_docx:
+            # Quick preview from the opening paragraphs
             try:
-                print(f"Starting 3-step conversion for DOCX file: {clean_filename}")
-                
-                # Step 1: DOCX to XML
-                print("Step 1: Converting DOCX to XML...")
-                from cag_doc_xml import docx_to_custom_xml
-                xml_output_path = unique_path.replace('.docx', '.xml')
-                docx_to_custom_xml(unique_path, xml_output_path)
-                
-                # Step 2: XML to Markdown
-                print("Step 2: Converting XML to Markdown...")
-                from cag_xml_md import xml_to_md
-                md_output_path = unique_path.replace('.docx', '.md')
-                xml_to_md(xml_output_path, md_output_path)
-                
-                # Step 3: Markdown to JSON
-                print("Step 3: Converting Markdown to JSON...")
-                import importlib.util
-                spec = importlib.util.spec_from_file_location("cag_md_json", "cag_md_json 1.py")
-                cag_md_json_module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(cag_md_json_module)
-                
-                json_data = cag_md_json_module.process_markdown_file(md_output_path)
-                
-                # Save JSON to file
-                json_output_path = unique_path.replace('.docx', '.json')
-                with open(json_output_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, indent=2, ensure_ascii=False)
-                
-                # Update database record with JSON data
-                db_file.extracted_json = json_data
-                db_file.json_updated_at = datetime.now()
-                db_file.updated_json = json_data
-                db.commit()
-                
-                # Save XML and MD files for future download
-                xml_filename = f"{os.path.splitext(clean_filename)[0]}.xml"
-                md_filename = f"{os.path.splitext(clean_filename)[0]}.md"
-                xml_save_path = os.path.join(upload_dir, xml_filename)
-                md_save_path = os.path.join(upload_dir, md_filename)
-                
-                # Copy XML and MD files to permanent location
-                shutil.copy2(xml_output_path, xml_save_path)
-                shutil.copy2(md_output_path, md_save_path)
-                
-                # Update database with XML and MD file info (if columns exist)
-                try:
-                    db_file.xml_filename = xml_filename
-                    db_file.xml_file_path = xml_save_path
-                    db_file.xml_file_size = os.path.getsize(xml_save_path)
-                    db_file.xml_uploaded_at = datetime.now()
-                    
-                    db_file.md_filename = md_filename
-                    db_file.md_file_path = md_save_path
-                    db_file.md_file_size = os.path.getsize(md_save_path)
-                    db_file.md_uploaded_at = datetime.now()
-                except AttributeError:
-                    # Database doesn't have XML/MD columns yet, skip silently
-                    print("XML/MD columns not available in database yet")
-                
-                # Clean up intermediate files
-                os.remove(xml_output_path)
-                os.remove(md_output_path)
-                
-                result.update({
-                    "conversion_completed": True,
-                    "message": "DOCX file uploaded and converted to JSON successfully",
-                    "json_data": json_data,
-                    "has_json": True
-                })
-                
-                print(f"3-step conversion completed successfully for: {clean_filename}")
-                
+                preview = build_metadata_preview(unique_path)
             except Exception as e:
-                print(f"Error in 3-step conversion: {str(e)}")
-                result.update({
-                    "conversion_completed": False,
-                    "conversion_error": str(e),
-                    "message": "File uploaded but conversion failed"
-                })
+                print(f"Error building metadata preview: {str(e)}")
+                preview = None
+            
+            background_tasks.add_task(run_validation_extraction, db_file.id)
+            result.update({
+                "message": "DOCX file uploaded, conversion to JSON is running",
+                "conversion_completed": False,
+                "conversion_pending": True,
+                "preview": preview,
+                "has_json": False
+            })
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in data validation upload: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@app.get("/data-validation-upload/{file_id}")
+async def data_validation_upload_status(file_id: int, db: Session = Depends(get_db)):
+    """
+    Get the state of the background conversion started by /data-validation-upload
+
+    Args:
+        file_id: ID returned by the upload
+
+    Returns:
+        dict: Status of the record and, once converted, its JSON data
+
+    Raises:
+        HTTPException: If the file is not found
+    """
+    db_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    return {
+        "file_id": db_file.id,
+        "filename": db_file.filename,
+        "status": db_file.status,
+        "conversion_completed": db_file.extracted_json is not None,
+        "conversion_pending": db_file.status == "processing",
+        "json_data": db_file.extracted_json,
+        "has_json": db_file.extracted_json is not None
+    }
+
 # =============================================================================
 # END OF 3-STEP WORKFLOW ENDPOINTS
 # =============================================================================
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Bring an existing database up to date with models.py
+
+``Base.metadata.create_all`` only creates missing tables, so columns and
+indexes added to existing models have to be added here. After the schema is
+in sync, the data backfills run. Every step is idempotent - running the
+script again only does whatever is still left to do.
+
+Usage:
+    python migrate_database.py
+"""
+
+import json
+import os
+
+from sqlalchemy import bindparam, false, func, inspect, or_, select, text, update
+
+import compressed_json
+from compressed_json import CompressedJSON, decompress_json, is_compressed
+from database import engine, Base, SessionLocal
+from models import *
+
+BACKFILL_BATCH_SIZE = 200
+# Payloads sampled when training the zstd dictionary
+DICTIONARY_SAMPLE_SIZE = 1000
+DICTIONARY_MIN_SAMPLES = 20
+
+def sync_schema():
+    """Create missing tables, then add missing columns and indexes"""
+    print("Creating missing tables...")
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"  + {table.name}.{column.name} ({column_type})")
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    print("✅ Schema is up to date")
+
+def dedupe_file_assignments():
+    """
+    Merge duplicate (user_id, file_id) assignments so the unique index can be created.
+
+    The oldest row of each pair is kept, marked validated if any duplicate was.
+    """
+    if not inspect(engine).has_table(UserFileAssignment.__tablename__):
+        return
+    assignments = UserFileAssignment.__table__
+    db = SessionLocal()
+    removed = 0
+    try:
+        duplicates = db.execute(
+            select(
+                assignments.c.user_id, assignments.c.file_id,
+                func.min(assignments.c.id), func.max(assignments.c.validated),
+            ).group_by(assignments.c.user_id, assignments.c.file_id).having(func.count() > 1)
+        ).all()
+        for user_id, file_id, keep_id, validated in duplicates:
+            db.execute(update(assignments).where(assignments.c.id == keep_id).values(validated=validated))
+            removed += db.execute(assignments.delete().where(
+                assignments.c.user_id == user_id,
+                assignments.c.file_id == file_id,
+                assignments.c.id != keep_id,
+            )).rowcount
+        db.commit()
+    except Exception as e:
+        print(f"❌ Error merging duplicate file assignments: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if removed:
+        print(f"✅ Removed {removed} duplicate file assignment{'' if removed == 1 else 's'}")
+
+def backfill_file_hashes():
+    """
+    Compute uploaded_files.sha256 for rows uploaded before it existed.
+
+    Rows whose conversion failed are left without a hash (and lose one they
+    were given before), so uploading the file again converts it again.
+    """
+    from ingestion import compute_sha256
+
+    db = SessionLocal()
+    hashed = 0
+    duplicates = []
+    missing = 0
+    try:
+        released = db.query(UploadedFile).filter(
+            UploadedFile.status == "error", UploadedFile.sha256.isnot(None)
+        ).update({UploadedFile.sha256: None}, synchronize_session=False)
+        known = {sha for (sha,) in db.query(UploadedFile.sha256).filter(UploadedFile.sha256.isnot(None))}
+        rows = db.query(UploadedFile.id, UploadedFile.file_path).filter(
+            UploadedFile.sha256.is_(None),
+            or_(UploadedFile.status.is_(None), UploadedFile.status != "error"),
+        ).order_by(UploadedFile.id.asc()).all()
+
+        for file_id, file_path in rows:
+            if not file_path or not os.path.exists(file_path):
+                missing += 1
+                continue
+            sha256 = compute_sha256(file_path)
+            if sha256 in known:
+                # The oldest row keeps the hash; later copies stay unhashed
+                duplicates.append(file_id)
+                continue
+            known.add(sha256)
+            db.query(UploadedFile).filter(UploadedFile.id == file_id).update(
+                {UploadedFile.sha256: sha256}, synchronize_session=False
+            )
+            hashed += 1
+            if hashed % BACKFILL_BATCH_SIZE == 0:
+                db.commit()
+        db.commit()
+    except Exception as e:
+        print(f"❌ Error backfilling file hashes: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"✅ Hashed {hashed} file(s); {missing} missing on disk")
+    if released:
+        print(f"  Released the hash of {released} failed conversion(s)")
+    if duplicates:
+        print(f"⚠️  {len(duplicates)} row(s) duplicate an earlier upload: {duplicates}")
+
+def move_json_to_blobs():
+    """
+    Move uploaded_files.extracted_json / updated_json into document_blobs.
+
+    The payloads are copied batch by batch into document_blobs and the old
+    inline columns are cleared as each row is moved, then dropped. On
+    PostgreSQL run VACUUM FULL uploaded_files afterwards to give the space
+    back to the OS.
+    """
+    legacy_columns = [
+        ("extracted_json", "extracted_json_id"),
+        ("updated_json", "updated_json_id"),
+    ]
+    existing = {col["name"] for col in inspect(engine).get_columns("uploaded_files")}
+    legacy_columns = [(old, new) for old, new in legacy_columns if old in existing]
+    if not legacy_columns:
+        print("✅ JSON payloads already stored in document_blobs")
+        return
+
+    blobs = DocumentBlob.__table__
+    for old_column, id_column in legacy_columns:
+        moved = 0
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(text(
+                    f"SELECT id, {old_column} FROM uploaded_files "
+                    f"WHERE {old_column} IS NOT NULL AND {id_column} IS NULL AND id > :last_id "
+                    f"ORDER BY id LIMIT {BACKFILL_BATCH_SIZE}"
+                ), {"last_id": last_id}).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                for file_id, payload in rows:
+                    # SQLite hands JSON back as text, PostgreSQL as decoded objects
+                    data = json.loads(payload) if isinstance(payload, str) else payload
+                    # A JSON null is stored as the text 'null' - nothing to move
+                    blob_id = None
+                    if data is not None:
+                        blob_id = conn.execute(blobs.insert().values(data=data).returning(blobs.c.id)).scalar_one()
+                    conn.execute(
+                        text(f"UPDATE uploaded_files SET {id_column} = :blob_id, {old_column} = NULL WHERE id = :id"),
+                        {"blob_id": blob_id, "id": file_id},
+                    )
+                    if blob_id is not None:
+                        moved += 1
+        print(f"✅ Moved {moved} uploaded_files.{old_column} payload(s) to document_blobs")
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE uploaded_files DROP COLUMN {old_column}"))
+            print(f"  - dropped uploaded_files.{old_column}")
+        except Exception as e:
+            # Old SQLite versions cannot drop columns; the column is empty and unused
+            print(f"⚠️  Could not drop uploaded_files.{old_column} ({e}); it has been cleared instead")
+
+def backfill_audit_log_metadata():
+    """Fill audit_logs.state / departments / period_from / period_to for older entries"""
+    from report_metadata import audit_log_metadata
+
+    db = SessionLocal()
+    filled = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(AuditLog.id, AuditLog.new_json, AuditLog.old_json).filter(
+                AuditLog.id > last_id,
+                AuditLog.state.is_(None),
+                AuditLog.departments.is_(None),
+                AuditLog.period_from.is_(None),
+                AuditLog.period_to.is_(None),
+            ).order_by(AuditLog.id.asc()).limit(BACKFILL_BATCH_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            values = []
+            for row in rows:
+                meta = audit_log_metadata(row.new_json, row.old_json)
+                if any(value is not None for value in meta.values()):
+                    values.append({"id": row.id, **meta})
+            if values:
+                db.execute(update(AuditLog), values)
+                filled += len(values)
+            db.commit()
+    except Exception as e:
+        print(f"❌ Error backfilling audit log metadata: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"✅ Filled report metadata on {filled} audit log entr{'y' if filled == 1 else 'ies'}")
+
+def backfill_file_summaries():
+    """Compute uploaded_files.last_audit_at / has_updated_json / uploaded_by_name for every file"""
+    files = UploadedFile.__table__
+    audit_logs = AuditLog.__table__
+    users = User.__table__
+
+    db = SessionLocal()
+    try:
+        latest_has_json = select(audit_logs.c.new_json.isnot(None)).where(
+            audit_logs.c.file_id == files.c.id
+        ).order_by(audit_logs.c.timestamp.desc(), audit_logs.c.id.desc()).limit(1).scalar_subquery()
+        result = db.execute(update(files).values(
+            last_audit_at=select(func.max(audit_logs.c.timestamp)).where(
+                audit_logs.c.file_id == files.c.id
+            ).scalar_subquery(),
+            has_updated_json=or_(files.c.updated_json_id.isnot(None), func.coalesce(latest_has_json, false())),
+        ))
+        summarised = result.rowcount
+
+        uploaders = db.execute(
+            select(users.c.id, users.c.firstname, users.c.lastname, users.c.email).where(
+                users.c.id.in_(select(files.c.uploaded_by).where(files.c.uploaded_by.isnot(None)))
+            )
+        ).all()
+        if uploaders:
+            db.execute(
+                update(files).where(files.c.uploaded_by == bindparam("uploader_id")).values(
+                    uploaded_by_name=bindparam("uploader_name")
+                ),
+                [
+                    {"uploader_id": row.id, "uploader_name": user_display_name(row.firstname, row.lastname, row.email)}
+                    for row in uploaders
+                ],
+            )
+        db.commit()
+    except Exception as e:
+        print(f"❌ Error backfilling file summaries: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"✅ Summarised audit history and uploader on {summarised} file{'' if summarised == 1 else 's'}")
+
+def backfill_feedback_counts():
+    """Recompute feedback_status_counts from the feedback table"""
+    from feedback_counts import rebuild_feedback_counts
+
+    db = SessionLocal()
+    try:
+        rebuild_feedback_counts(db)
+        db.commit()
+        print("✅ Built feedback counts")
+    except Exception as e:
+        print(f"❌ Error building feedback counts: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def backfill_token_versions():
+    """Set users.token_version to 0 where the new column left it NULL"""
+    db = SessionLocal()
+    try:
+        result = db.execute(update(User).where(User.token_version.is_(None)).values(token_version=0))
+        db.commit()
+        print(f"✅ Set token version on {result.rowcount} user{'' if result.rowcount == 1 else 's'}")
+    except Exception as e:
+        print(f"❌ Error setting token versions: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _compressed_columns():
+    """(table, column) pairs mapped as CompressedJSON"""
+    return [
+        (table, column)
+        for table in Base.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, CompressedJSON)
+    ]
+
+def train_json_dictionary():
+    """Train the zstd dictionary on stored reports if zstd is available and none exists yet"""
+    if compressed_json.zstandard is None:
+        print("zstandard not installed - JSON payloads will use zlib")
+        return
+    if os.path.exists(compressed_json.JSON_ZSTD_DICT_PATH):
+        print(f"✅ Using zstd dictionary {compressed_json.JSON_ZSTD_DICT_PATH}")
+        return
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT data FROM document_blobs ORDER BY id DESC LIMIT {DICTIONARY_SAMPLE_SIZE}")
+        ).all()
+    samples = [decompress_json(data) for (data,) in rows if data is not None]
+    if len(samples) < DICTIONARY_MIN_SAMPLES:
+        print(f"Only {len(samples)} report(s) stored - not training a zstd dictionary yet")
+        return
+    try:
+        path = compressed_json.train_dictionary(samples)
+    except Exception as e:
+        print(f"⚠️  Could not train zstd dictionary: {e}")
+        return
+    compressed_json.load_dictionary(path)
+    print(f"✅ Trained zstd dictionary on {len(samples)} report(s): {path}")
+
+def compress_json_columns():
+    """Convert CompressedJSON columns to binary and compress rows still holding plain JSON"""
+    inspector = inspect(engine)
+    for table, column in _compressed_columns():
+        if engine.dialect.name == "postgresql":
+            current = {col["name"]: col["type"] for col in inspector.get_columns(table.name)}
+            if column.name in current and current[column.name].__class__.__name__.upper() not in ("BYTEA", "LARGEBINARY"):
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE bytea "
+                        f"USING convert_to({column.name}::text, 'UTF8')"
+                    ))
+                print(f"  ~ {table.name}.{column.name} -> bytea")
+
+        converted = 0
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(text(
+                    f"SELECT id, {column.name} FROM {table.name} "
+                    f"WHERE {column.name} IS NOT NULL AND id > :last_id "
+                    f"ORDER BY id LIMIT {BACKFILL_BATCH_SIZE}"
+                ), {"last_id": last_id}).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                for row_id, stored in rows:
+                    if is_compressed(stored):
+                        continue
+                    # The typed update compresses; JSON nulls become SQL NULL
+                    conn.execute(
+                        table.update().where(table.c.id == row_id).values({column.name: decompress_json(stored)})
+                    )
+                    converted += 1
+        if converted:
+            print(f"✅ Compressed {converted} {table.name}.{column.name} value(s)")
+    print("✅ JSON payloads are compressed")
+
+def main():
+    print("Migrating database...")
+    # Before sync_schema creates the unique (user_id, file_id) index
+    dedupe_file_assignments()
+    sync_schema()
+    backfill_file_hashes()
+    move_json_to_blobs()
+    train_json_dictionary()
+    compress_json_columns()
+    backfill_audit_log_metadata()
+    backfill_file_summaries()
+    backfill_feedback_counts()
+    backfill_token_versions()
+    print("Database migration completed!")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, func, ForeignKey, JSON, Boolean, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, DateTime, event, func, ForeignKey, JSON, Boolean, Text, Index, UniqueConstraint
+from sqlalchemy import false, inspect, or_, select, true, update
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import deferred, relationship
+from compressed_json import CompressedJSON
+from report_metadata import audit_log_metadata
 from database import Base
 
 class User(Base):
@@ -18,6 +22,8 @@ class User(Base):
     gender = Column(String(10))
     password = Column(String(255), nullable=False)
     role_status = Column(String(50), default="unassigned")
+    # Bumped to revoke every token issued before; tokens carry it as a claim
+    token_version = Column(Integer, default=0)
     account_created_at = Column(DateTime, server_default=func.now(timezone='utc'))
     
     # Relationships
@@ -107,6 +113,7 @@ class UserConfig(Base):
 
 class UploadedFile(Base):
     __tablename__ = "uploaded_files"
+    __table_args__ = (Index("ix_uploaded_files_uploaded_at_id", "uploaded_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(255), nullable=False)
@@ -118,23 +125,101 @@ class UploadedFile(Base):
     uploaded_by = Column(Integer, ForeignKey("users.id"))
     status = Column(String(50), default="active")
     
-    # Simplified JSON storage - JSON data stored directly in database
-    extracted_json = Column(JSON, nullable=True)
+    # SHA-256 of the file content - identical uploads are linked to one record
+    sha256 = Column(String(64), unique=True, index=True, nullable=True)
+    
+    # JSON payloads live in document_blobs so listing files never reads them
+    extracted_json_id = Column(Integer, ForeignKey("document_blobs.id"), nullable=True)
     json_updated_at = Column(DateTime, nullable=True)
     
     # Updated JSON for validation workflow
-    updated_json = Column(JSON, nullable=True)
+    updated_json_id = Column(Integer, ForeignKey("document_blobs.id"), nullable=True)
+    
+    # Listing summary, kept current by the listeners after AuditLog so the
+    # report list reads it from this row instead of looking up related rows
+    last_audit_at = Column(DateTime, nullable=True)
+    has_updated_json = Column(Boolean, default=False)
+    uploaded_by_name = Column(String(255), nullable=True)
     
     # Relationship with User (optional)
     user = relationship("User")
+    
+    extracted_blob = relationship(
+        "DocumentBlob", foreign_keys=[extracted_json_id], cascade="all, delete-orphan", single_parent=True
+    )
+    updated_blob = relationship(
+        "DocumentBlob", foreign_keys=[updated_json_id], cascade="all, delete-orphan", single_parent=True
+    )
+    
+    @hybrid_property
+    def extracted_json(self):
+        return self.extracted_blob.data if self.extracted_blob is not None else None
+    
+    @extracted_json.setter
+    def extracted_json(self, value):
+        self.extracted_blob = _store_blob(self.extracted_blob, value)
+    
+    @extracted_json.expression
+    def extracted_json(cls):
+        # Lets queries keep filtering on extracted_json.is_(None) / isnot(None)
+        return cls.extracted_json_id
+    
+    @hybrid_property
+    def updated_json(self):
+        return self.updated_blob.data if self.updated_blob is not None else None
+    
+    @updated_json.setter
+    def updated_json(self, value):
+        self.updated_blob = _store_blob(self.updated_blob, value)
+    
+    @updated_json.expression
+    def updated_json(cls):
+        return cls.updated_json_id
+
+class DocumentBlob(Base):
+    __tablename__ = "document_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Deferred: loading a blob row (e.g. to replace it) does not read the payload
+    data = deferred(Column(CompressedJSON, nullable=False))
+    created_at = Column(DateTime, server_default=func.now(timezone='utc'))
+
+def _store_blob(blob, value):
+    """Put value into blob, reusing the existing row; None removes the blob"""
+    if value is None:
+        return None
+    if blob is None:
+        return DocumentBlob(data=value)
+    blob.data = value
+    return blob
+
+class DocumentVersion(Base):
+    __tablename__ = "document_versions"
+    __table_args__ = (UniqueConstraint("file_id", "version", name="uq_document_versions_file_version"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    action = Column(String(50), nullable=False)  # 'extract', 'save', 'submit'
+    # Each row holds either a full snapshot or a JSON Patch against the previous version
+    snapshot = deferred(Column(CompressedJSON, nullable=True))
+    patch = deferred(Column(CompressedJSON, nullable=True))
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(timezone='utc'))
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # Keyset pagination order of the audit log list
+        Index("ix_audit_logs_timestamp_id", "timestamp", "id"),
+        # Latest entry per file
+        Index("ix_audit_logs_file_id_timestamp", "file_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
-    old_json = Column(JSON, nullable=True)
-    new_json = Column(JSON, nullable=True)
+    old_json = Column(CompressedJSON, nullable=True)
+    new_json = Column(CompressedJSON, nullable=True)
     # Store list of modified paths as JSON array of strings for easy retrieval
     modified = Column(JSON, nullable=True)
     username = Column(String(255), nullable=True)
@@ -144,11 +229,95 @@ class AuditLog(Base):
     timestamp = Column(DateTime, server_default=func.now(timezone='utc'))
     file_id = Column(Integer, ForeignKey("uploaded_files.id"), nullable=True)
 
+    # Report metadata copied out of the JSON when the entry is written, for filtering
+    state = Column(String(255), nullable=True, index=True)
+    departments = Column(String(500), nullable=True, index=True)
+    period_from = Column(Date, nullable=True, index=True)
+    period_to = Column(Date, nullable=True, index=True)
+
     # Optional relationships
     user = relationship("User", foreign_keys=[user_id])
 
+@event.listens_for(AuditLog, "before_insert")
+def _fill_audit_log_metadata(mapper, connection, target):
+    """Copy state, departments and report period out of the entry's JSON"""
+    meta = audit_log_metadata(target.new_json, target.old_json)
+    for column, value in meta.items():
+        if getattr(target, column) is None:
+            setattr(target, column, value)
+
+def user_display_name(firstname, lastname, email) -> str:
+    """Name shown for a user in listings: first and last name, either one, or the email"""
+    name = " ".join(part for part in (firstname, lastname) if part)
+    return name or email or "Unknown"
+
+def _uploader_name(connection, user_id):
+    users = User.__table__
+    row = connection.execute(
+        select(users.c.firstname, users.c.lastname, users.c.email).where(users.c.id == user_id)
+    ).first()
+    return user_display_name(*row) if row else None
+
+def _latest_audit(connection, file_id):
+    """(timestamp, has new JSON) of a file's latest audit log entry, or None"""
+    audit_logs = AuditLog.__table__
+    return connection.execute(
+        select(audit_logs.c.timestamp, audit_logs.c.new_json.isnot(None))
+        .where(audit_logs.c.file_id == file_id)
+        .order_by(audit_logs.c.timestamp.desc(), audit_logs.c.id.desc())
+        .limit(1)
+    ).first()
+
+@event.listens_for(AuditLog, "after_insert")
+def _summarize_audit_log(mapper, connection, target):
+    """Record a new audit log entry on its file's listing summary"""
+    if target.file_id is None:
+        return
+    latest = _latest_audit(connection, target.file_id)
+    files = UploadedFile.__table__
+    connection.execute(
+        update(files).where(files.c.id == target.file_id).values(
+            last_audit_at=latest[0],
+            has_updated_json=or_(files.c.updated_json_id.isnot(None), true() if latest[1] else false()),
+        )
+    )
+
+@event.listens_for(UploadedFile, "before_insert")
+def _summarize_new_file(mapper, connection, target):
+    """Fill the listing summary of a new file"""
+    target.has_updated_json = target.updated_json_id is not None
+    if target.uploaded_by is not None and target.uploaded_by_name is None:
+        target.uploaded_by_name = _uploader_name(connection, target.uploaded_by)
+
+@event.listens_for(UploadedFile, "before_update")
+def _summarize_saved_file(mapper, connection, target):
+    """Keep the listing summary in step when pending changes are saved or cleared, or the uploader changes"""
+    state = inspect(target)
+    if state.attrs.updated_json_id.history.has_changes():
+        if target.updated_json_id is not None:
+            target.has_updated_json = True
+        else:
+            latest = _latest_audit(connection, target.id)
+            target.has_updated_json = bool(latest and latest[1])
+    if state.attrs.uploaded_by.history.has_changes():
+        target.uploaded_by_name = _uploader_name(connection, target.uploaded_by) if target.uploaded_by else None
+
+@event.listens_for(User, "after_update")
+def _rename_uploader(mapper, connection, target):
+    """Carry a changed name over to the files the user uploaded"""
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("firstname", "lastname", "email")):
+        files = UploadedFile.__table__
+        connection.execute(
+            update(files).where(files.c.uploaded_by == target.id).values(
+                uploaded_by_name=user_display_name(target.firstname, target.lastname, target.email)
+            )
+        )
+
 class UserFileAssignment(Base):
     __tablename__ = "user_file_assignments"
+    # A file is assigned to a user at most once; bulk assignment inserts ignore existing pairs
+    __table_args__ = (Index("uq_user_file_assignments_user_file", "user_id", "file_id", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -159,9 +328,12 @@ class UserFileAssignment(Base):
     validated = Column(Integer, default=0)
 
     # Optional relationships (no backrefs to keep it simple)
+    file = relationship("UploadedFile", foreign_keys=[file_id])
+    assigner = relationship("User", foreign_keys=[assigned_by])
 
 class DataValidationFeedback(Base):
     __tablename__ = "data_validation_feedback"
+    __table_args__ = (Index("ix_data_validation_feedback_created_at_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -182,15 +354,24 @@ class DataValidationFeedback(Base):
     file = relationship("UploadedFile", foreign_keys=[file_id])
     reviewer = relationship("User", foreign_keys=[reviewed_by])
 
+class FeedbackStatusCount(Base):
+    """Number of a user's feedback entries in each status, kept current by the DataValidationFeedback listeners"""
+    __tablename__ = "feedback_status_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
 class DataValidationDraft(Base):
     __tablename__ = "data_validation_drafts"
+    __table_args__ = (Index("ix_data_validation_drafts_user_last_saved_id", "user_id", "last_saved", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=True)
     draft_name = Column(String(255), nullable=False)
-    extracted_data = Column(JSON, nullable=True)  # Store the extracted data state
-    working_json = Column(JSON, nullable=True)    # Store the working JSON
+    extracted_data = Column(CompressedJSON, nullable=True)  # Store the extracted data state
+    working_json = Column(CompressedJSON, nullable=True)    # Store the working JSON
     pending_changes = Column(JSON, nullable=True) # Store pending changes as JSON
     last_saved = Column(DateTime, server_default=func.now(timezone='utc'), onupdate=func.now(timezone='utc'))
     created_at = Column(DateTime, server_default=func.now(timezone='utc'))
@@ -228,3 +409,46 @@ class PasswordResetOTP(Base):
     expires_at = Column(DateTime, nullable=False)
     is_used = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=func.now(timezone='utc'))
+
+def count_feedback(connection, user_id, status, delta):
+    """Add delta to a user's feedback count for status"""
+    counts = FeedbackStatusCount.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        connection.execute(
+            upsert(counts).values(user_id=user_id, status=status, count=delta).on_conflict_do_update(
+                index_elements=[counts.c.user_id, counts.c.status], set_={"count": counts.c.count + delta}
+            )
+        )
+        return
+    result = connection.execute(
+        update(counts).where(counts.c.user_id == user_id, counts.c.status == status).values(count=counts.c.count + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(counts.insert().values(user_id=user_id, status=status, count=delta))
+
+@event.listens_for(DataValidationFeedback, "after_insert")
+def _count_new_feedback(mapper, connection, target):
+    count_feedback(connection, target.user_id, target.status or "pending", 1)
+
+@event.listens_for(DataValidationFeedback, "after_update")
+def _count_changed_feedback(mapper, connection, target):
+    """Move the entry between counts when its status (or owner) changes"""
+    state = inspect(target)
+    user_history = state.attrs.user_id.history
+    status_history = state.attrs.status.history
+    if not (user_history.deleted or status_history.deleted):
+        return
+    old_user = user_history.deleted[0] if user_history.deleted else target.user_id
+    old_status = status_history.deleted[0] if status_history.deleted else target.status
+    if (old_user, old_status) != (target.user_id, target.status):
+        count_feedback(connection, old_user, old_status or "pending", -1)
+        count_feedback(connection, target.user_id, target.status or "pending", 1)
+
+@event.listens_for(DataValidationFeedback, "after_delete")
+def _count_deleted_feedback(mapper, connection, target):
+    count_feedback(connection, target.user_id, target.status or "pending", -1)
@@ -0,0 +1,148 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+``OFFSET n`` makes the database read and discard n rows, so deep pages of a
+large table get slower the further in they are. Keyset pagination instead
+remembers the sort key of the last row sent and asks for the rows after it,
+which an index on the sort columns answers directly at any depth. The key
+is handed to the client as an opaque cursor.
+
+Every ordering ends in the primary key so rows with equal sort values still
+have a stable order.
+
+SQLite keeps dates and timestamps as text, in whatever format wrote them:
+``server_default`` timestamps have no fractional seconds, while values
+bound by SQLAlchemy always do. There the cursor carries the stored text
+and is compared as text, exactly as the database orders the column.
+"""
+
+import base64
+import json
+import os
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Date, DateTime, String, func, text, tuple_, type_coerce
+from sqlalchemy.orm import Query, Session
+
+# Above this many rows an unfiltered total is read from table statistics (PostgreSQL)
+PAGINATION_ESTIMATE_THRESHOLD = int(os.getenv("PAGINATION_ESTIMATE_THRESHOLD", "100000"))
+
+# Response header carrying the next cursor on endpoints that return a bare list
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor for a row's sort key"""
+    encoded = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded).encode("utf-8")).decode("ascii").rstrip("=")
+
+def _stored_as_text(query: Query, column) -> bool:
+    """True if column's values are kept as text and must be compared as stored"""
+    return isinstance(column.type, (Date, DateTime)) and query.session.get_bind().dialect.name == "sqlite"
+
+def decode_cursor(cursor: str, columns: Sequence, as_text: Sequence[bool] = ()) -> List[Any]:
+    """
+    Sort key encoded in a cursor, converted back to the columns' types.
+
+    Columns flagged in as_text keep the stored text from the cursor.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or was made for another ordering
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("wrong number of values")
+        decoded = []
+        for index, (column, value) in enumerate(zip(columns, values)):
+            if index < len(as_text) and as_text[index]:
+                if value is not None and not isinstance(value, str):
+                    raise ValueError("expected stored text")
+            elif value is not None and isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif value is not None and isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def keyset_page(
+    query: Query,
+    columns: Sequence,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+    offset: int = 0,
+) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page of an entity query ordered by columns.
+
+    Args:
+        query: Query for a single mapped entity
+        columns: Sort columns, ending in the primary key
+        limit: Page size
+        cursor: Cursor returned with the previous page, None for the first page
+        descending: Sort direction (applies to every column)
+        offset: Rows to skip, for clients still paging by page number
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    as_text = [_stored_as_text(query, column) for column in columns]
+    # Text-stored columns are read and compared as the text the database holds
+    keys = [type_coerce(column, String) if text_key else column for column, text_key in zip(columns, as_text)]
+    if any(as_text):
+        query = query.add_columns(*[key for key, text_key in zip(keys, as_text) if text_key])
+
+    if cursor:
+        values = decode_cursor(cursor, columns, as_text)
+        key = tuple_(*keys) if len(keys) > 1 else keys[0]
+        bound = tuple_(*values) if len(keys) > 1 else values[0]
+        query = query.filter(key < bound if descending else key > bound)
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    if offset:
+        query = query.offset(offset)
+    rows = query.limit(limit + 1).all()
+
+    stored = None
+    if any(as_text):
+        stored = [list(row[1:]) for row in rows]
+        rows = [row[0] for row in rows]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        text_values = iter(stored[limit - 1]) if stored else iter(())
+        next_cursor = encode_cursor([
+            next(text_values) if text_key else getattr(last, column.key)
+            for column, text_key in zip(columns, as_text)
+        ])
+    return rows, next_cursor
+
+def count_total(db: Session, query: Query, key_column, filtered: bool) -> Tuple[int, bool]:
+    """
+    Total rows for a list, estimated from table statistics for large unfiltered tables.
+
+    Args:
+        db: Database session
+        query: The list query with its filters
+        key_column: Primary key column of the listed table
+        filtered: Whether any filter is applied (estimates only cover whole tables)
+
+    Returns:
+        tuple: (total, estimated)
+    """
+    if not filtered and db.bind.dialect.name == "postgresql":
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table_name AS regclass)"),
+            {"table_name": key_column.table.name},
+        ).scalar()
+        if estimate is not None and estimate >= PAGINATION_ESTIMATE_THRESHOLD:
+            return int(estimate), True
+    # A plain COUNT, not a count over a subquery of every column
+    return query.order_by(None).with_entities(func.count(key_column)).scalar(), False
@@ -7,11 +7,9 @@ from email.mime.multipart import MIMEMultipart
 from sqlalchemy.orm import Session
 from models import PasswordResetOTP, User
 from email_settings import email_settings
+from principals import invalidate_principal, revoke_tokens
 import jwt
-from passlib.context import CryptContext
-
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from security import hash_password, verify_password
 
 def cleanup_expired_otps_simple(db: Session) -> int:
     """
@@ -161,11 +159,13 @@ def reset_password_with_token(db: Session, email: str, token: str, new_password:
             raise ValueError("User not found")
         
         # Hash new password
-        hashed_password = pwd_context.hash(new_password)
+        hashed_password = hash_password(new_password)
         
-        # Update password
-        db.query(User).filter(User.email == email).update({"password": hashed_password})
+        # Update password and sign out every existing session
+        user.password = hashed_password
+        revoke_tokens(user)
         db.commit()
+        invalidate_principal(user.id)
         
         return True
         
@@ -175,11 +175,3 @@ def reset_password_with_token(db: Session, email: str, token: str, new_password:
         raise ValueError("Invalid reset token")
     except Exception as e:
         raise ValueError(f"Failed to reset password: {str(e)}")
-
-def hash_password(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Role and menu permissions compiled into bitsets.
+
+``role_menus`` rows grant a role view/create/update/delete on a menu. They
+are compiled into one integer per role: menu ``m`` owns the four bits from
+``m.id * BITS_PER_MENU``, so a role's grants are a single bitset and a user's
+are the OR of their roles'. Role membership is a bitset too (bit ``role.id``),
+so "is this user an admin" and "may this user update menu X" are bit tests.
+
+The compiled table is loaded with three small queries, kept for
+PERMISSION_CACHE_SECONDS and rebuilt at once by /admin/roles/update.
+Principals (see principals.py) carry their Grants, so checks during a
+request are bit tests that run no query.
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+from ttl_cache import TTLCache
+
+VIEW, CREATE, UPDATE, DELETE = 1, 2, 4, 8
+ACTIONS = {"view": VIEW, "create": CREATE, "update": UPDATE, "delete": DELETE}
+BITS_PER_MENU = 4
+
+# Roles that may see and manage everyone's records
+ADMIN_ROLES = ("superadmin", "admin")
+
+# How long a compiled table is used before it is reloaded (other workers'
+# role updates are picked up then)
+PERMISSION_CACHE_SECONDS = float(os.getenv("PERMISSION_CACHE_SECONDS", "300"))
+# Also put the user's compiled bitsets in access tokens for clients to read
+PERMISSIONS_IN_TOKEN = os.getenv("PERMISSIONS_IN_TOKEN", "false").lower() == "true"
+
+class Grants:
+    """What one user may do: their role bitset and menu bitset, read against a table"""
+
+    __slots__ = ("role_bits", "menu_bits", "table")
+
+    def __init__(self, role_bits: int, menu_bits: int, table: "PermissionTable"):
+        self.role_bits = role_bits
+        self.menu_bits = menu_bits
+        self.table = table
+
+    def is_admin(self) -> bool:
+        """True if the user has one of ADMIN_ROLES"""
+        return bool(self.role_bits & self.table.admin_bits)
+
+    def can(self, menu: str, action: int) -> bool:
+        """True if the user may take action (VIEW, CREATE, UPDATE or DELETE) on the named menu"""
+        return bool(self.menu_bits & self.table.menu_mask(menu, action))
+
+    def menus(self) -> Dict[str, List[str]]:
+        """menu name -> granted action names"""
+        return self.table.describe(self.menu_bits)
+
+class PermissionTable:
+    """
+    Compiled permissions of every role.
+
+    Args:
+        roles: role id -> role name
+        menus: menu name -> menu id, for menus that are active along with
+            all their ancestors
+        grants: role id -> menu permission bitset
+    """
+
+    def __init__(self, roles: Dict[int, str], menus: Dict[str, int], grants: Dict[int, int]):
+        self.menus = menus
+        self.grants = grants
+        self.admin_bits = role_bits(role_id for role_id, name in roles.items() if name in ADMIN_ROLES)
+
+    def for_roles(self, role_ids: Iterable[int]) -> Grants:
+        """Grants of a user with the given roles"""
+        role_ids = [role_id for role_id in role_ids if role_id is not None]
+        menu_bits = 0
+        for role_id in role_ids:
+            menu_bits |= self.grants.get(role_id, 0)
+        return Grants(role_bits(role_ids), menu_bits, self)
+
+    def menu_mask(self, menu: str, action: int) -> int:
+        """Bits for action on the named menu; 0 for unknown or inactive menus"""
+        menu_id = self.menus.get(menu)
+        return 0 if menu_id is None else action << (menu_id * BITS_PER_MENU)
+
+    def describe(self, bits: int) -> Dict[str, List[str]]:
+        """menu name -> granted action names, for the menus in bits"""
+        described = {}
+        for name, menu_id in self.menus.items():
+            granted = (bits >> (menu_id * BITS_PER_MENU)) & (2 ** BITS_PER_MENU - 1)
+            if granted:
+                described[name] = [action for action, bit in ACTIONS.items() if granted & bit]
+        return described
+
+def role_bits(role_ids: Iterable[int]) -> int:
+    """Role membership bitset: bit role_id for each role"""
+    bits = 0
+    for role_id in role_ids:
+        bits |= 1 << role_id
+    return bits
+
+def compile_permissions(db: Session) -> PermissionTable:
+    """Build the permission table from roles, menus and role_menus"""
+    roles = dict(db.query(models.Role.id, models.Role.name).all())
+
+    menu_rows = db.query(models.Menu.id, models.Menu.name, models.Menu.parent_id, models.Menu.is_active).all()
+    parents = {menu_id: parent_id for menu_id, _, parent_id, _ in menu_rows}
+    active = {menu_id: is_active is not False for menu_id, _, _, is_active in menu_rows}
+
+    def reachable(menu_id: Optional[int]) -> bool:
+        # A menu under an inactive parent is hidden with it; the walk stops on cycles
+        seen = set()
+        while menu_id is not None and menu_id not in seen:
+            if not active.get(menu_id, False):
+                return False
+            seen.add(menu_id)
+            menu_id = parents.get(menu_id)
+        return True
+
+    menus = {name: menu_id for menu_id, name, _, _ in menu_rows if reachable(menu_id)}
+    menu_ids = set(menus.values())
+
+    grants: Dict[int, int] = {}
+    rows = db.query(
+        models.RoleMenu.role_id, models.RoleMenu.menu_id, models.RoleMenu.can_view,
+        models.RoleMenu.can_create, models.RoleMenu.can_update, models.RoleMenu.can_delete,
+    )
+    for role_id, menu_id, can_view, can_create, can_update, can_delete in rows:
+        if role_id is None or menu_id not in menu_ids:
+            continue
+        actions = (VIEW if can_view else 0) | (CREATE if can_create else 0) \
+            | (UPDATE if can_update else 0) | (DELETE if can_delete else 0)
+        grants[role_id] = grants.get(role_id, 0) | (actions << (menu_id * BITS_PER_MENU))
+    return PermissionTable(roles, menus, grants)
+
+_tables = TTLCache(PERMISSION_CACHE_SECONDS)
+
+def permission_table(db: Session) -> PermissionTable:
+    """The compiled table, compiling it if it is not cached"""
+    table = _tables.get("table")
+    if table is None:
+        table = compile_permissions(db)
+        _tables.put("table", table)
+    return table
+
+def rebuild_permissions(db: Session) -> PermissionTable:
+    """Recompile the table after roles or role_menus change (call after committing)"""
+    _tables.clear()
+    return permission_table(db)
+
+def grants_of(user: models.User) -> Grants:
+    """The grants get_principal attached to user"""
+    return user.grants
+
+def is_admin(user: models.User) -> bool:
+    """True if the user has one of ADMIN_ROLES"""
+    return grants_of(user).is_admin()
@@ -0,0 +1,95 @@
+"""
+Cached principals for authenticated requests.
+
+Every request used to load its user from the database, and /users/me then
+queried the user's roles, each role and the user's config on top. A token's
+first request now loads the user, roles and config in one query and keeps a
+snapshot of them under (user id, token version) for PRINCIPAL_CACHE_SECONDS;
+later requests build the principal from that snapshot without touching the
+database.
+
+Tokens carry the user's ``token_version``. Changes that should end a user's
+sessions (a status change, a password reset) bump it, and get_current_user
+refuses tokens whose version no longer matches. Anything that changes a
+user's status, roles or config must call invalidate_principal after
+committing. The cache belongs to one process: other workers see a change
+when their entry expires.
+"""
+
+import copy
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, joinedload
+
+import models
+from ttl_cache import TTLCache
+from permissions import permission_table
+
+# How long a loaded principal is reused
+PRINCIPAL_CACHE_SECONDS = float(os.getenv("PRINCIPAL_CACHE_SECONDS", "60"))
+
+# User columns copied into the principal; the password hash is left out
+_USER_COLUMNS = [attr.key for attr in inspect(models.User).column_attrs if attr.key != "password"]
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_SECONDS)
+
+def _snapshot(user: models.User) -> Dict[str, Any]:
+    return {
+        "columns": {key: getattr(user, key) for key in _USER_COLUMNS},
+        "roles": [
+            (user_role.id, user_role.role.id, user_role.role.name)
+            for user_role in user.user_roles if user_role.role is not None
+        ],
+        "config": copy.deepcopy(user.config.config) if user.config is not None else None,
+        "has_config": user.config is not None,
+    }
+
+def _build(snapshot: Dict[str, Any]) -> models.User:
+    """A new transient User from a snapshot, so requests never share or lazy-load one"""
+    user = models.User(**snapshot["columns"])
+    user.user_roles = [
+        models.UserRole(id=user_role_id, user_id=user.id, role_id=role_id, role=models.Role(id=role_id, name=name))
+        for user_role_id, role_id, name in snapshot["roles"]
+    ]
+    if snapshot["has_config"]:
+        user.config = models.UserConfig(user_id=user.id, config=copy.deepcopy(snapshot["config"]))
+    return user
+
+def get_principal(db: Session, user_id: int, token_version: int) -> Optional[models.User]:
+    """
+    The user a token belongs to, with roles and config loaded.
+
+    Args:
+        db: Database session, used only when the principal is not cached
+        user_id: user_id claim of the token
+        token_version: token_version claim of the token
+
+    Returns:
+        User: A transient copy of the user with its compiled permissions
+            as ``grants``, or None if the user no longer exists or the token
+            has been revoked
+    """
+    key = (user_id, token_version)
+    snapshot = principal_cache.get(key)
+    if snapshot is None:
+        user = db.query(models.User).options(
+            joinedload(models.User.user_roles).joinedload(models.UserRole.role),
+            joinedload(models.User.config),
+        ).filter(models.User.id == user_id).first()
+        if user is None or (user.token_version or 0) != token_version:
+            return None
+        snapshot = _snapshot(user)
+        principal_cache.put(key, snapshot)
+    user = _build(snapshot)
+    user.grants = permission_table(db).for_roles(role_id for _, role_id, _ in snapshot["roles"])
+    return user
+
+def revoke_tokens(user: models.User) -> None:
+    """Bump user's token version so every token issued so far is refused once committed"""
+    user.token_version = (user.token_version or 0) + 1
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop the cached principal of a user whose status, roles or config changed"""
+    principal_cache.discard(lambda key: key[0] == user_id)
@@ -0,0 +1,102 @@
+"""
+Sparse fieldsets (``fields=``) for endpoints that return uploaded files.
+
+``fields=id,filename,metadata.state`` asks for two attributes of the file
+and one value from inside its report JSON. A name that is not one of the
+endpoint's own keys is read as a dotted path into the endpoint's document
+(``extracted_json`` for file listings, ``content`` for validation), so
+``metadata.state`` and ``extracted_json.metadata.state`` select the same
+value; the response nests it under the path exactly as it was requested.
+
+Endpoints load only the columns behind the keys a selection wants, and
+read a JSON blob only when a requested field lives inside it. Blobs are
+stored compressed, so a path into the JSON still reads that blob, but only
+the selected values are sent.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+_MISSING = object()
+
+class FieldSelection:
+    """
+    The fields requested from an endpoint.
+
+    Args:
+        fields: Comma-separated field list from the query string; empty or
+            None selects everything
+        keys: Top-level keys the endpoint returns
+        document_key: Key holding the endpoint's JSON document, used for
+            paths that do not start with one of keys
+    """
+
+    def __init__(self, fields: Optional[str], keys: Sequence[str], document_key: str):
+        self.everything = not fields or not fields.strip()
+        # (path read from the payload, path written to the response)
+        self.paths: List[tuple] = []
+        if self.everything:
+            return
+        for field in fields.split(","):
+            tokens = [token for token in field.strip().split(".") if token]
+            if not tokens:
+                continue
+            if tokens[0] in keys:
+                self.paths.append((tokens, tokens))
+            else:
+                self.paths.append(([document_key] + tokens, tokens))
+
+    def wants(self, key: str) -> bool:
+        """True if the response needs the top-level key"""
+        return self.everything or any(source[0] == key for source, _ in self.paths)
+
+    def columns(self, key_columns: Dict[str, Sequence]) -> list:
+        """
+        Columns to load for the selected keys.
+
+        Args:
+            key_columns: Columns each top-level key is built from
+
+        Returns:
+            list: The columns of every wanted key, without duplicates
+        """
+        selected = []
+        for key, key_cols in key_columns.items():
+            if self.wants(key):
+                selected.extend(column for column in key_cols if column not in selected)
+        return selected
+
+    def render(self, obj, getters: Dict[str, Callable[[Any], Any]]) -> Dict[str, Any]:
+        """Build the projected response for obj, calling only the getters of wanted keys"""
+        return self.project({key: getter(obj) for key, getter in getters.items() if self.wants(key)})
+
+    def project(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Keep only the selected fields of payload.
+
+        Paths that do not exist in the payload are left out of the response.
+        """
+        if self.everything:
+            return payload
+        result: Dict[str, Any] = {}
+        for source, target in self.paths:
+            value = _lookup(payload, source)
+            if value is _MISSING:
+                continue
+            node = result
+            for token in target[:-1]:
+                child = node.get(token)
+                if not isinstance(child, dict):
+                    child = node[token] = {}
+                node = child
+            node[target[-1]] = value
+        return result
+
+def _lookup(value, tokens: Sequence[str]):
+    for token in tokens:
+        if isinstance(value, dict) and token in value:
+            value = value[token]
+        elif isinstance(value, list) and token.isdigit() and int(token) < len(value):
+            value = value[int(token)]
+        else:
+            return _MISSING
+    return value
@@ -0,0 +1,103 @@
+"""
+Report metadata used to filter audit logs.
+
+The state, departments and reporting period of the report an audit log entry
+refers to are read from its JSON once, when the entry is written, and
+stored in indexed columns (see the AuditLog before_insert listener in
+models.py) so the audit log list can filter in SQL.
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+def parse_report_date(date_str: Optional[str]) -> Optional[date]:
+    """
+    Parse the date formats found in reports: ISO, YYYY-MM-DD, DD/MM/YYYY or a bare year.
+
+    Returns:
+        date or None if the value cannot be parsed
+    """
+    if not date_str or not isinstance(date_str, str):
+        return None
+    date_str = date_str.strip()
+    try:
+        # Try ISO first
+        return datetime.fromisoformat(date_str).date()
+    except Exception:
+        pass
+    try:
+        # Try YYYY-MM-DD
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except Exception:
+        pass
+    try:
+        # Try DD/MM/YYYY
+        return datetime.strptime(date_str, "%d/%m/%Y").date()
+    except Exception:
+        pass
+    # Try YYYY only -> set to Jan 1st
+    if len(date_str) == 4 and date_str.isdigit():
+        return date(int(date_str), 1, 1)
+    return None
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(item) for item in value if item)
+    value = str(value).strip()
+    return value or None
+
+def extract_report_meta(obj: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """
+    Read state, departments and the reporting period from report JSON.
+
+    Returns:
+        dict: state, departments, period_from and period_to as found in the
+            report (None where missing)
+    """
+    empty = {"state": None, "departments": None, "period_from": None, "period_to": None}
+    if not obj or not isinstance(obj, dict):
+        return empty
+    try:
+        report = obj
+        # New schema: Parts -> PART I -> Inspection_Report
+        parts = report.get("Parts")
+        if parts and isinstance(parts, dict):
+            part_i = parts.get("PART I")
+            if part_i and isinstance(part_i, dict):
+                ir = part_i.get("Inspection_Report")
+                if ir and isinstance(ir, dict):
+                    report = ir
+        rp = report.get("Reporting_Period") or {}
+        ip = report.get("Inspection_Period") or {}
+        if not isinstance(rp, dict):
+            rp = {}
+        if not isinstance(ip, dict):
+            ip = {}
+        return {
+            "state": _text(rp.get("state_name") or ip.get("state_name")),
+            "departments": _text(rp.get("departments") or ip.get("departments")),
+            "period_from": _text(rp.get("Period_From") or ip.get("Period_From")),
+            "period_to": _text(rp.get("Period_To") or ip.get("Period_To")),
+        }
+    except Exception:
+        return empty
+
+def audit_log_metadata(new_json, old_json) -> Dict[str, Any]:
+    """
+    Column values for an audit log entry: taken from its new JSON, or from
+    the old JSON if the new one has none.
+
+    Returns:
+        dict: state, departments (str or None), period_from and period_to (date or None)
+    """
+    meta = extract_report_meta(new_json)
+    if not any(meta.values()):
+        meta = extract_report_meta(old_json)
+    return {
+        "state": meta["state"],
+        "departments": meta["departments"],
+        "period_from": parse_report_date(meta["period_from"]),
+        "period_to": parse_report_date(meta["period_to"]),
+    }
@@ -0,0 +1,91 @@
+"""
+Outline of a report's JSON for on-demand loading.
+
+Extracted reports are ``{"metadata": {...}, "parts": [...]}`` where each part
+has ``sections`` and each section has ``content`` items and
+``sub_sections``. The outline keeps the metadata and, for every part,
+section and sub-section, its title, its JSON Pointer and the size of its
+JSON, so a viewer can render the document's structure straight away and
+fetch each section by pointer when it is opened.
+"""
+
+import json
+from typing import Any, Dict, List
+
+from json_patch import escape_pointer_token
+
+def json_size(value) -> int:
+    """Size in bytes of value serialised as compact JSON"""
+    return len(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def _items(node: Dict[str, Any]) -> int:
+    content = node.get("content")
+    return len(content) if isinstance(content, list) else 0
+
+def _sub_sections(section: Dict[str, Any], path: str) -> List[Dict[str, Any]]:
+    sub_sections = section.get("sub_sections")
+    if not isinstance(sub_sections, list):
+        return []
+    return [
+        {
+            "path": f"{path}/sub_sections/{index}",
+            "title": sub.get("sub_section_title") if isinstance(sub, dict) else None,
+            "size": json_size(sub),
+            "items": _items(sub) if isinstance(sub, dict) else 0,
+        }
+        for index, sub in enumerate(sub_sections)
+    ]
+
+def _sections(part: Dict[str, Any], path: str) -> List[Dict[str, Any]]:
+    sections = part.get("sections")
+    if not isinstance(sections, list):
+        return []
+    outline = []
+    for index, section in enumerate(sections):
+        section_path = f"{path}/sections/{index}"
+        is_dict = isinstance(section, dict)
+        outline.append({
+            "path": section_path,
+            "title": section.get("section_title") if is_dict else None,
+            "size": json_size(section),
+            "items": _items(section) if is_dict else 0,
+            "sub_sections": _sub_sections(section, section_path) if is_dict else [],
+        })
+    return outline
+
+def build_outline(document) -> Dict[str, Any]:
+    """
+    Build the outline of a report.
+
+    Documents that do not follow the parts/sections layout still get their
+    top-level members with sizes, so any of them can be loaded by pointer.
+
+    Args:
+        document: Report JSON
+
+    Returns:
+        dict: size (bytes), metadata, members (top-level keys with path and
+            size) and parts (titles, pointers and sizes of parts, sections
+            and sub-sections)
+    """
+    outline: Dict[str, Any] = {"size": json_size(document), "metadata": None, "members": [], "parts": []}
+    if not isinstance(document, dict):
+        return outline
+
+    outline["metadata"] = document.get("metadata")
+    outline["members"] = [
+        {"path": "/" + escape_pointer_token(key), "title": key, "size": json_size(value)}
+        for key, value in document.items()
+    ]
+    parts = document.get("parts")
+    if isinstance(parts, list):
+        for index, part in enumerate(parts):
+            path = f"/parts/{index}"
+            is_dict = isinstance(part, dict)
+            outline["parts"].append({
+                "path": path,
+                "title": part.get("part_title") if is_dict else None,
+                "size": json_size(part),
+                "sections": _sections(part, path) if is_dict else [],
+            })
+    return outline
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import date, datetime
 
 class UserCreate(BaseModel):
@@ -55,4 +55,6 @@ class TokenPayload(BaseModel):
 class RoleCreate(BaseModel):
     """Schema for role creation"""
     name: str
-    description: Optional[str] = None
\ No newline at end of file
+    description: Optional[str] = None
+    # menu name -> {"view": bool, "create": bool, "update": bool, "delete": bool}
+    permissions: Optional[Dict[str, Dict[str, bool]]] = None
\ No newline at end of file
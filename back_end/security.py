@@ -1,8 +1,32 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
 import bcrypt
-from passlib.context import CryptContext
 
-# Create a password context for hashing and verification
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor for new hashes; stored hashes with another cost are
+# replaced the next time their user logs in
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt only reads the first 72 bytes of a password
+BCRYPT_MAX_BYTES = 72
+
+# Threads for hashing passwords in bulk (user imports); bcrypt releases the
+# GIL, so they use every core. Kept apart from the request threads so a large
+# import does not queue ahead of logins
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Threads that hash and check passwords for requests; bcrypt releases the GIL
+# while it works, so these run beside the event loop instead of blocking it
+PASSWORD_VERIFY_WORKERS = int(os.getenv("PASSWORD_VERIFY_WORKERS", str(os.cpu_count() or 2)))
+
+_hash_pool = None
+_verify_pool = None
+_hash_pool_lock = threading.Lock()
+
+def _password_bytes(password: str) -> bytes:
+    # Truncated as passlib did, so existing hashes of longer passwords still match
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES]
 
 def hash_password(password: str) -> str:
     """
@@ -14,7 +38,7 @@ def hash_password(password: str) -> str:
     Returns:
         str: Hashed password
     """
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("ascii")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -25,6 +49,81 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         hashed_password: Hashed password to check against
         
     Returns:
-        bool: True if password matches, False otherwise
+        bool: True if password matches, False otherwise (including when
+            hashed_password is not a bcrypt hash)
+    """
+    try:
+        return bcrypt.checkpw(_password_bytes(plain_password), hashed_password.encode("ascii"))
+    except (ValueError, UnicodeEncodeError):
+        return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if hashed_password was made with a cost other than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def _get_verify_pool() -> ThreadPoolExecutor:
+    global _verify_pool
+    with _hash_pool_lock:
+        if _verify_pool is None:
+            _verify_pool = ThreadPoolExecutor(
+                max_workers=PASSWORD_VERIFY_WORKERS, thread_name_prefix="password"
+            )
+        return _verify_pool
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the password threads, for use from async endpoints"""
+    return await asyncio.get_running_loop().run_in_executor(_get_verify_pool(), hash_password, password)
+
+async def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password on the password threads and rehash it if its cost is out of date.
+
+    Args:
+        plain_password: Plain text password to verify
+        hashed_password: Stored hash
+
+    Returns:
+        tuple: (True if the password matches, new hash to store or None)
+    """
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(_get_verify_pool(), verify_password, plain_password, hashed_password):
+        return False, None
+    if not needs_rehash(hashed_password):
+        return True, None
+    return True, await loop.run_in_executor(_get_verify_pool(), hash_password, plain_password)
+
+def _get_hash_pool() -> ThreadPoolExecutor:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-import"
+            )
+        return _hash_pool
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hash many passwords in parallel threads
+
+    Args:
+        passwords: Plain text passwords
+
+    Returns:
+        list: Hashes in the same order as passwords
     """
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    if len(passwords) < 2 or PASSWORD_HASH_WORKERS <= 1:
+        return [hash_password(password) for password in passwords]
+    return list(_get_hash_pool().map(hash_password, passwords))
+
+def shutdown_password_pool() -> None:
+    """Stop the password hashing threads"""
+    global _hash_pool, _verify_pool
+    with _hash_pool_lock:
+        pools = (_hash_pool, _verify_pool)
+        _hash_pool = _verify_pool = None
+    for pool in pools:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script to verify resumable chunked uploads
+
+Uploads a DOCX from the uploads folder in small chunks, abandons the upload
+halfway through (as if the connection had dropped), then resumes it from the
+offset reported by the server and finalizes it.
+"""
+
+import requests
+from pathlib import Path
+
+BASE_URL = "http://localhost:8000/api/chunked-uploads"
+CHUNK_SIZE = 64 * 1024
+
+def send_chunks(upload_id, data, offset, stop_at=None):
+    """Send data[offset:] in chunks, stopping early at stop_at if given"""
+    end = len(data) if stop_at is None else stop_at
+    while offset < end:
+        chunk = data[offset:min(offset + CHUNK_SIZE, end)]
+        response = requests.put(f"{BASE_URL}/{upload_id}", params={"offset": offset}, data=chunk)
+        response.raise_for_status()
+        offset = response.json()["offset"]
+    return offset
+
+def test_chunked_upload():
+    """Test killing an upload midway and resuming it"""
+    uploads_dir = Path("uploads")
+    test_files = list(uploads_dir.glob("*.docx"))
+
+    if not test_files:
+        print("❌ No DOCX files found in uploads folder")
+        print("Please add a test DOCX file to the uploads folder")
+        return
+
+    test_file = test_files[0]
+    data = test_file.read_bytes()
+    print(f"Testing with file: {test_file.name} ({len(data)} bytes)")
+
+    try:
+        # 1. Create the session
+        response = requests.post(BASE_URL, json={"filename": test_file.name, "total_size": len(data)})
+        response.raise_for_status()
+        upload_id = response.json()["upload_id"]
+        print(f"✅ Session created: {upload_id}")
+
+        # 2. Upload the first half, then "kill" the client
+        sent = send_chunks(upload_id, data, 0, stop_at=len(data) // 2)
+        print(f"✅ Sent {sent} bytes before interruption")
+
+        # 3. A chunk at the wrong offset must be rejected
+        response = requests.put(f"{BASE_URL}/{upload_id}", params={"offset": 0}, data=data[:CHUNK_SIZE])
+        if response.status_code == 409:
+            print("✅ Out-of-order chunk rejected with 409")
+        else:
+            print(f"❌ Expected 409 for wrong offset, got {response.status_code}")
+
+        # 4. A fresh client asks where to resume and finishes the upload
+        response = requests.get(f"{BASE_URL}/{upload_id}")
+        response.raise_for_status()
+        resume_offset = response.json()["offset"]
+        print(f"Resuming from offset {resume_offset}")
+        sent = send_chunks(upload_id, data, resume_offset)
+        print(f"✅ Upload complete: {sent}/{len(data)} bytes")
+
+        # 5. Finalize - the file goes through the normal processing path
+        response = requests.post(f"{BASE_URL}/{upload_id}/finalize")
+        if response.status_code == 200:
+            body = response.json()
+            print(f"✅ Finalize: {body['status']}")
+            if body.get("result"):
+                print(f"  - {body['result']['filename']}: {body['result']['status']}")
+            if body.get("error"):
+                print(f"  - {body['error']['filename']}: {body['error']['error']}")
+        else:
+            print(f"❌ Finalize failed: {response.status_code}")
+            print(response.text)
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+if __name__ == "__main__":
+    print("Testing resumable chunked uploads...")
+    print("=" * 50)
+    test_chunked_upload()
+    print("=" * 50)
+    print("Test completed!")
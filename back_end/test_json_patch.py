@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for the JSON Patch helpers used by document versions
+
+Run from the back_end folder: python test_json_patch.py
+"""
+
+from json_patch import JsonPatchError, apply_patch, make_patch, paths_overlap, touched_paths
+
+def test_replace_keeps_key_order():
+    """Replacing a member leaves it where it was in its object"""
+    document = {"metadata": {"state": "Kerala", "department": "PWD", "year": 2021}}
+    patched = apply_patch(document, [{"op": "replace", "path": "/metadata/state", "value": "Goa"}])
+    assert list(patched["metadata"]) == ["state", "department", "year"], list(patched["metadata"])
+    assert patched["metadata"]["state"] == "Goa"
+
+    # Rebuilding from a stored patch gives the same key order as the edited document
+    edited = {"metadata": {"state": "Goa", "department": "PWD", "year": 2021}}
+    rebuilt = apply_patch(document, make_patch(document, edited))
+    assert list(rebuilt["metadata"]) == list(edited["metadata"])
+    print("✅ replace keeps key order")
+
+def test_replace_array_item():
+    """Replacing an array item keeps the array's length; bad targets are rejected"""
+    document = {"items": ["a", "b", "c"]}
+    assert apply_patch(document, [{"op": "replace", "path": "/items/1", "value": "B"}]) == {"items": ["a", "B", "c"]}
+    for path in ("/items/3", "/items/-", "/missing"):
+        try:
+            apply_patch(document, [{"op": "replace", "path": path, "value": 1}])
+        except JsonPatchError:
+            continue
+        raise AssertionError(f"replace at {path} should fail")
+    print("✅ replace of array items")
+
+def conflicts(operations, concurrent_patch):
+    """Paths of operations that overlap a concurrent change, as check_mergeable finds them"""
+    changed = touched_paths(concurrent_patch)
+    return [path for path in touched_paths(operations) if any(paths_overlap(path, other) for other in changed)]
+
+def test_copy_into_array_conflicts():
+    """Copying into an array shifts later items, so a concurrent edit of one of them conflicts"""
+    concurrent = [{"op": "replace", "path": "/parts/2/part_title", "value": "Revised"}]
+    for target in ("/parts/1", "/parts/-"):
+        copy_in = [{"op": "copy", "from": "/parts/0", "path": target}]
+        assert conflicts(copy_in, concurrent), f"copy to {target} should conflict"
+
+    # Copying into an object member shifts nothing, and the source is only read
+    assert not conflicts([{"op": "copy", "from": "/parts/3", "path": "/metadata/copy"}], concurrent)
+    print("✅ copy into an array conflicts with edits to later items")
+
+if __name__ == "__main__":
+    test_replace_keeps_key_order()
+    test_replace_array_item()
+    test_copy_into_array_conflicts()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Regression test for keyset pagination over equal timestamps
+
+Seeds a throwaway SQLite database (see testing_db.py) with audit log
+entries and feedback that share a timestamp - some stored by
+``server_default`` without fractional seconds, some written by SQLAlchemy
+with them - then follows the cursors of /admin/audit-logs and
+/api/data-validation-feedback page by page and checks that the walk ends
+and returns every row exactly once, newest first.
+
+Run from the back_end folder: python test_pagination.py
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+# Keep importing the app away from the development database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'app.db')}")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from dependencies import get_current_active_user, get_current_user
+from main import app
+from pagination import NEXT_CURSOR_HEADER
+from permissions import PermissionTable
+from testing_db import isolated_database
+import models
+
+SAME_SECOND = "2024-01-01 10:00:00"
+PAGE_SIZE = 2
+MAX_PAGES = 50
+
+def seed(session_factory):
+    """Six rows per table at SAME_SECOND as stored text, three half a second later; returns a principal"""
+    db = session_factory()
+    user = models.User(firstname="Page", lastname="Walker", email="walker@example.com", password="x")
+    db.add(user)
+    db.flush()
+    for _ in range(6):
+        db.add(models.AuditLog(title="edit", action="edit"))
+        db.add(models.DataValidationFeedback(user_id=user.id, severity="low", issue_description="issue"))
+    db.flush()
+    # As a server_default timestamp is stored: no fractional seconds
+    db.execute(text(f"UPDATE audit_logs SET timestamp = '{SAME_SECOND}'"))
+    db.execute(text(f"UPDATE data_validation_feedback SET created_at = '{SAME_SECOND}'"))
+    later = datetime.fromisoformat(SAME_SECOND).replace(microsecond=500000)
+    for _ in range(3):
+        db.add(models.AuditLog(title="edit", action="edit", timestamp=later))
+        db.add(models.DataValidationFeedback(
+            user_id=user.id, severity="low", issue_description="issue", created_at=later,
+        ))
+    db.commit()
+
+    principal = models.User(id=user.id, firstname="Page", lastname="Walker", email=user.email, role_status="active")
+    principal.user_roles = []
+    principal.grants = PermissionTable({}, {}, {}).for_roles([])
+    expected = {
+        "audit_logs": [row.id for row in db.query(models.AuditLog).order_by(
+            models.AuditLog.timestamp.desc(), models.AuditLog.id.desc())],
+        "feedback": [row.id for row in db.query(models.DataValidationFeedback).order_by(
+            models.DataValidationFeedback.created_at.desc(), models.DataValidationFeedback.id.desc())],
+    }
+    db.close()
+    return principal, expected
+
+def walk(client, path, read_page):
+    """Ids of every page of path, following cursors until there are none"""
+    ids, cursor = [], None
+    for _ in range(MAX_PAGES):
+        params = {"limit": PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(path, params=params)
+        assert response.status_code == 200, f"{path}: {response.status_code} {response.text}"
+        page_ids, cursor = read_page(response)
+        ids.extend(page_ids)
+        if not cursor:
+            return ids
+    raise AssertionError(f"{path} still had a next cursor after {MAX_PAGES} pages: {ids}")
+
+def test_cursor_walk_over_equal_timestamps():
+    """Every row comes back once and the walk ends"""
+    try:
+        _, session_factory = isolated_database(app, "pagination.db")
+        principal, expected = seed(session_factory)
+        app.dependency_overrides[get_current_user] = lambda: principal
+        app.dependency_overrides[get_current_active_user] = lambda: principal
+        client = TestClient(app)
+        audit_ids = walk(client, "/admin/audit-logs", lambda response: (
+            [log["id"] for log in response.json()["logs"]], response.json()["pagination"]["next_cursor"],
+        ))
+        feedback_ids = walk(client, "/api/data-validation-feedback", lambda response: (
+            [entry["id"] for entry in response.json()], response.headers.get(NEXT_CURSOR_HEADER),
+        ))
+    finally:
+        app.dependency_overrides.clear()
+
+    for name, ids in (("audit_logs", audit_ids), ("feedback", feedback_ids)):
+        print(f"{name}: {ids}")
+        assert len(ids) == len(set(ids)), f"{name} returned rows more than once"
+        assert ids == expected[name], f"{name} walk {ids} != {expected[name]}"
+    print("✅ Cursor walks end and return every row once")
+
+if __name__ == "__main__":
+    test_cursor_walk_over_equal_timestamps()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Regression test for N+1 queries in listing endpoints
+
+Seeds a throwaway SQLite database (see testing_db.py) with a small and a
+large batch of assignments, feedback, drafts and audit log entries, calls
+each listing endpoint for both, and checks that the number of SQL
+statements it runs does not grow with the number of rows.
+
+Run from the back_end folder: python test_query_counts.py
+"""
+
+import os
+import tempfile
+
+# Keep importing the app away from the development database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'app.db')}")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from dependencies import get_current_active_user, get_current_user
+from main import app
+from permissions import PermissionTable
+from testing_db import isolated_database
+import models
+
+ENDPOINTS = [
+    "/api/my-assigned-files",
+    "/api/users/{user_id}/assigned-files",
+    "/api/data-validation-feedback",
+    "/api/data-validation-drafts",
+    "/inspection-reports",
+]
+
+def seed(session_factory, rows):
+    """Create a validator, an admin and rows of each listed record; returns the validator"""
+    db = session_factory()
+    admin = models.User(firstname="Admin", lastname="User", email=f"admin{rows}@example.com", password="x")
+    validator = models.User(firstname="Val", lastname="Idator", email=f"validator{rows}@example.com", password="x")
+    db.add_all([admin, validator])
+    db.flush()
+    for i in range(rows):
+        file_record = models.UploadedFile(
+            filename=f"report_{rows}_{i}.docx", original_filename=f"report_{rows}_{i}.docx",
+            file_path="uploads/x.docx", file_size=1, uploaded_by=admin.id,
+        )
+        db.add(file_record)
+        db.flush()
+        db.add(models.UserFileAssignment(user_id=validator.id, file_id=file_record.id, assigned_by=admin.id))
+        db.add(models.DataValidationFeedback(
+            user_id=validator.id, file_id=file_record.id, severity="low", issue_description="issue",
+        ))
+        db.add(models.DataValidationDraft(user_id=validator.id, file_id=file_record.id, draft_name=f"draft {i}"))
+        db.add(models.AuditLog(title="edit", action="edit", file_id=file_record.id, new_json={"a": i}))
+    db.commit()
+    # A detached copy for the auth override, so reading it runs no queries
+    principal = models.User(
+        id=validator.id, firstname=validator.firstname, lastname=validator.lastname,
+        email=validator.email, password="x", role_status="active",
+    )
+    principal.user_roles = []
+    principal.grants = PermissionTable({}, {}, {}).for_roles([])
+    db.close()
+    return principal
+
+def count_queries(engine, client, path):
+    """Number of SQL statements run while serving path"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200, f"{path}: {response.status_code} {response.text}"
+    return len(statements)
+
+def query_counts(engine, session_factory, rows):
+    validator = seed(session_factory, rows)
+    app.dependency_overrides[get_current_user] = lambda: validator
+    app.dependency_overrides[get_current_active_user] = lambda: validator
+    client = TestClient(app)
+    return {path: count_queries(engine, client, path.format(user_id=validator.id)) for path in ENDPOINTS}
+
+def test_listing_query_counts():
+    """Query counts stay the same for 3 rows and 60 rows"""
+    try:
+        engine, session_factory = isolated_database(app, "query_counts.db")
+        small = query_counts(engine, session_factory, 3)
+        large = query_counts(engine, session_factory, 60)
+    finally:
+        app.dependency_overrides.clear()
+
+    for path in ENDPOINTS:
+        print(f"{path}: {small[path]} queries for 3 rows, {large[path]} for 60 rows")
+        assert small[path] == large[path], f"{path} runs more queries as rows grow"
+    print("✅ Query counts do not depend on the number of rows")
+
+if __name__ == "__main__":
+    test_listing_query_counts()
@@ -0,0 +1,48 @@
+"""
+Throwaway databases for the regression test scripts.
+
+``database.engine`` is created once, from DATABASE_URL as it is when the
+first module imports it, so tests that share it see each other's rows.
+Each test instead gets a fresh SQLite file and serves it to the app by
+overriding ``get_db``, so test modules can run in any order in one session.
+"""
+
+import os
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, get_db
+from json_utils import compact_json_dumps
+
+def isolated_database(app, name: str):
+    """
+    Create an empty database and make the app's get_db use it.
+
+    Args:
+        app: FastAPI app whose get_db dependency is overridden; clear
+            app.dependency_overrides when the test ends
+        name: File name of the database, for telling tests apart
+
+    Returns:
+        tuple: (engine, session factory) of the new database
+    """
+    path = os.path.join(tempfile.mkdtemp(), name)
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        json_serializer=compact_json_dumps,
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_test_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+    return engine, session_factory
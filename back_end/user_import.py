@@ -0,0 +1,269 @@
+"""
+Bulk user import from CSV or Excel files.
+
+Rows are read as a stream (the csv module, or openpyxl in read-only mode) and
+handled in chunks of USER_IMPORT_CHUNK_SIZE rows. For each chunk, one IN
+query finds the emails that are already registered, the passwords are
+hashed in parallel threads, and the new users are inserted in one
+batched statement. Every chunk is committed on its own, so memory use does
+not grow with the file and progress can be reported while it runs.
+
+Each import is an ImportJob. The upload request either waits for it or
+returns its id at once, and the job's progress is then read from
+``import_jobs``.
+"""
+
+import csv
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import openpyxl
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import models
+from security import hash_passwords
+
+# Rows validated, checked and inserted together
+USER_IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "500"))
+# Finished jobs are kept this long for clients polling their result
+USER_IMPORT_JOB_TTL_SECONDS = int(os.getenv("USER_IMPORT_JOB_TTL_SECONDS", "3600"))
+
+REQUIRED_FIELDS = ['firstname', 'lastname', 'email', 'password']
+OPTIONAL_FIELDS = ['contactno', 'place', 'city', 'state', 'pincode', 'gender']
+DOB_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y']
+# Row errors listed in a result; the rest are only counted
+MAX_REPORTED_ERRORS = 10
+
+class ImportJob:
+    """Progress and result of one bulk import"""
+
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"  # 'queued', 'running', 'completed', 'failed'
+        self.total_rows = 0
+        self.successful_users = 0
+        self.failed_users = 0
+        self.errors: List[str] = []
+        self.detail: Optional[str] = None
+        self.finished_at: Optional[float] = None
+
+    def fail_row(self, row_num: int, message: str) -> None:
+        self.failed_users += 1
+        self.errors.append(f"Row {row_num}: {message}")
+
+    def result(self) -> Dict[str, Any]:
+        """Counts and the first errors, as the upload endpoint has always returned them"""
+        response = {
+            "successful_users": self.successful_users,
+            "failed_users": self.failed_users,
+            "total_rows": self.total_rows
+        }
+        if self.errors:
+            response["errors"] = self.errors[:MAX_REPORTED_ERRORS]
+            if len(self.errors) > MAX_REPORTED_ERRORS:
+                response["additional_errors"] = len(self.errors) - MAX_REPORTED_ERRORS
+        return response
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "detail": self.detail,
+            **self.result()
+        }
+
+class ImportJobStore:
+    """Thread-safe registry of import jobs; finished jobs expire after USER_IMPORT_JOB_TTL_SECONDS"""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, ImportJob] = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename: str) -> ImportJob:
+        job = ImportJob(filename)
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+import_jobs = ImportJobStore(USER_IMPORT_JOB_TTL_SECONDS)
+
+def iter_rows(path: str, extension: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (row number, {header: value}) for each data row without loading the whole file.
+
+    Row numbers count the header as row 1.
+    """
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as csv_file:
+            for row_num, row in enumerate(csv.DictReader(csv_file), start=2):
+                yield row_num, row
+        return
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None) or ()
+        for row_num, row in enumerate(rows, start=2):
+            if any(row):  # Skip empty rows
+                yield row_num, {
+                    headers[i]: value for i, value in enumerate(row) if i < len(headers) and headers[i]
+                }
+    finally:
+        workbook.close()
+
+def _parse_row(user_data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Validate a row and turn it into User column values (password still in plain text).
+
+    Returns:
+        tuple: (values, None) for a valid row, (None, error message) otherwise
+    """
+    missing_fields = [
+        field for field in REQUIRED_FIELDS
+        if field not in user_data or not user_data[field] or str(user_data[field]).strip() == ''
+    ]
+    if missing_fields:
+        return None, f"Missing required fields: {', '.join(missing_fields)}"
+
+    email = str(user_data['email']).strip().lower()
+    if '@' not in email or '.' not in email:
+        return None, "Invalid email format"
+
+    password = str(user_data['password']).strip()
+    if len(password) < 6:
+        return None, "Password must be at least 6 characters long"
+
+    dob = None
+    dob_str = str(user_data.get('dob') or '').strip()
+    if dob_str:
+        for date_format in DOB_FORMATS:
+            try:
+                dob = datetime.strptime(dob_str, date_format).date()
+                break
+            except ValueError:
+                continue
+        if not dob:
+            return None, "Invalid date format for dob. Use YYYY-MM-DD format."
+
+    values = {
+        "firstname": str(user_data['firstname']).strip(),
+        "lastname": str(user_data['lastname']).strip(),
+        "email": email,
+        "password": password,
+        "dob": dob,
+        "role_status": 'unassigned',
+    }
+    for field in OPTIONAL_FIELDS:
+        values[field] = str(user_data.get(field) or '').strip() or None
+    return values, None
+
+def _registered_emails(db: Session, emails: List[str]) -> set:
+    return {email for (email,) in db.query(models.User.email).filter(models.User.email.in_(emails))}
+
+def _import_chunk(db: Session, job: ImportJob, chunk: List[Tuple[int, Dict[str, Any]]], seen: set) -> None:
+    candidates = []
+    for row_num, user_data in chunk:
+        values, error = _parse_row(user_data)
+        if error:
+            job.fail_row(row_num, error)
+        elif values["email"] in seen:
+            job.fail_row(row_num, f"Email {values['email']} appears more than once in the file")
+        else:
+            seen.add(values["email"])
+            candidates.append((row_num, values))
+    if not candidates:
+        return
+
+    # One query for the whole chunk instead of one per row
+    registered = _registered_emails(db, [values["email"] for _, values in candidates])
+    new_users = []
+    for row_num, values in candidates:
+        if values["email"] in registered:
+            job.fail_row(row_num, f"User with email {values['email']} already exists")
+        else:
+            new_users.append((row_num, values))
+    if not new_users:
+        return
+
+    hashes = hash_passwords([values["password"] for _, values in new_users])
+    for (_, values), hashed_password in zip(new_users, hashes):
+        values["password"] = hashed_password
+
+    try:
+        db.execute(insert(models.User), [values for _, values in new_users])
+        db.commit()
+    except IntegrityError:
+        # Another request registered some of these emails since the check; insert the rest
+        db.rollback()
+        registered = _registered_emails(db, [values["email"] for _, values in new_users])
+        remaining = []
+        for row_num, values in new_users:
+            if values["email"] in registered:
+                job.fail_row(row_num, f"User with email {values['email']} already exists")
+            else:
+                remaining.append((row_num, values))
+        if remaining:
+            db.execute(insert(models.User), [values for _, values in remaining])
+            db.commit()
+        new_users = remaining
+    job.successful_users += len(new_users)
+
+def run_import(job: ImportJob, path: str, extension: str) -> None:
+    """
+    Import the users in a saved upload, updating job as each chunk is committed.
+
+    The file is deleted afterwards. Failures are recorded on the job rather
+    than raised; users from chunks committed before a failure are kept.
+    """
+    job.status = "running"
+    db = SessionLocal()
+    seen: set = set()
+    try:
+        chunk = []
+        for row_num, user_data in iter_rows(path, extension):
+            job.total_rows += 1
+            chunk.append((row_num, user_data))
+            if len(chunk) >= USER_IMPORT_CHUNK_SIZE:
+                _import_chunk(db, job, chunk, seen)
+                chunk = []
+        if chunk:
+            _import_chunk(db, job, chunk, seen)
+
+        if job.total_rows == 0:
+            job.status = "failed"
+            job.detail = "No valid user data found in file"
+        else:
+            job.status = "completed"
+    except Exception as e:
+        db.rollback()
+        print(f"Bulk user import {job.id} failed: {e}")
+        job.status = "failed"
+        job.detail = str(e)
+    finally:
+        db.close()
+        job.finished_at = time.time()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Container, Card, Button, Spinner, Alert, Row, Col, Badge, Accordion, Tabs, Tab } from 'react-bootstrap';
 import { useLocation, useNavigate } from 'react-router-dom';
 import TopNavbar from '../components/TopNavbar';
@@ -7,9 +7,13 @@ import config from '../config.js';
 const FileViewer = () => {
   const location = useLocation();
   const navigate = useNavigate();
-  const [fileData, setFileData] = useState(null);
+  const [outline, setOutline] = useState(null);
+  const [loadedParts, setLoadedParts] = useState({}); // part path -> part JSON
+  const [partErrors, setPartErrors] = useState({}); // part path -> error message
+  const [fullDocument, setFullDocument] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null); //to shw some error
+  const requestedParts = useRef(new Set());
 
   useEffect(() => {
     const { fileId, filename } = location.state || {};
@@ -20,36 +24,98 @@ const FileViewer = () => {
       return;
     }
 
-    fetchFileData(fileId);
+    fetchOutline(fileId);
   }, [location.state]);
 
-  const fetchFileData = async (fileId) => {
+  const authHeaders = () => ({ Authorization: `Bearer ${localStorage.getItem('token')}` });
+
+  const errorDetail = async (response, fallback) => {
+    try {
+      const data = await response.json();
+      return typeof data.detail === 'string' ? data.detail : fallback;
+    } catch {
+      return fallback;
+    }
+  };
+
+  // The outline (metadata, titles and pointers, no content) is all the first render needs
+  const fetchOutline = async (fileId) => {
     try {
       setLoading(true);
-      const token = localStorage.getItem('token');
-      
-      const response = await fetch(`${config.BASE_URL}/api/uploaded-files/${fileId}/content`, {
-        headers: { Authorization: `Bearer ${token}` }
+      setOutline(null);
+      setLoadedParts({});
+      setPartErrors({});
+      setFullDocument(null);
+      requestedParts.current = new Set();
+
+      const response = await fetch(`${config.BASE_URL}/api/documents/${fileId}/outline`, {
+        headers: authHeaders()
       });
       
       if (response.ok) {
         const data = await response.json();
-        if (data.status === 'success') {
-          setFileData(data.content);
-        } else {
-          setError('Failed to load file content: ' + (data.message || 'Unknown error'));
+        setOutline(data);
+        // The first part is open by default
+        if (data.parts.length > 0) {
+          loadPart(fileId, data.parts[0].path);
         }
       } else {
-        setError('Failed to load file content');
+        setError('Failed to load file content: ' + await errorDetail(response, 'Unknown error'));
       }
     } catch (err) {
-      console.error('Error loading file content:', err);
+      console.error('Error loading file outline:', err);
       setError('Error loading file content: ' + err.message);
     } finally {
       setLoading(false);
     }
   };
 
+  // Fetch one part by its JSON Pointer when it is opened
+  const loadPart = async (fileId, path) => {
+    if (requestedParts.current.has(path)) return;
+    requestedParts.current.add(path);
+    try {
+      const response = await fetch(
+        `${config.BASE_URL}/api/documents/${fileId}/content?path=${encodeURIComponent(path)}`,
+        { headers: authHeaders() }
+      );
+      if (response.ok) {
+        const data = await response.json();
+        setLoadedParts(prev => ({ ...prev, [path]: data.content }));
+      } else {
+        requestedParts.current.delete(path);
+        const message = await errorDetail(response, 'Failed to load this part');
+        setPartErrors(prev => ({ ...prev, [path]: message }));
+      }
+    } catch (err) {
+      requestedParts.current.delete(path);
+      console.error(`Error loading ${path}:`, err);
+      setPartErrors(prev => ({ ...prev, [path]: err.message }));
+    }
+  };
+
+  // The whole document is only fetched for the Raw Data tab
+  const loadFullDocument = async (fileId) => {
+    if (fullDocument || requestedParts.current.has('')) return;
+    requestedParts.current.add('');
+    try {
+      const response = await fetch(`${config.BASE_URL}/api/documents/${fileId}/content`, {
+        headers: authHeaders()
+      });
+      if (response.ok) {
+        const data = await response.json();
+        setFullDocument(data.content);
+      } else {
+        requestedParts.current.delete('');
+        setPartErrors(prev => ({ ...prev, '': 'Failed to load raw data' }));
+      }
+    } catch (err) {
+      requestedParts.current.delete('');
+      console.error('Error loading raw data:', err);
+      setPartErrors(prev => ({ ...prev, '': err.message }));
+    }
+  };
+
   const formatValue = (value) => {
     if (value === null || value === undefined) return 'N/A';
     if (typeof value === 'object') {
@@ -132,8 +198,91 @@ const FileViewer = () => {
     );
   };
 
+  const renderPartBody = (partOutline) => {
+    const part = loadedParts[partOutline.path];
+    if (!part) {
+      if (partErrors[partOutline.path]) {
+        return (
+          <Alert variant="danger" className="mb-0 d-flex justify-content-between align-items-center">
+            <span>{partErrors[partOutline.path]}</span>
+            <Button size="sm" variant="outline-danger" onClick={() => loadPart(location.state?.fileId, partOutline.path)}>
+              Retry
+            </Button>
+          </Alert>
+        );
+      }
+      return (
+        <div className="text-center py-3">
+          <Spinner animation="border" size="sm" role="status" className="me-2" />
+          Loading part...
+        </div>
+      );
+    }
+    return part.sections && part.sections.map((section, sectionIndex) => (
+      <div key={sectionIndex} className="section-item">
+        <div className="section-header-small">
+          <h6 className="section-title">
+            <i className="fas fa-list me-2"></i>
+            Section {sectionIndex + 1}: {section.section_title || 'Untitled Section'}
+          </h6>
+        </div>
+        
+        <div className="section-content">
+          {section.content && section.content.map((contentItem, contentIndex) => (
+            <div key={contentIndex} className="content-block">
+              {contentItem.type === 'paragraph' && (
+                <div className="paragraph-block">
+                  <p>{contentItem.text}</p>
+                </div>
+              )}
+              {contentItem.type === 'table' && (
+                <div className="table-block">
+                  <div 
+                    className="table-responsive"
+                    dangerouslySetInnerHTML={{ __html: contentItem.table }}
+                  />
+                </div>
+              )}
+            </div>
+          ))}
+          
+          {section.sub_sections && section.sub_sections.map((subSection, subIndex) => (
+            <div key={subIndex} className="subsection-item">
+              <div className="subsection-header">
+                <h6 className="subsection-title">
+                  <i className="fas fa-list-ul me-2"></i>
+                  Subsection {subIndex + 1}: {subSection.sub_section_title || 'Untitled Subsection'}
+                </h6>
+              </div>
+              
+              <div className="subsection-content">
+                {subSection.content && subSection.content.map((contentItem, contentIndex) => (
+                  <div key={contentIndex} className="content-block">
+                    {contentItem.type === 'paragraph' && (
+                      <div className="paragraph-block">
+                        <p>{contentItem.text}</p>
+                      </div>
+                    )}
+                    {contentItem.type === 'table' && (
+                      <div className="table-block">
+                        <div 
+                          className="table-responsive"
+                          dangerouslySetInnerHTML={{ __html: contentItem.table }}
+                        />
+                      </div>
+                    )}
+                  </div>
+                ))}
+              </div>
+            </div>
+          ))}
+        </div>
+      </div>
+    ));
+  };
+
   const renderParts = (parts) => {
-    if (!parts || !Array.isArray(parts)) return null;
+    if (!parts || parts.length === 0) return null;
 
     return (
       <div className="content-section">
@@ -147,82 +296,31 @@ const FileViewer = () => {
           </div>
         </div>
         
-        <Accordion defaultActiveKey="0" className="content-accordion">
-          {parts.map((part, partIndex) => (
+        <Accordion
+          defaultActiveKey="0"
+          className="content-accordion"
+          onSelect={(eventKey) => {
+            // Parts are fetched the first time they are opened
+            if (eventKey !== null && parts[eventKey]) {
+              loadPart(location.state?.fileId, parts[eventKey].path);
+            }
+          }}
+        >
+          {parts.map((partOutline, partIndex) => (
             <Accordion.Item key={partIndex} eventKey={partIndex.toString()} className="part-accordion-item">
               <Accordion.Header className="part-header">
                 <div className="part-header-content">
                   <div className="part-number">{partIndex + 1}</div>
                   <div className="part-title">
-                    <h5>{part.part_title || 'Untitled Part'}</h5>
+                    <h5>{partOutline.title || 'Untitled Part'}</h5>
                     <p className="part-subtitle">
-                      {part.sections ? `${part.sections.length} sections` : 'No sections'}
+                      {partOutline.sections.length > 0 ? `${partOutline.sections.length} sections` : 'No sections'}
                     </p>
                   </div>
                 </div>
               </Accordion.Header>
               <Accordion.Body className="part-body">
-                {part.sections && part.sections.map((section, sectionIndex) => (
-                  <div key={sectionIndex} className="section-item">
-                    <div className="section-header-small">
-                      <h6 className="section-title">
-                        <i className="fas fa-list me-2"></i>
-                        Section {sectionIndex + 1}: {section.section_title || 'Untitled Section'}
-                      </h6>
-                    </div>
-                    
-                    <div className="section-content">
-                      {section.content && section.content.map((contentItem, contentIndex) => (
-                        <div key={contentIndex} className="content-block">
-                          {contentItem.type === 'paragraph' && (
-                            <div className="paragraph-block">
-                              <p>{contentItem.text}</p>
-                            </div>
-                          )}
-                          {contentItem.type === 'table' && (
-                            <div className="table-block">
-                              <div 
-                                className="table-responsive"
-                                dangerouslySetInnerHTML={{ __html: contentItem.table }}
-                              />
-                            </div>
-                          )}
-                        </div>
-                      ))}
-                      
-                      {section.sub_sections && section.sub_sections.map((subSection, subIndex) => (
-                        <div key={subIndex} className="subsection-item">
-                          <div className="subsection-header">
-                            <h6 className="subsection-title">
-                              <i className="fas fa-list-ul me-2"></i>
-                              Subsection {subIndex + 1}: {subSection.sub_section_title || 'Untitled Subsection'}
-                            </h6>
-                          </div>
-                          
-                          <div className="subsection-content">
-                            {subSection.content && subSection.content.map((contentItem, contentIndex) => (
-                              <div key={contentIndex} className="content-block">
-                                {contentItem.type === 'paragraph' && (
-                                  <div className="paragraph-block">
-                                    <p>{contentItem.text}</p>
-                                  </div>
-                                )}
-                                {contentItem.type === 'table' && (
-                                  <div className="table-block">
-                                    <div 
-                                      className="table-responsive"
-                                      dangerouslySetInnerHTML={{ __html: contentItem.table }}
-                                    />
-                                  </div>
-                                )}
-                              </div>
-                            ))}
-                          </div>
-                        </div>
-                      ))}
-                    </div>
-                  </div>
-                ))}
+                {renderPartBody(partOutline)}
               </Accordion.Body>
             </Accordion.Item>
           ))}
@@ -231,7 +329,7 @@ const FileViewer = () => {
     );
   };
 
-  const renderObservations = (content) => {
+  const renderObservations = (content, complete) => {
     const observations = [];
     
     // Try to find observations in different parts
@@ -261,7 +359,10 @@ const FileViewer = () => {
           </div>
           <div className="section-title">
             <h4>Key Observations</h4>
-            <p>Important findings and observations from the document</p>
+            <p>
+              Important findings and observations from the document
+              {!complete && ' (from the parts opened so far)'}
+            </p>
           </div>
         </div>
         
@@ -357,9 +458,13 @@ const FileViewer = () => {
         </div>
 
         {/* Document Content with Tabs */}
-        {fileData && (
+        {outline && (
           <div className="document-content">
-            <Tabs defaultActiveKey="overview" className="content-tabs">
+            <Tabs
+              defaultActiveKey="overview"
+              className="content-tabs"
+              onSelect={(key) => key === 'raw' && loadFullDocument(location.state?.fileId)}
+            >
               <Tab eventKey="overview" title={
                 <span>
                   <i className="fas fa-info-circle me-2"></i>
@@ -367,8 +472,11 @@ const FileViewer = () => {
                 </span>
               }>
                 <div className="tab-content">
-                  {renderMetadata(fileData.metadata)}
-                  {renderObservations(fileData)}
+                  {renderMetadata(outline.metadata)}
+                  {renderObservations(
+                    { parts: outline.parts.map(part => loadedParts[part.path]).filter(Boolean) },
+                    outline.parts.every(part => loadedParts[part.path])
+                  )}
                 </div>
               </Tab>
               
@@ -379,7 +487,7 @@ const FileViewer = () => {
                 </span>
               }>
                 <div className="tab-content">
-                  {renderParts(fileData.parts)}
+                  {renderParts(outline.parts)}
                 </div>
               </Tab>
               
@@ -401,7 +509,16 @@ const FileViewer = () => {
                       </div>
                     </div>
                     <div className="raw-data-content">
-                      <pre>{JSON.stringify(fileData, null, 2)}</pre>
+                      {fullDocument ? (
+                        <pre>{JSON.stringify(fullDocument, null, 2)}</pre>
+                      ) : partErrors[''] ? (
+                        <Alert variant="danger" className="mb-0">{partErrors['']}</Alert>
+                      ) : (
+                        <div className="text-center py-3">
+                          <Spinner animation="border" size="sm" role="status" className="me-2" />
+                          Loading raw data...
+                        </div>
+                      )}
                     </div>
                   </div>
                 </div>